@@ -0,0 +1,81 @@
+"""
+Async variants of the auth views, mounted in place of the sync ones when
+ASYNC_AUTH_VIEWS is set (ASGI deployments).
+"""
+from django.http import JsonResponse
+from django.utils.translation import gettext as _
+
+from rest_framework.permissions import AllowAny
+
+from cvgezgini.apps.accounts.models import User, VerifyCode
+from cvgezgini.apps.core import tracing
+from ..utils.permissions import CanAttemptPerm
+from ..utils.views import AsyncAPIView, avalidate
+from .serializers import (
+    EmailLoginSerializer,
+    EmailSerializers,
+    ForgotPasswordSerializer,
+    RegisterSerializer,
+    UpdatePasswordSerializer,
+    UserProfileSerializer,
+    )
+from .views import aissue_token
+
+
+class LoginWithEmailAsyncView(AsyncAPIView):
+    permission_classes = [AllowAny, CanAttemptPerm]
+
+    async def post(self, request, *args, **kwargs):
+        serializer = EmailLoginSerializer(data=request.data)
+        attrs = await avalidate(serializer)
+        user = attrs["user"]
+        if not user.is_active:
+            return JsonResponse({"detail": _("Hesabınız aktif değil!")}, status=403)
+
+        return JsonResponse(await aissue_token(user))
+
+
+class RegisterAsyncView(AsyncAPIView):
+    permission_classes = [AllowAny, CanAttemptPerm]
+
+    async def post(self, request, *args, **kwargs):
+        serializer = RegisterSerializer(data=request.data)
+        attrs = await avalidate(serializer)
+        user = await serializer.acreate(attrs)
+        data = UserProfileSerializer(instance=user).data
+        return JsonResponse(data, status=201)
+
+
+class UpdatePasswordAsyncView(AsyncAPIView):
+    async def put(self, request, *args, **kwargs):
+        serializer = UpdatePasswordSerializer(data=request.data)
+        attrs = await avalidate(serializer)
+        await serializer.aupdate(instance=request.user, validated_data=attrs)
+        return JsonResponse({'detail': _('Şifreniz başarıyla güncellendi!')})
+
+
+class ForgotPasswordWithEmailFirstStepAsyncView(AsyncAPIView):
+    permission_classes = [AllowAny, CanAttemptPerm]
+
+    async def post(self, request, *args, **kwargs):
+        serializer = EmailSerializers(data=request.data)
+        attrs = await avalidate(serializer)
+        email = (
+            await User.objects.filter_by_email(attrs['email'])
+            .values_list('email', flat=True)
+            .afirst()
+        )
+        if email is not None:
+            with tracing.stage('delivery'):
+                code = await VerifyCode.agenerate(value=email, is_email=True)
+                await code.asend()
+        return JsonResponse({'detail': _('Mail gönderildi.')})
+
+
+class ForgotPasswordWithEmailSecondStepAsyncView(AsyncAPIView):
+    permission_classes = [CanAttemptPerm]
+
+    async def post(self, request, *args, **kwargs):
+        serializer = ForgotPasswordSerializer(data=request.data)
+        await avalidate(serializer)
+        return JsonResponse({'detail': _('Şifre başarıyla güncellendi.')})
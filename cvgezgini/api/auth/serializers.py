@@ -1,11 +1,17 @@
 import logging
 
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
 from django.utils.translation import gettext as _
 from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
-from cvgezgini.apps.accounts.models import User,VerifyCode
+from cvgezgini.apps.accounts.models import EMAIL_UNIQUE_CONSTRAINT, User, VerifyCode
+from cvgezgini.apps.core import tracing
+from cvgezgini.apps.core.db import routers
+from ..utils import hashing
 
 logger = logging.getLogger("AuthSerializer")
 
@@ -27,34 +33,62 @@ class PasswordField(serializers.CharField):
 class EmailSerializers(serializers.Serializer):
     email = serializers.EmailField()
 
+    async def avalidate(self, attrs):
+        return attrs
+
 class EmailLoginSerializer(serializers.Serializer):
     email = serializers.EmailField()
     password = PasswordField()
     token = serializers.CharField(label='Token', read_only=True)
 
     def validate(self, attrs):
-        email = attrs.get('email')
-        password = attrs.get('password')
-        if not (email and password):
-            msg = _('Email veya şifre gerekli.')
-            raise serializers.ValidationError(msg, code='authorization')
+        self._check_required(attrs)
+        try:
+            # auth_token is joined here so the view can hand out the token
+            # without another lookup. A replica may not have a new password
+            # yet.
+            with routers.primary():
+                user = User.objects.select_related('auth_token').get_by_email(
+                    attrs['email']
+                )
+        except User.DoesNotExist:
+            raise self._invalid()
+        if not hashing.verify_password(user, attrs['password']):
+            raise self._invalid()
 
-        msg = _('Sağlanan kimlik bilgileriyle oturum açılamıyor.')
+        attrs['user'] = user
+        return attrs
+
+    async def avalidate(self, attrs):
+        self._check_required(attrs)
         try:
-            user = User.objects.get(email=email)
+            with routers.primary():
+                user = await User.objects.select_related(
+                    'auth_token'
+                ).aget_by_email(attrs['email'])
         except User.DoesNotExist:
-            raise serializers.ValidationError(msg, code='authorization')
-        if not user.check_password(password):
-            raise serializers.ValidationError(msg, code='authorization')
+            raise self._invalid()
+        if not await hashing.averify_password(user, attrs['password']):
+            raise self._invalid()
+
+        attrs['user'] = user
         return attrs
 
+    def _check_required(self, attrs):
+        if not (attrs.get('email') and attrs.get('password')):
+            msg = _('Email veya şifre gerekli.')
+            raise serializers.ValidationError(msg, code='authorization')
+
+    def _invalid(self):
+        msg = _('Sağlanan kimlik bilgileriyle oturum açılamıyor.')
+        return serializers.ValidationError(msg, code='authorization')
+
 class RegisterSerializer(serializers.ModelSerializer):
     email = serializers.EmailField(
         required=True, 
     )
-    password = serializers.CharField(
-        write_only=True, required=True, validators=[validate_password]
-    )
+    # validated in validate, the validators must not run in the event loop
+    password = serializers.CharField(write_only=True, required=True)
 
     class Meta:
         model = User
@@ -66,12 +100,61 @@ class RegisterSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         password = validated_data.pop("password")
-        email = validated_data['email']
-        user = User.objects.create(**validated_data)
+        user = User(**validated_data)
+        # hashed before the INSERT, registration writes the row once
+        hashing.set_password(user, password)
+        self._save(user)
 
-        user.set_password(password)
-        user.save()
+        with tracing.stage('delivery'):
+            self.send_verify_code(user.email)
+        return user
+
+    def validate(self, attrs):
+        self._check_password(attrs['password'])
+        if User.objects.filter_by_email(attrs['email']).exists():
+            raise self._email_taken()
+        return attrs
+
+    async def avalidate(self, attrs):
+        await sync_to_async(self._check_password)(attrs['password'])
+        if await User.objects.filter_by_email(attrs['email']).aexists():
+            raise self._email_taken()
+        return attrs
 
+    def _check_password(self, password):
+        try:
+            validate_password(password)
+        except DjangoValidationError as e:
+            raise serializers.ValidationError({'password': e.messages})
+
+    async def acreate(self, validated_data):
+        password = validated_data.pop("password")
+        user = User(**validated_data)
+        await hashing.aset_password(user, password)
+        await sync_to_async(self._save)(user)
+
+        with tracing.stage('delivery'):
+            await self.asend_verify_code(user.email)
+        return user
+
+    def _save(self, user):
+        # a concurrent registration may take the email after validate
+        try:
+            with transaction.atomic():
+                user.save()
+        except IntegrityError as e:
+            # the constraint name is in the message on PostgreSQL and SQLite
+            if EMAIL_UNIQUE_CONSTRAINT not in str(e):
+                raise
+            raise self._email_taken()
+
+    def _email_taken(self):
+        return serializers.ValidationError(
+            {'email': [_('Bu e-posta ile kayıtlı bir kullanıcı var.')]},
+            code='unique',
+        )
+
+    def send_verify_code(self, email):
         try:
             code = VerifyCode.generate(value=email, is_email=True)
         except Exception as e:
@@ -85,7 +168,19 @@ class RegisterSerializer(serializers.ModelSerializer):
             except Exception as e:
                 logger.error(f"Could not send the code via mail! exception={e}")
 
-        return user
+    async def asend_verify_code(self, email):
+        try:
+            code = await VerifyCode.agenerate(value=email, is_email=True)
+        except Exception as e:
+            logger.error(
+                f"""Error while generating code in RegisterSerializer.
+                email={email}, exception={e}"""
+            )
+        else:
+            try:
+                await code.asend()
+            except Exception as e:
+                logger.error(f"Could not send the code via mail! exception={e}")
 
 
 class UserProfileSerializer(serializers.ModelSerializer):
@@ -96,9 +191,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
         fields = ("email", "first_name", "last_name")
 
     def get_email(self, obj):
-        if hasattr(obj, "email"):
-            return None
-        return obj.email.number
+        return obj.email
 
 
 
@@ -107,13 +200,38 @@ class UpdatePasswordSerializer(serializers.Serializer):
     new_password = PasswordField()
 
     def update(self, instance, validated_data):
-        old_password = validated_data['old_password']
-        new_password = validated_data['new_password']
-        if not instance.check_password(old_password):
-            raise serializers.ValidationError(
-                _('Mevcut şifre yanlış!'), code='wrong-password'
-            )
+        if not hashing.verify_password(instance, validated_data['old_password']):
+            raise self._wrong_password()
+        self._check_new_password(validated_data['new_password'])
+
+        hashing.set_password(instance, validated_data['new_password'])
+        instance.bump_token_version()
+        instance.save(update_fields=['password', 'token_version'])
+
+        return instance
+
+    async def avalidate(self, attrs):
+        return attrs
+
+    async def aupdate(self, instance, validated_data):
+        if not await hashing.averify_password(
+            instance, validated_data['old_password']
+        ):
+            raise self._wrong_password()
+        await sync_to_async(self._check_new_password)(validated_data['new_password'])
+
+        await hashing.aset_password(instance, validated_data['new_password'])
+        instance.bump_token_version()
+        await instance.asave(update_fields=['password', 'token_version'])
+
+        return instance
 
+    def _wrong_password(self):
+        return serializers.ValidationError(
+            _('Mevcut şifre yanlış!'), code='wrong-password'
+        )
+
+    def _check_new_password(self, new_password):
         try:
             validate_password(new_password)
         except:
@@ -123,11 +241,6 @@ class UpdatePasswordSerializer(serializers.Serializer):
                 ),
                 code='weak-password',
             )
-
-        instance.set_password(new_password)
-        instance.save()
-
-        return instance
     
 
 class ForgotPasswordSerializer(serializers.Serializer):
@@ -138,18 +251,44 @@ class ForgotPasswordSerializer(serializers.Serializer):
     def validate(self, attrs):
         email = attrs['email']
         try:
-            user = User.objects.get(email=email)
+            # saved below, token_version must be current
+            with routers.primary():
+                user = User.objects.get_by_email(email)
         except User.DoesNotExist:
             raise serializers.ValidationError()
+        self._check_new_password(attrs['new_password'])
+
+        # codes are sent to the stored address, see the first step
+        if not VerifyCode.consume(value=user.email, code=attrs['code']):
+            raise self._invalid_code()
+
+        hashing.set_password(user, attrs['new_password'])
+        user.bump_token_version()
+        user.save(update_fields=['password', 'token_version'])
+
+        return attrs
 
-        verifycode = VerifyCode.objects.get(value=email)
-        if not verifycode:
+    async def avalidate(self, attrs):
+        email = attrs['email']
+        try:
+            with routers.primary():
+                user = await User.objects.aget_by_email(email)
+        except User.DoesNotExist:
             raise serializers.ValidationError()
-        if not verifycode.is_valid(value=email,code=attrs['code']):
-                raise serializers.ValidationError(_('Kod yanlış veya süresi dolmuş.'))
+        await sync_to_async(self._check_new_password)(attrs['new_password'])
+
+        if not await VerifyCode.aconsume(value=user.email, code=attrs['code']):
+            raise self._invalid_code()
+
+        await hashing.aset_password(user, attrs['new_password'])
+        user.bump_token_version()
+        await user.asave(update_fields=['password', 'token_version'])
 
+        return attrs
+
+    def _check_new_password(self, new_password):
         try:
-            validate_password(attrs['new_password'])
+            validate_password(new_password)
         except:
             raise serializers.ValidationError(
                 _(
@@ -157,7 +296,5 @@ class ForgotPasswordSerializer(serializers.Serializer):
                 )
             )
 
-        user.set_password(attrs['new_password'])
-        user.save()
-
-        return attrs
\ No newline at end of file
+    def _invalid_code(self):
+        return serializers.ValidationError(_('Kod yanlış veya süresi dolmuş.'))
@@ -1,15 +1,40 @@
+import json
+from datetime import timedelta
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from django.test import RequestFactory
+from django.utils.timezone import now
+from unittest import mock
+
+from django.test import AsyncRequestFactory, RequestFactory, override_settings
 
 from rest_framework.test import APITestCase,APIClient
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 
-from cvgezgini.apps.accounts.models import User,VerifyCode
+from cvgezgini.apps.accounts import last_login
+from cvgezgini.apps.accounts.models import TokenRevocation, User,VerifyCode
+from cvgezgini.api.auth.async_views import (
+    ForgotPasswordWithEmailFirstStepAsyncView,
+    ForgotPasswordWithEmailSecondStepAsyncView,
+    LoginWithEmailAsyncView,
+    RegisterAsyncView,
+    UpdatePasswordAsyncView,
+)
+from cvgezgini.api.auth.serializers import RegisterSerializer
 from cvgezgini.api.auth.views import LoginWithEmailView
+from cvgezgini.api.utils import hashing, signed_tokens
 
+LOGIN_URL = reverse('api:login')
 UPDATE_PASSWORD_URL = reverse('api:update-password')
+IMPORT_USERS_URL = reverse('api:import-users')
+REFRESH_URL = reverse('api:token-refresh')
+REVOKE_URL = reverse('api:token-revoke')
+HEARTBEAT_URL = reverse('api:presence-heartbeat')
 FORGOT_PASSWORD_WITH_EMAIL_FIRST_STEP_URL = reverse(
     'api:forgot-password-with-email-first-step'
 )
@@ -19,8 +44,23 @@ FORGOT_PASSWORD_WITH_EMAIL_SECOND_STEP_URL = reverse(
 
 EMAIL = 'test@example.com'
 
+
+def user_writes(queries):
+    """
+    Kinds of the INSERT and UPDATE statements run on accounts_user.
+    """
+    writes = []
+    for query in queries:
+        words = query['sql'].split(None, 3)
+        if words[0] == 'INSERT' and words[2] == '"accounts_user"':
+            writes.append('INSERT')
+        elif words[0] == 'UPDATE' and words[1] == '"accounts_user"':
+            writes.append('UPDATE')
+    return writes
+
 class RegisterViewTestCase(APITestCase):
     def setUp(self):
+        cache.clear()
         self.url = reverse("api:register")
 
     def test_register_valid_data(self):
@@ -35,6 +75,36 @@ class RegisterViewTestCase(APITestCase):
         self.assertEqual(response.status_code, 201)
         self.assertTrue(User.objects.filter(email=data["email"]).exists())
         self.assertFalse("password" in response.data)
+        self.assertEqual(response.data["email"], data["email"])
+
+    def test_register_single_write(self):
+        data = {"email": "test@example.com", "password": "TestPassword123"}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(user_writes(queries), ['INSERT'])
+
+    def test_register_email_taken(self):
+        User.objects.create_user(username='taken', email='Test@Example.com')
+        data = {"email": "test@example.com", "password": "TestPassword123"}
+        response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['email'][0].code, 'unique')
+
+        # lost the race against a concurrent registration
+        with mock.patch.object(
+            RegisterSerializer, 'validate', lambda self, attrs: attrs
+        ):
+            response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(User.objects.filter_by_email(data['email']).count(), 1)
+
+    def test_register_other_integrity_error(self):
+        error = IntegrityError('NOT NULL constraint failed: accounts_user.gender')
+        with mock.patch.object(User, 'save', side_effect=error):
+            with self.assertRaises(IntegrityError):
+                RegisterSerializer()._save(User(email='test@example.com'))
+
 
 class LoginWithEmailTestCase(APITestCase):
     def setUp(self):
@@ -67,6 +137,106 @@ class LoginWithEmailTestCase(APITestCase):
         self.assertEqual(response.status_code, 400)
         self.assertEqual(response.data['non_field_errors'][0].code ,'authorization')
 
+    def test_login_email_case(self):
+        request = RequestFactory().post(
+            "/api/", {"email": self.email.upper(), "password": self.password}
+        )
+        response = LoginWithEmailView().post(request)
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(ATTEMPT_PROTECTION=False, LAST_LOGIN_PRECISION=0)
+    def test_login_query_count(self):
+        data = {"email": self.email, "password": self.password}
+        # user + token lookup, token insert, last_login update
+        with self.assertNumQueries(3):
+            response = self.client.post(LOGIN_URL, data)
+        self.assertEqual(response.status_code, 200)
+
+        # returning user already has a token
+        with self.assertNumQueries(2):
+            response = self.client.post(LOGIN_URL, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(
+            User.objects.filter(email=self.email, last_login__isnull=False).exists()
+        )
+
+    @override_settings(ATTEMPT_PROTECTION=False, LAST_LOGIN_FLUSH_INTERVAL=30)
+    @mock.patch.object(last_login, 'start_flusher')
+    def test_login_coalesced_last_login(self, start_flusher):
+        data = {"email": self.email, "password": self.password}
+        self.client.post(LOGIN_URL, data)
+        # user + token lookup only, last_login is buffered
+        with self.assertNumQueries(1):
+            response = self.client.post(LOGIN_URL, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(User.objects.get(email=self.email).last_login)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(last_login.flush(), 1)
+        self.assertIsNotNone(User.objects.get(email=self.email).last_login)
+
+        # within LAST_LOGIN_PRECISION of the stored value, nothing to write
+        self.client.post(LOGIN_URL, data)
+        self.assertEqual(last_login.flush(), 0)
+
+    @mock.patch.object(last_login, 'start_flusher')
+    def test_flush_keeps_the_latest_login(self, start_flusher):
+        user = User.objects.get(email=self.email)
+        latest = now()
+        User.objects.filter(pk=user.pk).update(last_login=latest)
+        # buffered by a process lagging behind another one
+        last_login._buffer(user.pk, latest - timedelta(minutes=5))
+        last_login.flush()
+        self.assertEqual(User.objects.get(pk=user.pk).last_login, latest)
+
+
+@override_settings(
+    ATTEMPT_PROTECTION=False,
+    PASSWORD_HASHERS=[
+        'cvgezgini.apps.accounts.hashers.ScryptPasswordHasher',
+        'cvgezgini.apps.accounts.hashers.PBKDF2PasswordHasher',
+    ],
+    PBKDF2_ITERATIONS=1000,
+    SCRYPT_WORK_FACTOR=2**10,
+)
+class LoginRehashTestCase(APITestCase):
+    def setUp(self):
+        self.password = 'helloword'
+        self.user = User.objects.create_user(
+            username='newuser', email=EMAIL, password=self.password
+        )
+
+    def login(self):
+        response = self.client.post(
+            LOGIN_URL, {'email': EMAIL, 'password': self.password}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+
+    def test_rehash_on_cost_change(self):
+        self.assertTrue(self.user.password.startswith('scrypt$1024$'))
+        with self.settings(SCRYPT_WORK_FACTOR=2**11):
+            self.login()
+        self.assertTrue(self.user.password.startswith('scrypt$2048$'))
+
+    def test_rehash_on_lowered_cost(self):
+        # verifying needs the memory of the stored hash, not of the settings
+        with self.settings(SCRYPT_WORK_FACTOR=2**15):
+            self.user.set_password(self.password)
+            self.user.save(update_fields=['password'])
+        self.login()
+        self.assertTrue(self.user.password.startswith('scrypt$1024$'))
+
+    def test_rehash_on_hasher_change(self):
+        with self.settings(
+            PASSWORD_HASHERS=[
+                'cvgezgini.apps.accounts.hashers.PBKDF2PasswordHasher',
+                'cvgezgini.apps.accounts.hashers.ScryptPasswordHasher',
+            ]
+        ):
+            self.login()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+
 
 class UpdatePassword(APITestCase):
     def setUp(self) -> None:
@@ -76,6 +246,18 @@ class UpdatePassword(APITestCase):
         )
         self.client.force_login(self.user)
 
+    def test_update_writes_password_only(self):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.put(
+                UPDATE_PASSWORD_URL,
+                {'old_password': self.password, 'new_password': 'my-new-password'},
+            )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(user_writes(queries), ['UPDATE'])
+        update = [q['sql'] for q in queries if q['sql'].startswith('UPDATE')][0]
+        self.assertIn('"password"', update)
+        self.assertNotIn('"full_name"', update)
+
     def test_update(self):
         new_password = 'my-new-password'
         res = self.client.put(
@@ -109,6 +291,7 @@ class UpdatePassword(APITestCase):
 
 class ForgotPasswordWithemail(APITestCase):
     def setUp(self) -> None:
+        cache.clear()
         self.client = APIClient(REMOTE_ADDR='100.10.10.10')
         self.user = User.objects.create_user(
             username='newuser', email=EMAIL, password='helloword'
@@ -134,3 +317,341 @@ class ForgotPasswordWithemail(APITestCase):
         self.user.refresh_from_db()
         self.assertEqual(res.data['detail'],'Şifre başarıyla güncellendi.')
         self.assertTrue(self.user.check_password(new_password))
+
+    def test_forgot_password_email_case(self):
+        res = self.client.post(
+            FORGOT_PASSWORD_WITH_EMAIL_FIRST_STEP_URL, {'email': EMAIL.upper()}
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        code = VerifyCode.objects.get(value=EMAIL).code
+        res = self.client.post(
+            FORGOT_PASSWORD_WITH_EMAIL_SECOND_STEP_URL,
+            {'email': EMAIL.title(), 'code': code, 'new_password': 'FooBarFooBar'},
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('FooBarFooBar'))
+
+
+@override_settings(ATTEMPT_PROTECTION=False)
+class AsyncAuthViewsTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = AsyncRequestFactory()
+        self.password = 'helloword'
+        self.user = User.objects.create_user(
+            username='newuser', email=EMAIL, password=self.password
+        )
+
+    async def test_login(self):
+        request = self.factory.post(
+            LOGIN_URL,
+            {'email': EMAIL, 'password': self.password},
+            content_type='application/json',
+        )
+        response = await LoginWithEmailAsyncView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('token', json.loads(response.content))
+
+        request = self.factory.post(
+            LOGIN_URL, {'email': EMAIL, 'password': 'wrong-password'}
+        )
+        response = await LoginWithEmailAsyncView.as_view()(request)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('non_field_errors', json.loads(response.content))
+
+    async def test_register(self):
+        request = self.factory.post(
+            '/',
+            {
+                'email': 'new@example.com',
+                'password': 'TestPassword123',
+                'first_name': 'John',
+            },
+            content_type='application/json',
+        )
+        response = await RegisterAsyncView.as_view()(request)
+        self.assertEqual(response.status_code, 201)
+        user = await User.objects.aget(email='new@example.com')
+        self.assertTrue(user.check_password('TestPassword123'))
+
+    @override_settings(PASSWORD_HASHING_RETRY_AFTER=3)
+    async def test_hashing_unavailable(self):
+        request = self.factory.post(
+            LOGIN_URL, {'email': EMAIL, 'password': self.password}
+        )
+        with mock.patch.object(
+            hashing, 'asubmit', side_effect=hashing.HashingUnavailable
+        ):
+            response = await LoginWithEmailAsyncView.as_view()(request)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '3')
+
+    async def test_update_password(self):
+        token = await Token.objects.acreate(user=self.user)
+        data = {'old_password': self.password, 'new_password': 'NewPassword123'}
+
+        request = self.factory.put(
+            UPDATE_PASSWORD_URL, data, content_type='application/json'
+        )
+        response = await UpdatePasswordAsyncView.as_view()(request)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Token')
+
+        request = self.factory.put(
+            UPDATE_PASSWORD_URL,
+            data,
+            content_type='application/json',
+            headers={'Authorization': f'Token {token.key}'},
+        )
+        response = await UpdatePasswordAsyncView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        await self.user.arefresh_from_db()
+        self.assertTrue(self.user.check_password('NewPassword123'))
+
+    @override_settings(AUTH_TOKEN_MODE='signed', SIGNED_TOKEN_KEYS=['new-key'])
+    async def test_update_password_with_signed_token(self):
+        signed_tokens.deny_list.clear()
+        token = signed_tokens.encode(self.user, signed_tokens.ACCESS)
+        data = {'old_password': self.password, 'new_password': 'NewPassword123'}
+
+        request = self.factory.put(
+            UPDATE_PASSWORD_URL,
+            data,
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {token}'},
+        )
+        response = await UpdatePasswordAsyncView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        await self.user.arefresh_from_db()
+        self.assertTrue(self.user.check_password('NewPassword123'))
+
+    async def test_update_password_with_session(self):
+        await sync_to_async(self.client.force_login)(self.user)
+        data = {'old_password': self.password, 'new_password': 'NewPassword123'}
+
+        request = self.factory.put(
+            UPDATE_PASSWORD_URL, data, content_type='application/json'
+        )
+        request.session = self.client.session
+        response = await UpdatePasswordAsyncView.as_view()(request)
+        # no CSRF token
+        self.assertEqual(response.status_code, 403)
+
+        request._dont_enforce_csrf_checks = True
+        response = await UpdatePasswordAsyncView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        await self.user.arefresh_from_db()
+        self.assertTrue(self.user.check_password('NewPassword123'))
+
+    async def test_forgot_password(self):
+        request = self.factory.post(
+            FORGOT_PASSWORD_WITH_EMAIL_FIRST_STEP_URL,
+            {'email': EMAIL},
+            content_type='application/json',
+        )
+        response = await ForgotPasswordWithEmailFirstStepAsyncView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        code = await VerifyCode.objects.aget(value=EMAIL)
+
+        data = {'email': EMAIL, 'code': code.code, 'new_password': 'NewPassword123'}
+        request = self.factory.post(
+            FORGOT_PASSWORD_WITH_EMAIL_SECOND_STEP_URL,
+            data,
+            content_type='application/json',
+        )
+        response = await ForgotPasswordWithEmailSecondStepAsyncView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        await self.user.arefresh_from_db()
+        self.assertTrue(self.user.check_password('NewPassword123'))
+        self.assertFalse(await VerifyCode.objects.filter(value=EMAIL).aexists())
+
+
+@override_settings(
+    ATTEMPT_PROTECTION=False,
+    AUTH_TOKEN_MODE='signed',
+    SIGNED_TOKEN_KEYS=['new-key', 'old-key'],
+)
+class SignedTokenTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        signed_tokens.deny_list.clear()
+        self.password = 'helloword'
+        self.user = User.objects.create_user(
+            username='newuser', email=EMAIL, password=self.password
+        )
+
+    def login(self):
+        response = self.client.post(
+            LOGIN_URL, {'email': EMAIL, 'password': self.password}
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def heartbeat(self, token):
+        return self.client.post(HEARTBEAT_URL, HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_login_without_database_token(self):
+        data = self.login()
+        self.assertEqual(set(data), {'token', 'refresh'})
+        self.assertFalse(Token.objects.exists())
+
+        self.assertEqual(self.heartbeat(data['token']).status_code, 204)
+        # the deny list is read once per TOKEN_DENY_LIST_REFRESH
+        with self.assertNumQueries(0):
+            response = self.heartbeat(data['token'])
+        self.assertEqual(response.status_code, 204)
+
+        response = self.heartbeat(data['refresh'])
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Token')
+
+    def test_refresh(self):
+        data = self.login()
+        response = self.client.post(REFRESH_URL, {'refresh': data['refresh']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.heartbeat(response.data['token']).status_code, 204)
+
+        response = self.client.post(REFRESH_URL, {'refresh': data['token']})
+        self.assertEqual(response.status_code, 401)
+
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        response = self.client.post(REFRESH_URL, {'refresh': data['refresh']})
+        self.assertEqual(response.status_code, 401)
+
+    def test_password_change_revokes_tokens(self):
+        data = self.login()
+        response = self.client.put(
+            UPDATE_PASSWORD_URL,
+            {'old_password': self.password, 'new_password': 'my-new-password'},
+            HTTP_AUTHORIZATION=f'Bearer {data["token"]}',
+        )
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.heartbeat(data['token']).status_code, 401)
+        response = self.client.post(REFRESH_URL, {'refresh': data['refresh']})
+        self.assertEqual(response.status_code, 401)
+
+        # other processes pick the revocation up from the database
+        signed_tokens.deny_list.clear()
+        self.assertEqual(self.heartbeat(data['token']).status_code, 401)
+
+        self.password = 'my-new-password'
+        self.assertEqual(self.heartbeat(self.login()['token']).status_code, 204)
+
+    def test_revoke(self):
+        data = self.login()
+        response = self.client.post(
+            REVOKE_URL,
+            {'refresh': data['refresh']},
+            HTTP_AUTHORIZATION=f'Bearer {data["token"]}',
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.heartbeat(data['token']).status_code, 401)
+        response = self.client.post(REFRESH_URL, {'refresh': data['refresh']})
+        self.assertEqual(response.status_code, 401)
+
+    def test_revoked_by_another_process(self):
+        data = self.login()
+        payload = signed_tokens.decode(data['refresh'], signed_tokens.REFRESH)
+        # this process read the deny list before the other one revoked
+        signed_tokens.deny_list.refresh()
+        TokenRevocation.objects.create(
+            user=self.user, jti=payload['j'], expire_at=now() + timedelta(days=1)
+        )
+
+        response = self.client.post(REFRESH_URL, {'refresh': data['refresh']})
+        self.assertEqual(response.status_code, 401)
+
+        # whatever the ids, the new row is read on the next refresh
+        signed_tokens.deny_list._next_check = 0
+        with self.assertRaises(signed_tokens.InvalidToken):
+            signed_tokens.decode(data['refresh'], signed_tokens.REFRESH)
+
+    def test_deny_list_refresh_is_incremental(self):
+        deny_list = signed_tokens.deny_list
+        old = TokenRevocation.objects.create(
+            user=self.user, jti='old', expire_at=now() + timedelta(days=1)
+        )
+        TokenRevocation.objects.filter(pk=old.pk).update(
+            created_at=now() - timedelta(hours=1)
+        )
+        deny_list.refresh()
+        self.assertIn('old', deny_list._tokens)
+
+        # committed late, created within the overlap of the watermark
+        late = TokenRevocation.objects.create(
+            user=self.user, jti='late', expire_at=now() + timedelta(seconds=1)
+        )
+        TokenRevocation.objects.filter(pk=late.pk).update(
+            created_at=deny_list._watermark - timedelta(seconds=30)
+        )
+        deny_list._next_check = 0
+        with CaptureQueriesContext(connection) as queries:
+            deny_list.refresh()
+        self.assertIn('created_at', queries[0]['sql'])
+        self.assertEqual(set(deny_list._tokens), {'old', 'late'})
+
+        # expired entries are dropped even though no row is read again
+        with mock.patch.object(
+            signed_tokens, 'now', return_value=now() + timedelta(minutes=1)
+        ):
+            deny_list._next_check = 0
+            deny_list.refresh()
+        self.assertEqual(set(deny_list._tokens), {'old'})
+
+    def test_key_rotation(self):
+        with override_settings(SIGNED_TOKEN_KEYS=['old-key']):
+            token = self.login()['token']
+        self.assertEqual(self.heartbeat(token).status_code, 204)
+
+        with override_settings(SIGNED_TOKEN_KEYS=['new-key']):
+            self.assertEqual(self.heartbeat(token).status_code, 401)
+
+    @override_settings(ACCESS_TOKEN_LIFETIME=-1)
+    def test_expired(self):
+        self.assertEqual(self.heartbeat(self.login()['token']).status_code, 401)
+
+
+class ImportUsersTestCase(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', is_staff=True
+        )
+        self.body = (
+            'email,password\n'
+            'new@example.com,TestPassword123\n'
+            'admin@example.com,TestPassword123\n'
+        )
+
+    def test_import(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.post(
+            IMPORT_USERS_URL, self.body, content_type='text/csv'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['errors'][0]['line'], 3)
+        self.assertTrue(User.objects.filter(email='new@example.com').exists())
+
+        response = self.client.post(
+            IMPORT_USERS_URL, self.body, content_type='application/xml'
+        )
+        self.assertEqual(response.status_code, 415)
+
+    @override_settings(IMPORT_USERS_MAX_ROWS=1)
+    def test_too_many_rows(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.post(
+            IMPORT_USERS_URL, self.body, content_type='text/csv'
+        )
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(User.objects.filter(email='new@example.com').exists())
+
+    def test_admin_only(self):
+        user = User.objects.create_user(username='user', email=EMAIL)
+        self.client.force_authenticate(user)
+        response = self.client.post(
+            IMPORT_USERS_URL, self.body, content_type='text/csv'
+        )
+        self.assertEqual(response.status_code, 403)
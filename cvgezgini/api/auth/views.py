@@ -1,12 +1,21 @@
+import codecs
+from itertools import islice
+
+from django.conf import settings
 from rest_framework.views import APIView
 from rest_framework.authtoken.models import Token
-from rest_framework.permissions import AllowAny
+from rest_framework.exceptions import UnsupportedMediaType
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
 
 from django.utils.translation import gettext as _
-from django.contrib.auth.models import update_last_login
 
+from cvgezgini.apps.accounts import last_login
 from cvgezgini.apps.accounts.models import User,VerifyCode
+from cvgezgini.apps.accounts.provisioning import UserImporter, read_rows
+from cvgezgini.apps.core import tracing
+from cvgezgini.apps.core.db import routers
+from ..utils import signed_tokens
 from ..utils.permissions import CanAttemptPerm
 from .serializers import (
     EmailLoginSerializer,
@@ -17,21 +26,99 @@ from .serializers import (
     UserProfileSerializer
     )
 
+
+def issue_token(user):
+    """
+    Returns the login response data of an already authenticated user and
+    stamps last_login (see accounts.last_login): the auth token, or signed
+    access and refresh tokens when AUTH_TOKEN_MODE is "signed". The user
+    should come with `auth_token` joined, then a returning user costs at most
+    a single UPDATE here.
+    """
+    last_login.record(user)
+    if settings.AUTH_TOKEN_MODE == 'signed':
+        return signed_tokens.issue(user)
+
+    try:
+        token = user.auth_token
+    except Token.DoesNotExist:
+        token = Token.objects.create(user=user)
+    return {"token": str(token)}
+
+
+async def aissue_token(user):
+    await last_login.arecord(user)
+    if settings.AUTH_TOKEN_MODE == 'signed':
+        return signed_tokens.issue(user)
+
+    try:
+        token = user.auth_token
+    except Token.DoesNotExist:
+        token = await Token.objects.acreate(user=user)
+    return {"token": str(token)}
+
 class LoginWithEmailView(APIView):
     permission_classes = [AllowAny,CanAttemptPerm]
 
     def post(self, request, *args, **kwargs):
         serializer = EmailLoginSerializer(data=request.POST)
-        if not serializer.is_valid():
+        with tracing.stage('validation'):
+            valid = serializer.is_valid()
+        if not valid:
             return Response(data=serializer.errors, status=400)
-        user = User.objects.get(email=serializer.data["email"])
+        user = serializer.validated_data["user"]
         if not user.is_active:
             return Response(data={"detail": _("Hesabınız aktif değil!")}, status=403)
 
-        token, x = Token.objects.get_or_create(user=user)
-        update_last_login(None, user)
+        return Response(data=issue_token(user))
 
-        return Response(data={"token": str(token)})
+
+class RefreshTokenView(APIView):
+    """
+    Exchanges a signed refresh token for a new access token. The user and
+    the revocations are read again, so deactivated users, changed passwords
+    and logouts of other processes are caught here.
+    """
+
+    permission_classes = [AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        try:
+            payload = signed_tokens.decode(
+                str(request.data.get('refresh', '')), signed_tokens.REFRESH
+            )
+            with routers.primary():
+                user = User.objects.get(pk=payload['u'])
+            if signed_tokens.is_revoked_stored(payload):
+                raise signed_tokens.InvalidToken()
+        except (signed_tokens.InvalidToken, User.DoesNotExist):
+            return Response(data={"detail": _("Geçersiz token!")}, status=401)
+        if not user.is_active or user.token_version != payload['v']:
+            return Response(data={"detail": _("Geçersiz token!")}, status=401)
+
+        token = signed_tokens.encode(user, signed_tokens.ACCESS)
+        return Response(data={"token": token})
+
+
+class RevokeTokenView(APIView):
+    """
+    Logout of the signed token mode: revokes the given refresh token and the
+    access token the request is authenticated with, if any.
+    """
+
+    permission_classes = [AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        try:
+            payload = signed_tokens.decode(
+                str(request.data.get('refresh', '')), signed_tokens.REFRESH
+            )
+        except signed_tokens.InvalidToken:
+            return Response(data={"detail": _("Geçersiz token!")}, status=400)
+        signed_tokens.deny_list.revoke_token(payload, signed_tokens.REFRESH)
+        if isinstance(request.auth, dict) and request.auth['u'] == payload['u']:
+            signed_tokens.deny_list.revoke_token(request.auth, signed_tokens.ACCESS)
+        return Response(status=204)
 
 
 class RegisterView(APIView):
@@ -40,7 +127,8 @@ class RegisterView(APIView):
 
     def post(self, request, *args, **kwargs):
         serializer = RegisterSerializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        with tracing.stage('validation'):
+            serializer.is_valid(raise_exception=True)
         user = serializer.save()
         data = UserProfileSerializer(instance=user).data
         return Response(data, status=201)
@@ -48,7 +136,8 @@ class RegisterView(APIView):
 class UpdatePassword(APIView):
     def put(self, request, *args, **kwargs):
         serializer = UpdatePasswordSerializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        with tracing.stage('validation'):
+            serializer.is_valid(raise_exception=True)
         serializer.update(
             instance=request.user, validated_data=serializer.validated_data
         )
@@ -68,14 +157,17 @@ class ForgotPasswordWithEmailFirstStep(APIView):
 
     def post(self, request, *args, **kwargs):
         serializer = EmailSerializers(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        email = serializer.validated_data['email']
-        try:
-            User.objects.get(email=email)
-        except User.DoesNotExist:
-            pass
-        else:
-            VerifyCode.generate(value=email, is_email=True)
+        with tracing.stage('validation'):
+            serializer.is_valid(raise_exception=True)
+        # the stored address, whatever case it was typed in
+        email = (
+            User.objects.filter_by_email(serializer.validated_data['email'])
+            .values_list('email', flat=True)
+            .first()
+        )
+        if email is not None:
+            with tracing.stage('delivery'):
+                VerifyCode.generate(value=email, is_email=True).send()
         return Response({'detail': _('Mail gönderildi.')})
 
 
@@ -92,7 +184,57 @@ class ForgotPasswordWithEmailSecondStep(APIView):
     def post(self, request):
         serializer = self.serializer_class(data=request.data)
 
-        if serializer.is_valid():
+        with tracing.stage('validation'):
+            valid = serializer.is_valid()
+        if valid:
             return Response({'detail': _('Şifre başarıyla güncellendi.')})
 
         return Response(serializer.errors, status=400)
+
+
+class ImportUsersView(APIView):
+    """
+    Bulk provisioning for admins. Takes a CSV (text/csv) or JSON lines
+    (application/x-ndjson) body, streamed row by row, see
+    accounts.provisioning for the columns. `?send_codes=1` queues a
+    verification code for every new user. Bodies over IMPORT_USERS_MAX_ROWS
+    rows are refused with 413, they go through the import_users command.
+    returns the created count, the error count and the first per row errors
+    """
+
+    permission_classes = [IsAdminUser]
+    formats = {
+        'text/csv': 'csv',
+        'application/x-ndjson': 'jsonl',
+        'application/jsonl': 'jsonl',
+    }
+
+    def post(self, request, *args, **kwargs):
+        format = self.formats.get(request.content_type.split(';')[0].strip())
+        if format is None:
+            raise UnsupportedMediaType(request.content_type)
+
+        lines = codecs.iterdecode(request.stream or [], 'utf-8')
+        maximum = settings.IMPORT_USERS_MAX_ROWS
+        # the passwords are hashed in this request, the size is checked first
+        rows = list(islice(read_rows(lines, format), maximum + 1))
+        if len(rows) > maximum:
+            return Response(
+                {
+                    'detail': _(
+                        'En fazla %(maximum)s satır yüklenebilir, daha büyük '
+                        'dosyalar import_users komutuyla yüklenmeli.'
+                    ) % {'maximum': maximum}
+                },
+                status=413,
+            )
+
+        send_codes = request.query_params.get('send_codes') == '1'
+        importer = UserImporter(send_codes=send_codes).run(rows)
+        return Response(
+            {
+                'created': importer.created,
+                'error_count': importer.error_count,
+                'errors': importer.errors,
+            }
+        )
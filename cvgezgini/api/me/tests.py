@@ -0,0 +1,79 @@
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from cvgezgini.api.utils.profile_cache import profile_cache
+from cvgezgini.apps.accounts.models import Profile, User
+
+ME_URL = reverse('api:me')
+
+
+class MeViewTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', first_name='Ali'
+        )
+        self.profile = Profile.objects.create(user=self.user, about='Merhaba')
+        self.client.force_authenticate(self.user)
+
+    def test_me(self):
+        with self.assertNumQueries(1):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], 'user@example.com')
+        self.assertEqual(res.data['first_name'], 'Ali')
+        self.assertEqual(res.data['profile']['about'], 'Merhaba')
+        self.assertEqual(res.data['profile']['invite_code'], self.profile.invite_code)
+        self.assertIn('private', res['Cache-Control'])
+
+        # served from the cache
+        with self.assertNumQueries(0):
+            again = self.client.get(ME_URL)
+        self.assertEqual(again.data, res.data)
+        self.assertEqual(again['ETag'], res['ETag'])
+
+    def test_not_modified(self):
+        etag = self.client.get(ME_URL)['ETag']
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b'')
+        self.assertEqual(res['ETag'], etag)
+
+    def test_saving_changes_the_etag(self):
+        etag = self.client.get(ME_URL)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile.about = 'Yeni'
+            self.profile.save()
+        res = self.client.get(ME_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['profile']['about'], 'Yeni')
+        self.assertNotEqual(res['ETag'], etag)
+
+        etag = res['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.last_name = 'Veli'
+            self.user.save()
+        res = self.client.get(ME_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.data['last_name'], 'Veli')
+
+    @override_settings(PROFILE_CACHE_TIMEOUT=3600, PROFILE_CACHE_LOCAL_TIMEOUT=5)
+    def test_per_process_cache(self):
+        # the locmem cache of the suite, not invalidated by other workers
+        self.assertEqual(profile_cache.timeout, 5)
+
+    def test_without_profile(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile.delete()
+        res = self.client.get(ME_URL)
+        self.assertIsNone(res.data['profile'])
+
+    def test_unauthenticated(self):
+        self.client.force_authenticate(None)
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -0,0 +1,67 @@
+from rest_framework import serializers
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+
+from cvgezgini.api.auth.serializers import UserProfileSerializer
+from cvgezgini.api.utils.profile_cache import profile_cache
+from cvgezgini.apps.accounts.models import Profile, User
+from cvgezgini.apps.core.db import routers
+
+
+class ProfileSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Profile
+        fields = ('about', 'invite_code')
+
+
+class MeSerializer(UserProfileSerializer):
+    phone = serializers.CharField(read_only=True)
+    profile = ProfileSerializer(read_only=True)
+
+    class Meta(UserProfileSerializer.Meta):
+        fields = (
+            'id',
+            'email',
+            'first_name',
+            'last_name',
+            'full_name',
+            'phone',
+            'phone_verified',
+            'is_premium',
+            'birth_date',
+            'gender',
+            'profile',
+        )
+
+
+class MeView(APIView):
+    """
+    Returns the user with the profile. Send the ETag of the last response as
+    If-None-Match, a 304 without a body comes back while nothing changed
+    """
+
+    def get(self, request, *args, **kwargs):
+        user_id = request.user.pk
+        version = profile_cache.version(user_id)
+        etag = quote_etag(f'{user_id}-{version}')
+
+        etags = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in etags or '*' in etags:
+            response = HttpResponseNotModified()
+        else:
+            data = profile_cache.get(user_id, version)
+            if data is None:
+                # a lagging replica would be cached under the new version
+                with routers.primary():
+                    user = User.objects.select_related('profile').get(pk=user_id)
+                data = dict(MeSerializer(user).data)
+                profile_cache.set(user_id, version, data)
+            response = Response(data)
+
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
@@ -0,0 +1,57 @@
+from django.test import override_settings
+from django.urls import reverse
+
+from rest_framework.test import APITestCase
+
+from cvgezgini.apps.accounts.models import User
+from cvgezgini.apps.core.tracing import registry
+
+LOGIN_URL = reverse('api:login')
+METRICS_URL = reverse('api:metrics')
+
+
+@override_settings(ATTEMPT_PROTECTION=False, METRICS_TOKEN='secret')
+class MetricsTestCase(APITestCase):
+    def setUp(self):
+        registry.reset()
+        self.password = 'helloword'
+        User.objects.create_user(
+            username='user', email='test@example.com', password=self.password
+        )
+
+    def login(self):
+        return self.client.post(
+            LOGIN_URL, {'email': 'test@example.com', 'password': self.password}
+        )
+
+    def test_server_timing(self):
+        with self.settings(DEVELOPMENT_MODE=True):
+            response = self.login()
+        self.assertEqual(response.status_code, 200)
+        timing = response['Server-Timing']
+        for name in ('permission', 'validation', 'hashing', 'db', 'total'):
+            self.assertIn(f'{name};dur=', timing)
+
+        with self.settings(DEVELOPMENT_MODE=False):
+            response = self.login()
+        self.assertNotIn('Server-Timing', response)
+
+    def test_metrics(self):
+        self.login()
+        response = self.client.get(METRICS_URL)
+        self.assertEqual(response.status_code, 401)
+
+        response = self.client.get(METRICS_URL, HTTP_X_METRICS_TOKEN='secret')
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode()
+        self.assertIn(
+            'cvgezgini_stage_seconds_count{route="login",stage="hashing"} 1',
+            content,
+        )
+        self.assertIn('cvgezgini_db_queries_bucket{route="login",le="+Inf"} 1', content)
+
+        response = self.client.get(
+            METRICS_URL, {'format': 'json'}, HTTP_X_METRICS_TOKEN='secret'
+        )
+        routes = {row['route'] for row in response.json()['db_queries']}
+        self.assertIn('login', routes)
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+
+from rest_framework.permissions import BasePermission, IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from cvgezgini.apps.core.tracing import registry
+
+
+class HasMetricsToken(BasePermission):
+    def has_permission(self, request, view):
+        token = request.headers.get('X-Metrics-Token', '')
+        return bool(settings.METRICS_TOKEN) and constant_time_compare(
+            token, settings.METRICS_TOKEN
+        )
+
+
+class MetricsView(APIView):
+    """
+    Request stage histograms of this process in Prometheus text format,
+    `?format=json` returns them as JSON. Every worker keeps histograms of its
+    own and answers with those only, nothing is aggregated: behind a load
+    balancer a scrape reads a random worker and the counters appear to jump.
+    Scrape each worker directly, labelled by instance, and sum in Prometheus.
+    """
+
+    permission_classes = [HasMetricsToken | IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        if request.query_params.get('format') == 'json':
+            return Response(registry.as_json())
+        return HttpResponse(
+            registry.as_prometheus(), content_type='text/plain; version=0.0.4'
+        )
@@ -0,0 +1,41 @@
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from cvgezgini.apps.accounts import presence
+from cvgezgini.apps.accounts.models import User
+
+HEARTBEAT_URL = reverse('api:presence-heartbeat')
+ONLINE_URL = reverse('api:presence-online')
+
+
+@override_settings(PRESENCE_FLUSH_INTERVAL=0)
+class PresenceViewsTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='user', email='a@example.com')
+        self.other = User.objects.create_user(username='other', email='b@example.com')
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        presence.flush()
+
+    def test_heartbeat(self):
+        res = self.client.post(HEARTBEAT_URL)
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+        res = self.client.get(ONLINE_URL, {'ids': f'{self.user.pk},{self.other.pk}'})
+        self.assertEqual(res.data, {'online': [self.user.pk]})
+
+        self.client.delete(HEARTBEAT_URL)
+        res = self.client.get(ONLINE_URL, {'ids': f'{self.user.pk}'})
+        self.assertEqual(res.data, {'online': []})
+
+    def test_invalid_ids(self):
+        res = self.client.get(ONLINE_URL, {'ids': '1,x'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.get(ONLINE_URL, {'ids': ','.join(map(str, range(501)))})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
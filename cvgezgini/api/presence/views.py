@@ -0,0 +1,51 @@
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from django.utils.translation import gettext as _
+
+from cvgezgini.apps.accounts import presence
+
+MAX_IDS = 500
+
+
+class HeartbeatView(APIView):
+    """
+    Marks the user online for PRESENCE_TIMEOUT seconds, clients call it
+    periodically while connected. Nothing is written to the database here.
+    """
+
+    def post(self, request, *args, **kwargs):
+        presence.heartbeat(request.user.pk)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def delete(self, request, *args, **kwargs):
+        presence.disconnect(request.user.pk)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class OnlineUsersView(APIView):
+    """
+    Takes comma separated user ids (?ids=1,2,3), at most 500
+    returns the online ones
+    """
+
+    def get(self, request, *args, **kwargs):
+        try:
+            user_ids = {
+                int(user_id)
+                for user_id in request.query_params.get('ids', '').split(',')
+                if user_id
+            }
+        except ValueError:
+            raise ValidationError({'ids': _('Geçersiz kullanıcı id.')})
+        if len(user_ids) > MAX_IDS:
+            raise ValidationError(
+                {
+                    'ids': _('En fazla %(maximum)s kullanıcı sorgulanabilir.')
+                    % {'maximum': MAX_IDS}
+                }
+            )
+
+        return Response({'online': sorted(presence.online(user_ids))})
@@ -0,0 +1,55 @@
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from cvgezgini.apps.accounts.models import Invitation, User
+
+REFERRALS_URL = reverse('api:referrals')
+DOWNLINE_URL = reverse('api:referrals-downline')
+TOP_URL = reverse('api:referrals-top')
+
+
+class ReferralViewsTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', email='a@example.com')
+        self.invited = User.objects.create_user(username='b', email='b@example.com')
+        self.indirect = User.objects.create_user(username='c', email='c@example.com')
+        Invitation.objects.create(inviter=self.user, invited=self.invited)
+        Invitation.objects.create(inviter=self.invited, invited=self.indirect)
+        self.client.force_authenticate(self.user)
+
+    def test_stats(self):
+        res = self.client.get(REFERRALS_URL)
+        self.assertEqual(res.data, {'direct': 1, 'total': 2})
+
+    def test_downline(self):
+        res = self.client.get(DOWNLINE_URL)
+        self.assertEqual(
+            [row['user']['id'] for row in res.data], [self.invited.pk]
+        )
+        # the paths joined with their users, whatever the depth
+        with self.assertNumQueries(1):
+            res = self.client.get(DOWNLINE_URL, {'depth': 2})
+        self.assertEqual(
+            [(row['user']['id'], row['depth']) for row in res.data],
+            [(self.invited.pk, 1), (self.indirect.pk, 2)],
+        )
+
+        res = self.client.get(DOWNLINE_URL, {'depth': 11})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_top(self):
+        res = self.client.get(TOP_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        res = self.client.get(TOP_URL, {'limit': 1})
+        self.assertEqual(res.data[0]['user']['id'], self.user.pk)
+        self.assertEqual(res.data[0]['total'], 2)
+
+        res = self.client.get(TOP_URL, {'limit': 'x'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.get(TOP_URL, {'limit': 101})
+        self.assertEqual(res.data['limit'], '1 ile 100 arasında olmalı.')
@@ -0,0 +1,86 @@
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import ListAPIView
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from django.utils.translation import gettext as _
+
+from cvgezgini.apps.accounts import referrals
+from cvgezgini.apps.accounts.models import ReferralPath
+
+MAX_TOP = 100
+
+
+class ReferralUserSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    full_name = serializers.CharField()
+
+
+class DownlineSerializer(serializers.Serializer):
+    user = ReferralUserSerializer(source='descendant')
+    depth = serializers.IntegerField()
+
+
+class TopReferrerSerializer(serializers.Serializer):
+    user = ReferralUserSerializer()
+    direct = serializers.IntegerField()
+    total = serializers.IntegerField()
+
+
+def int_param(request, name, default, maximum):
+    value = request.query_params.get(name)
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValidationError({name: _('Geçersiz sayı.')})
+    if not 1 <= value <= maximum:
+        raise ValidationError(
+            {name: _('1 ile %(maximum)s arasında olmalı.') % {'maximum': maximum}}
+        )
+    return value
+
+
+class ReferralStatsView(APIView):
+    """
+    Returns how many users the user invited, directly and in total
+    """
+
+    def get(self, request, *args, **kwargs):
+        return Response(referrals.counts(request.user.pk))
+
+
+class DownlineView(ListAPIView):
+    """
+    Lists the users below the user, nearest first, at most ?depth= (1 by
+    default) invitations deep
+    """
+
+    serializer_class = DownlineSerializer
+    max_depth = 10
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            # schema generation, there is no request
+            return ReferralPath.objects.none()
+        depth = int_param(self.request, 'depth', 1, self.max_depth)
+        return referrals.downline(self.request.user.pk, max_depth=depth)
+
+
+class TopReferrersView(APIView):
+    """
+    Returns the users with the most invited users (?direct=1 counts direct
+    invitations only), at most ?limit= (10 by default). Admins only, the
+    list names other users
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        limit = int_param(request, 'limit', 10, MAX_TOP)
+        direct = request.query_params.get('direct') in ('1', 'true')
+        counters = referrals.top_referrers(limit, direct=direct)
+        return Response(TopReferrerSerializer(counters, many=True).data)
@@ -0,0 +1,79 @@
+import gzip
+import json
+import os
+import tempfile
+
+from django.test import override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from cvgezgini.api.utils import schema
+from cvgezgini.api.utils.schema import api_schema
+from cvgezgini.apps.accounts.models import User
+
+JSON_URL = reverse('api:schema-json', kwargs={'format': '.json'})
+YAML_URL = reverse('api:schema-json', kwargs={'format': '.yaml'})
+
+
+class SchemaViewTestCase(APITestCase):
+    def setUp(self):
+        api_schema.clear()
+        self.addCleanup(api_schema.clear)
+        user = User.objects.create_user(username='user', email='a@example.com')
+        self.client.force_authenticate(user)
+
+    def test_schema(self):
+        res = self.client.get(JSON_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/json')
+        self.assertIn('/me/', json.loads(res.content)['paths'])
+
+        # served from memory, nothing is generated again
+        with self.assertNumQueries(0):
+            res = self.client.get(JSON_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        res = self.client.get(YAML_URL)
+        self.assertEqual(res['Content-Type'], 'application/yaml')
+        self.assertTrue(res.content.startswith(b'swagger:'))
+
+    def test_compressed(self):
+        plain = self.client.get(JSON_URL)
+        res = self.client.get(JSON_URL, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', res['Vary'])
+        self.assertEqual(gzip.decompress(res.content), plain.content)
+        self.assertNotEqual(res['ETag'], plain['ETag'])
+
+        res = self.client.get(JSON_URL, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(res.has_header('Content-Encoding'))
+
+    def test_unknown_format(self):
+        res = self.client.get(reverse('api:schema-json', kwargs={'format': '.xml'}))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_unauthenticated(self):
+        self.client.force_authenticate(None)
+        res = self.client.get(JSON_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_file(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'openapi.json')
+        stored = {'swagger': '2.0', 'paths': {}}
+        schema.write(path, stored, schema.urlconf_hash())
+
+        with override_settings(API_SCHEMA_PATH=path):
+            res = self.client.get(JSON_URL)
+            self.assertEqual(json.loads(res.content), stored)
+
+            # another URLconf, generated and written again
+            schema.write(path, stored, 'outdated')
+            api_schema.clear()
+            res = self.client.get(JSON_URL)
+            self.assertNotEqual(json.loads(res.content), stored)
+            with open(path) as f:
+                self.assertEqual(json.load(f)['urlconf_hash'], schema.urlconf_hash())
@@ -0,0 +1,93 @@
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+
+from cvgezgini.api.utils.schema import api_schema, get_info
+
+# preferred first
+ENCODINGS = ('br', 'gzip')
+
+
+def accepted_encodings(request):
+    accepted = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        encoding, *params = part.split(';')
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        if quality > 0:
+            accepted.add(encoding.strip().lower())
+    return accepted
+
+
+class SchemaView(APIView):
+    """
+    Returns the precomputed OpenAPI schema as swagger.json or swagger.yaml
+    """
+
+    swagger_schema = None
+
+    def get_format_suffix(self, **kwargs):
+        # the format is the schema's, no renderer is involved
+        return None
+
+    def get(self, request, format, *args, **kwargs):
+        try:
+            rendering = api_schema.get(format.lstrip('.'))
+        except KeyError:
+            raise NotFound()
+
+        accepted = accepted_encodings(request)
+        encoding = next(
+            (e for e in ENCODINGS if e in accepted and e in rendering.content),
+            'identity',
+        )
+        etag = quote_etag(
+            rendering.etag if encoding == 'identity' else f'{rendering.etag}-{encoding}'
+        )
+
+        etags = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in etags or '*' in etags:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(
+                rendering.content[encoding], content_type=rendering.media_type
+            )
+            if encoding != 'identity':
+                response['Content-Encoding'] = encoding
+
+        response['ETag'] = etag
+        patch_vary_headers(response, ['Accept-Encoding'])
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+_swagger_ui = None
+
+
+def swagger_ui(request, *args, **kwargs):
+    """
+    The swagger UI page, drf_yasg is only imported by its first request
+    """
+    global _swagger_ui
+    if _swagger_ui is None:
+        from drf_yasg.views import get_schema_view
+
+        _swagger_ui = get_schema_view(
+            get_info(),
+            public=True,
+            permission_classes=(IsAuthenticated, ),
+        ).with_ui('swagger')
+    return _swagger_ui(request, *args, **kwargs)
+
+
+swagger_ui.csrf_exempt = True
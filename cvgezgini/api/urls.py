@@ -1,42 +1,84 @@
 from rest_framework.routers import DefaultRouter
+from django.conf import settings
 from django.urls import path
+from .auth import async_views
 from .auth import views as auth
-from drf_yasg import openapi
-from drf_yasg.views import get_schema_view
-from rest_framework.permissions import IsAuthenticated
+from .me import views as me
+from .metrics import views as metrics
+from .presence import views as presence
+from .referrals import views as referrals
+from .schema import views as schema
 
 
 app_name = 'api'
 
 router = DefaultRouter()
 
-schema_view = get_schema_view(
-    openapi.Info(
-        title='Snippets API',
-        default_version='v1',
-    ),
-    public=True,
-    permission_classes=(IsAuthenticated, )
-)
+if settings.ASYNC_AUTH_VIEWS:
+    register_view = async_views.RegisterAsyncView.as_view()
+    login_view = async_views.LoginWithEmailAsyncView.as_view()
+    update_password_view = async_views.UpdatePasswordAsyncView.as_view()
+    forgot_password_first_step_view = (
+        async_views.ForgotPasswordWithEmailFirstStepAsyncView.as_view()
+    )
+    forgot_password_second_step_view = (
+        async_views.ForgotPasswordWithEmailSecondStepAsyncView.as_view()
+    )
+else:
+    register_view = auth.RegisterView.as_view()
+    login_view = auth.LoginWithEmailView.as_view()
+    update_password_view = auth.UpdatePassword.as_view()
+    forgot_password_first_step_view = (
+        auth.ForgotPasswordWithEmailFirstStep.as_view()
+    )
+    forgot_password_second_step_view = (
+        auth.ForgotPasswordWithEmailSecondStep.as_view()
+    )
 
 urlpatterns = [
-    path("register/", auth.RegisterView.as_view(), name="register"),
-    path("login/", auth.LoginWithEmailView.as_view(), name="login"),
+    path("register/", register_view, name="register"),
+    path("login/", login_view, name="login"),
+    path("token/refresh/", auth.RefreshTokenView.as_view(), name="token-refresh"),
+    path("token/revoke/", auth.RevokeTokenView.as_view(), name="token-revoke"),
     path(
         'update-password/',
-        auth.UpdatePassword.as_view(),
+        update_password_view,
         name='update-password',
     ),
     path(
         'forgot-password/email/first-step/',
-        auth.ForgotPasswordWithEmailFirstStep.as_view(),
+        forgot_password_first_step_view,
         name='forgot-password-with-email-first-step',
     ),
     path(
         'forgot-password/email/second-step/',
-        auth.ForgotPasswordWithEmailSecondStep.as_view(),
+        forgot_password_second_step_view,
         name='forgot-password-with-email-second-step',
     ),
-    path('swagger<format>/', schema_view.without_ui(), name='schema-json'),
-    path('swagger/', schema_view.with_ui('swagger'), name='schema-swagger-ui'),
+    path('me/', me.MeView.as_view(), name='me'),
+    path('users/import/', auth.ImportUsersView.as_view(), name='import-users'),
+    path('referrals/', referrals.ReferralStatsView.as_view(), name='referrals'),
+    path(
+        'referrals/downline/',
+        referrals.DownlineView.as_view(),
+        name='referrals-downline',
+    ),
+    path(
+        'referrals/top/',
+        referrals.TopReferrersView.as_view(),
+        name='referrals-top',
+    ),
+    path(
+        'presence/heartbeat/',
+        presence.HeartbeatView.as_view(),
+        name='presence-heartbeat',
+    ),
+    path('presence/online/', presence.OnlineUsersView.as_view(), name='presence-online'),
+    path('metrics/', metrics.MetricsView.as_view(), name='metrics'),
 ] + router.urls
+
+if settings.API_DOCS:
+    urlpatterns += [
+        path('swagger<format>/', schema.SchemaView.as_view(), name='schema-json'),
+        path('swagger/', schema.swagger_ui, name='schema-swagger-ui'),
+    ]
@@ -0,0 +1,287 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user, get_user_model
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import (
+    BaseAuthentication,
+    SessionAuthentication,
+    TokenAuthentication,
+    get_authorization_header,
+)
+
+from cvgezgini.apps.core.db import routers
+from . import signed_tokens
+
+User = get_user_model()
+
+
+class TokenCache:
+    """
+    Two tier cache of the user ids of authenticated tokens, keyed by a digest
+    of the token key. Only the id is kept, the user itself is always read
+    from the database (see LazyUser).
+
+    A small in-process LRU sits in front of Django's cache framework. Local
+    entries live for AUTH_TOKEN_LOCAL_CACHE_TIMEOUT seconds only, since
+    invalidations reach the local tier of the current process alone; the
+    shared tier is invalidated explicitly (see accounts.signals).
+    """
+
+    prefix = 'auth:user-id:'
+
+    def __init__(self):
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cache_key(self, key):
+        return self.prefix + hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key):
+        cache_key = self._cache_key(key)
+        user_id = self._get_local(cache_key)
+        if user_id is None:
+            user_id = cache.get(cache_key)
+            if user_id is None:
+                return None
+            self._set_local(cache_key, user_id)
+        return user_id
+
+    async def aget(self, key):
+        cache_key = self._cache_key(key)
+        user_id = self._get_local(cache_key)
+        if user_id is None:
+            user_id = await cache.aget(cache_key)
+            if user_id is None:
+                return None
+            self._set_local(cache_key, user_id)
+        return user_id
+
+    def set(self, key, user_id):
+        cache_key = self._cache_key(key)
+        cache.set(cache_key, user_id, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        self._set_local(cache_key, user_id)
+
+    async def aset(self, key, user_id):
+        cache_key = self._cache_key(key)
+        await cache.aset(cache_key, user_id, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        self._set_local(cache_key, user_id)
+
+    def delete(self, key):
+        cache_key = self._cache_key(key)
+        with self._lock:
+            self._local.pop(cache_key, None)
+        cache.delete(cache_key)
+
+    def delete_for_user(self, user_id):
+        from rest_framework.authtoken.models import Token
+
+        for key in Token.objects.filter(user_id=user_id).values_list(
+            'key', flat=True
+        ):
+            self.delete(key)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+
+    def _get_local(self, cache_key):
+        with self._lock:
+            entry = self._local.get(cache_key)
+            if entry is None:
+                return None
+            expire_at, user_id = entry
+            if expire_at <= time.monotonic():
+                del self._local[cache_key]
+                return None
+            self._local.move_to_end(cache_key)
+            return user_id
+
+    def _set_local(self, cache_key, user_id):
+        timeout = settings.AUTH_TOKEN_LOCAL_CACHE_TIMEOUT
+        if timeout <= 0:
+            return
+        with self._lock:
+            self._local[cache_key] = (time.monotonic() + timeout, user_id)
+            self._local.move_to_end(cache_key)
+            while len(self._local) > settings.AUTH_TOKEN_LOCAL_CACHE_SIZE:
+                self._local.popitem(last=False)
+
+
+token_cache = TokenCache()
+
+
+class LazyUser(SimpleLazyObject):
+    """
+    User of an authenticated token, loaded from the database on the first
+    access to anything but pk and the authentication flags. A user that was
+    deactivated or deleted meanwhile fails the request with 401.
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, user_id):
+        super().__init__(lambda: self._load(user_id))
+        self.__dict__['pk'] = self.__dict__['id'] = user_id
+
+    def __bool__(self):
+        return True
+
+    @staticmethod
+    def _load(user_id):
+        with routers.primary():
+            user = User.objects.filter(pk=user_id).first()
+        if user is None or not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return user
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in replacement of TokenAuthentication which keeps the user id of
+    authenticated tokens in `token_cache`, so a repeated request skips the
+    Token JOIN User query and the user is read once it is used. Tokens are
+    looked up on the primary, a replica may not have a token issued a moment
+    ago.
+
+    Deleting a token or saving a user whose password or is_active changed
+    drops the cached ids. `QuerySet.update()` sends no signal and leaves them
+    until AUTH_TOKEN_CACHE_TIMEOUT, is_active is still checked when the user
+    is loaded.
+    """
+
+    def authenticate_credentials(self, key):
+        user_id = token_cache.get(key)
+        if user_id is not None:
+            return (LazyUser(user_id), self.get_model()(key=key, user_id=user_id))
+
+        token = self._get_token(key)
+        token_cache.set(key, token.user_id)
+        return (token.user, token)
+
+    async def aauthenticate(self, request):
+        """
+        Async counterpart of `authenticate`, used by AsyncAPIView. The user
+        cannot be loaded lazily under the event loop, a cached id saves the
+        JOIN only.
+        """
+        key = self._get_key(request)
+        if key is None:
+            return None
+
+        user_id = await token_cache.aget(key)
+        if user_id is None:
+            token = await sync_to_async(self._get_token)(key)
+            await token_cache.aset(key, token.user_id)
+            return (token.user, token)
+
+        user = await sync_to_async(LazyUser._load)(user_id)
+        return (user, self.get_model()(key=key, user=user))
+
+    def _get_token(self, key):
+        model = self.get_model()
+        try:
+            with routers.primary():
+                token = model.objects.select_related('user').get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return token
+
+    def _get_key(self, request):
+        # header parsing of TokenAuthentication.authenticate
+        auth = get_authorization_header(request).split()
+
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+
+        if len(auth) == 1:
+            msg = _('Invalid token header. No credentials provided.')
+            raise exceptions.AuthenticationFailed(msg)
+        elif len(auth) > 2:
+            msg = _('Invalid token header. Token string should not contain spaces.')
+            raise exceptions.AuthenticationFailed(msg)
+
+        try:
+            return auth[1].decode()
+        except UnicodeError:
+            msg = _(
+                'Invalid token header. Token string should not contain invalid characters.'
+            )
+            raise exceptions.AuthenticationFailed(msg)
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    Authenticates `Authorization: Bearer <access token>` headers carrying
+    the tokens of cvgezgini.api.utils.signed_tokens, without a query.
+    request.auth is the token payload.
+    """
+
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        token = self._get_token(request)
+        if token is None:
+            return None
+        return self._authenticate(token)
+
+    async def aauthenticate(self, request):
+        token = self._get_token(request)
+        if token is None:
+            return None
+        if signed_tokens.deny_list.needs_refresh():
+            await sync_to_async(signed_tokens.deny_list.refresh)()
+        _, payload = self._authenticate(token)
+        # the async views must not touch the database on the event loop
+        user = await sync_to_async(LazyUser._load)(payload['u'])
+        return (user, payload)
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+    def _authenticate(self, token):
+        try:
+            payload = signed_tokens.decode(token, signed_tokens.ACCESS)
+        except signed_tokens.InvalidToken:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        return (LazyUser(payload['u']), payload)
+
+    def _get_token(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_('Invalid token header.'))
+        try:
+            return auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(_('Invalid token header.'))
+
+
+class AsyncSessionAuthentication(SessionAuthentication):
+    """
+    SessionAuthentication for AsyncAPIView, the session user is read in a
+    thread. CSRF is enforced as by SessionAuthentication.
+    """
+
+    async def aauthenticate(self, request):
+        # set by SessionMiddleware
+        if not hasattr(request, 'session'):
+            return None
+        user = await sync_to_async(get_user)(request)
+        if not user or not user.is_active:
+            return None
+        self.enforce_csrf(request)
+        return (user, None)
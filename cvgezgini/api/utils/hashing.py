@@ -0,0 +1,199 @@
+"""
+Password hashing off the request threads.
+
+With PASSWORD_HASHING_WORKERS > 0 the hashes are computed in a process pool.
+At most PASSWORD_HASHING_QUEUE_SIZE jobs wait for a free worker, beyond that
+HashingUnavailable (503 with Retry-After) is raised at once, so a burst of
+password checks cannot pin every request thread.
+"""
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import django
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.utils.translation import gettext_lazy as _
+
+from cvgezgini.apps.core import tracing
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class HashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _('Sunucu şu anda yoğun, lütfen biraz sonra tekrar deneyin.')
+    default_code = 'hashing-unavailable'
+
+    def __init__(self, detail=None, code=None):
+        super().__init__(detail, code)
+        # sent as the Retry-After header by DRF
+        self.wait = settings.PASSWORD_HASHING_RETRY_AFTER
+
+
+_executor = None
+_slots = None
+_lock = threading.Lock()
+
+
+def process_pool(workers):
+    """
+    A ProcessPoolExecutor whose workers run django.setup. They are spawned,
+    not forked: the pool is created on first use, when the process already
+    runs threads whose held locks a fork would copy into the workers.
+    """
+    return ProcessPoolExecutor(
+        workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=django.setup,
+    )
+
+
+def _get_executor():
+    global _executor, _slots
+
+    if settings.PASSWORD_HASHING_WORKERS <= 0:
+        return None
+    with _lock:
+        if _executor is None:
+            workers = settings.PASSWORD_HASHING_WORKERS
+            _executor = process_pool(workers)
+            _slots = threading.BoundedSemaphore(
+                workers + settings.PASSWORD_HASHING_QUEUE_SIZE
+            )
+    return _executor
+
+
+def shutdown():
+    global _executor
+
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
+
+
+def submit(func, *args):
+    """
+    Runs `func` in the pool and returns a concurrent.futures.Future, runs it
+    in place when the pool is disabled.
+    """
+    executor = _get_executor()
+    if executor is None:
+        future = Future()
+        future.set_result(func(*args))
+        return future
+
+    if not _slots.acquire(blocking=False):
+        raise HashingUnavailable()
+    return _submit(executor, func, *args)
+
+
+def _submit(executor, func, *args):
+    # the caller holds a slot, given back when the job is done
+    try:
+        future = executor.submit(func, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future
+
+
+async def asubmit(func, *args):
+    if _get_executor() is None:
+        return await sync_to_async(func, thread_sensitive=False)(*args)
+    return await asyncio.wrap_future(submit(func, *args))
+
+
+def needs_rehash(encoded):
+    """
+    True if the hash is not made with the preferred hasher and its current
+    parameters, same as the check in django's check_password.
+    """
+    preferred = hashers.get_hasher()
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        return False
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+def verify_password(user, raw_password):
+    """
+    Pool backed user.check_password, upgrades an outdated hash.
+    """
+    with tracing.stage('hashing'):
+        valid = submit(hashers.check_password, raw_password, user.password).result()
+    if not valid:
+        return False
+    if needs_rehash(user.password):
+        set_password(user, raw_password)
+        user.save(update_fields=['password'])
+    return True
+
+
+async def averify_password(user, raw_password):
+    with tracing.stage('hashing'):
+        valid = await asubmit(hashers.check_password, raw_password, user.password)
+    if not valid:
+        return False
+    if needs_rehash(user.password):
+        await aset_password(user, raw_password)
+        await user.asave(update_fields=['password'])
+    return True
+
+
+def set_password(user, raw_password):
+    """
+    Pool backed user.set_password.
+    """
+    with tracing.stage('hashing'):
+        user.password = submit(hashers.make_password, raw_password).result()
+    user._password = raw_password
+
+
+async def aset_password(user, raw_password):
+    with tracing.stage('hashing'):
+        user.password = await asubmit(hashers.make_password, raw_password)
+    user._password = raw_password
+
+
+def _make_passwords(raw_passwords):
+    return [hashers.make_password(password) for password in raw_passwords]
+
+
+def hash_passwords(raw_passwords, executor=None):
+    """
+    Hashes a batch of passwords on every worker of `executor`, in place when
+    there is neither an executor nor the shared pool. On the shared pool the
+    batch is split in one job per worker, every job waits for a queue slot
+    instead of failing, so a batch never holds more than PASSWORD_HASHING_WORKERS
+    slots and the requests keep the rest of the queue.
+    """
+    raw_passwords = list(raw_passwords)
+    if executor is not None:
+        workers = getattr(executor, '_max_workers', 1)
+        chunksize = max(1, len(raw_passwords) // (workers * 4))
+        return list(
+            executor.map(hashers.make_password, raw_passwords, chunksize=chunksize)
+        )
+
+    executor = _get_executor()
+    if executor is None:
+        return _make_passwords(raw_passwords)
+
+    workers = settings.PASSWORD_HASHING_WORKERS
+    chunksize = max(1, -(-len(raw_passwords) // workers))
+    futures = []
+    for start in range(0, len(raw_passwords), chunksize):
+        _slots.acquire()
+        futures.append(
+            _submit(
+                executor, _make_passwords, raw_passwords[start:start + chunksize]
+            )
+        )
+    return [encoded for future in futures for encoded in future.result()]
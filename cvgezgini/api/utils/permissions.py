@@ -1,43 +1,84 @@
 
-from datetime import timedelta
-
-from django.utils import timezone
-from django.db.models import Q
 from django.conf import settings
 
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 from ipware import get_client_ip
+from cvgezgini.apps.core import tracing
 from cvgezgini.apps.core.models import AuthAttempt
 
+from .ratelimit import get_backend
 
 
 class CanAttemptPerm(BasePermission):
+    """
+    Limits the attempts per ip and per email. Views may override the
+    settings with `attempt_limit`, `attempt_window` (in seconds) and
+    `attempt_scope`; views sharing a scope share their counters.
+    """
+
     message = (
         'Çok fazla denemede bulundunuz! Bir kaç saat sonra tekrar deneyin!'
     )
 
     def has_permission(self, request, view):
-        if request.method in SAFE_METHODS or not settings.ATTEMPT_PROTECTION:
+        with tracing.stage('permission'):
+            return self._has_permission(request, view)
+
+    async def ahas_permission(self, request, view):
+        with tracing.stage('permission'):
+            return await self._ahas_permission(request, view)
+
+    def _has_permission(self, request, view):
+        if self._is_exempt(request):
             return True
+        ip, email = self._get_client(request)
+        if ip is False:
+            return False
 
+        backend = get_backend()
+        if not backend.attempt(*self._get_attempt(view, ip, email)):
+            return False
+
+        if settings.ATTEMPT_AUDIT_LOG and not backend.records_attempts:
+            AuthAttempt.objects.create(email=email, ip=ip)
+        return True
+
+    async def _ahas_permission(self, request, view):
+        if self._is_exempt(request):
+            return True
+        ip, email = self._get_client(request)
+        if ip is False:
+            return False
+
+        backend = get_backend()
+        if not await backend.aattempt(*self._get_attempt(view, ip, email)):
+            return False
+
+        if settings.ATTEMPT_AUDIT_LOG and not backend.records_attempts:
+            await AuthAttempt.objects.acreate(email=email, ip=ip)
+        return True
+
+    def _is_exempt(self, request):
+        return request.method in SAFE_METHODS or not settings.ATTEMPT_PROTECTION
+
+    def _get_client(self, request):
+        """
+        Returns ip and email of the attempt, ip is False if the client is
+        not allowed at all.
+        """
         ip, is_routable = get_client_ip(request)
 
         if (ip is None or not is_routable) and not settings.DEVELOPMENT_MODE:
             self.message = 'Ip adresiniz ile ilgili bir sorun oluştu!'
-            return False
+            return False, None
 
-        email = request.data.get('email', None)
-        a_hour_ago = timezone.now() - timedelta(hours=1)
+        return ip, request.data.get('email', None)
 
-        total_attempts_in_last_hour = (
-            AuthAttempt.objects.filter(
-                Q(ip=ip) | Q(email=email), time__gt=a_hour_ago
-            )
-            .distinct()
-            .count()
+    def _get_attempt(self, view, ip, email):
+        return (
+            getattr(view, 'attempt_scope', 'auth'),
+            ip,
+            email,
+            getattr(view, 'attempt_limit', settings.ATTEMPT_LIMIT),
+            getattr(view, 'attempt_window', settings.ATTEMPT_WINDOW),
         )
-        if total_attempts_in_last_hour >= 10:
-            return False
-
-        AuthAttempt.objects.create(email=email, ip=ip)
-        return True
@@ -0,0 +1,69 @@
+"""
+Cache-aside copy of the /api/me/ response of every user.
+
+Entries are keyed by the user id and a per-user version, saving the User or
+its Profile bumps the version (see accounts.signals), so a stale entry is
+never read again and simply expires. The version doubles as the ETag, an
+unchanged profile is answered with a single cache read. Writes through
+`QuerySet.update()` do not bump it, the response leaves out the fields
+written that way (last_login, is_online).
+
+The bumps are only seen by every process through a shared cache (CACHE_URL),
+with a per process cache (locmem) the entries live PROFILE_CACHE_LOCAL_TIMEOUT
+seconds, the longest another worker may answer with an outdated profile.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from cvgezgini.apps.core.caches import is_shared
+
+
+class ProfileCache:
+    prefix = 'me:'
+
+    def _version_key(self, user_id):
+        return f'{self.prefix}{user_id}:version'
+
+    def _data_key(self, user_id, version):
+        return f'{self.prefix}{user_id}:{version}'
+
+    @property
+    def timeout(self):
+        if is_shared():
+            return settings.PROFILE_CACHE_TIMEOUT
+        return settings.PROFILE_CACHE_LOCAL_TIMEOUT
+
+    def version(self, user_id):
+        key = self._version_key(user_id)
+        version = cache.get(key)
+        if version is None:
+            # a new counter must not meet the entries of an evicted one
+            cache.add(key, time.time_ns(), self.timeout)
+            version = cache.get(key)
+        return version
+
+    def get(self, user_id, version):
+        return cache.get(self._data_key(user_id, version))
+
+    def set(self, user_id, version, data):
+        cache.set(self._data_key(user_id, version), data, self.timeout)
+
+    def bump(self, user_id):
+        """
+        Bumps the version once the current transaction is committed, readers
+        never cache the old rows under the new version.
+        """
+        transaction.on_commit(lambda: self._incr(user_id))
+
+    def _incr(self, user_id):
+        key = self._version_key(user_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), self.timeout)
+
+
+profile_cache = ProfileCache()
@@ -0,0 +1,216 @@
+"""
+Attempt limiter engine used by CanAttemptPerm.
+
+Backends count the attempts made from the ip or with the email in a sliding
+window, an attempt matching both is counted once. The window is approximated
+with two fixed-window counters, the previous one weighted by the part of it
+still inside the window, so a check costs a few counter reads no matter how
+long the attempt history is.
+"""
+import hashlib
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from cvgezgini.apps.core.models import AuthAttempt
+
+
+class BaseBackend:
+    # True if the backend writes AuthAttempt rows itself
+    records_attempts = False
+
+    def attempt(self, scope, ip, email, limit, window):
+        """
+        Counts an attempt of ip and email, returns False without counting if
+        `limit` attempts were made from the ip or with the email in the last
+        `window` seconds.
+        """
+        raise NotImplementedError
+
+    async def aattempt(self, scope, ip, email, limit, window):
+        return await sync_to_async(self.attempt)(scope, ip, email, limit, window)
+
+
+class CounterBackend(BaseBackend):
+    """
+    Base of the backends keeping sliding-window counters in a key-value store.
+
+    There are counters of the ip, of the email and of the pair, the attempts
+    of the ip or the email are ip + email - pair, as DatabaseBackend counts.
+    """
+
+    prefix = 'attempts:'
+
+    def attempt(self, scope, ip, email, limit, window):
+        keys, index, weight = self._window(scope, ip, email, window)
+        counts = self.get_counts(self._count_keys(keys, index))
+        if self._is_limited(counts, keys, index, weight, limit):
+            return False
+
+        for key in keys:
+            # a counter must outlive the window after its own
+            self.increment(f'{key}:{index}', window * 2)
+        return True
+
+    async def aattempt(self, scope, ip, email, limit, window):
+        keys, index, weight = self._window(scope, ip, email, window)
+        counts = await self.aget_counts(self._count_keys(keys, index))
+        if self._is_limited(counts, keys, index, weight, limit):
+            return False
+
+        for key in keys:
+            await self.aincrement(f'{key}:{index}', window * 2)
+        return True
+
+    def _window(self, scope, ip, email, window):
+        index, elapsed = divmod(time.time(), window)
+        keys = [self._key(scope, 'ip', ip)]
+        if email:
+            keys.append(self._key(scope, 'email', email))
+            keys.append(self._key(scope, 'pair', f'{ip} {email}'))
+        return keys, int(index), 1 - elapsed / window
+
+    def _count_keys(self, keys, index):
+        return [f'{key}:{i}' for key in keys for i in (index - 1, index)]
+
+    def _is_limited(self, counts, keys, index, weight, limit):
+        estimated = [
+            counts.get(f'{key}:{index - 1}', 0) * weight
+            + counts.get(f'{key}:{index}', 0)
+            for key in keys
+        ]
+        if len(estimated) == 3:
+            ip, email, pair = estimated
+            return ip + email - pair >= limit
+        return estimated[0] >= limit
+
+    def _key(self, scope, kind, value):
+        digest = hashlib.md5(str(value).encode()).hexdigest()
+        return f'{self.prefix}{scope}:{kind}:{digest}'
+
+    def get_counts(self, keys):
+        raise NotImplementedError
+
+    def increment(self, key, timeout):
+        raise NotImplementedError
+
+    async def aget_counts(self, keys):
+        return self.get_counts(keys)
+
+    async def aincrement(self, key, timeout):
+        self.increment(key, timeout)
+
+
+class MemoryBackend(CounterBackend):
+    """
+    Keeps the counters in the process memory, limits apply per process.
+    """
+
+    def __init__(self):
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._next_purge = 0
+
+    def get_counts(self, keys):
+        now = time.monotonic()
+        with self._lock:
+            counts = {}
+            for key in keys:
+                entry = self._counters.get(key)
+                if entry is not None and entry[0] > now:
+                    counts[key] = entry[1]
+            return counts
+
+    def increment(self, key, timeout):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._counters.get(key)
+            if entry is None or entry[0] <= now:
+                self._counters[key] = (now + timeout, 1)
+            else:
+                self._counters[key] = (entry[0], entry[1] + 1)
+
+            if now >= self._next_purge:
+                self._purge(now)
+                self._next_purge = now + timeout
+
+    def _purge(self, now):
+        for key in [k for k, v in self._counters.items() if v[0] <= now]:
+            del self._counters[key]
+
+
+class CacheBackend(CounterBackend):
+    """
+    Keeps the counters in Django's cache, limits are shared by every process
+    using the same cache. With the per process locmem cache every worker
+    has limits of its own, `check --deploy` reports it (core.E001).
+    """
+
+    def get_counts(self, keys):
+        return cache.get_many(keys)
+
+    def increment(self, key, timeout):
+        if cache.add(key, 1, timeout):
+            return
+        try:
+            cache.incr(key)
+        except ValueError:
+            # expired between add and incr
+            cache.set(key, 1, timeout)
+
+    async def aget_counts(self, keys):
+        return await cache.aget_many(keys)
+
+    async def aincrement(self, key, timeout):
+        if await cache.aadd(key, 1, timeout):
+            return
+        try:
+            await cache.aincr(key)
+        except ValueError:
+            await cache.aset(key, 1, timeout)
+
+
+class DatabaseBackend(BaseBackend):
+    """
+    Counts the AuthAttempt rows, as CanAttemptPerm used to do. Slower than
+    the counter backends, for deployments without a shared cache.
+    """
+
+    records_attempts = True
+
+    def attempt(self, scope, ip, email, limit, window):
+        if self._attempts(ip, email, window).count() >= limit:
+            return False
+
+        AuthAttempt.objects.create(email=email, ip=ip)
+        return True
+
+    async def aattempt(self, scope, ip, email, limit, window):
+        if await self._attempts(ip, email, window).acount() >= limit:
+            return False
+
+        await AuthAttempt.objects.acreate(email=email, ip=ip)
+        return True
+
+    def _attempts(self, ip, email, window):
+        since = timezone.now() - timedelta(seconds=window)
+        return AuthAttempt.objects.filter(
+            Q(ip=ip) | Q(email=email), time__gt=since
+        ).distinct()
+
+
+_backends = {}
+
+
+def get_backend():
+    path = settings.ATTEMPT_LIMITER_BACKEND
+    if path not in _backends:
+        _backends[path] = import_string(path)()
+    return _backends[path]
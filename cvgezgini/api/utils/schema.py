@@ -0,0 +1,157 @@
+"""
+The OpenAPI schema of the api, generated once instead of on every request.
+
+drf_yasg introspects every view and serializer to build the schema, so it is
+generated once per deploy by the generate_api_schema command and written to
+API_SCHEMA_PATH. Processes load that file on first use and keep the JSON and
+YAML renderings in memory, pre-compressed with gzip (and brotli when the
+`brotli` package is installed). The file carries a hash of the URLconf, a
+process finding another hash (or no file) generates the schema itself and
+rewrites the file for the others. Changes to serializers alone leave the
+hash as it was, run the command on deploy.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+from importlib.metadata import version
+
+from django.conf import settings
+from django.urls import URLPattern, URLResolver, get_resolver
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger('ApiSchema')
+
+TITLE = 'Snippets API'
+VERSION = 'v1'
+
+MEDIA_TYPES = {
+    'json': 'application/json',
+    'yaml': 'application/yaml',
+}
+
+
+def _patterns(patterns, prefix=''):
+    for pattern in patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            yield from _patterns(pattern.url_patterns, route)
+        elif isinstance(pattern, URLPattern):
+            view = getattr(pattern.callback, 'cls', pattern.callback)
+            yield f'{route} {pattern.name} {view.__module__}.{view.__qualname__}'
+
+
+def get_info():
+    # drf_yasg is imported when the schema is generated, not at start up
+    from drf_yasg import openapi
+
+    return openapi.Info(title=TITLE, default_version=VERSION)
+
+
+def urlconf_hash():
+    lines = [version('drf-yasg'), TITLE, VERSION]
+    lines.extend(_patterns(get_resolver().url_patterns))
+    return hashlib.sha256('\n'.join(lines).encode()).hexdigest()
+
+
+def generate():
+    """
+    Returns the schema as a dict, the same for every user.
+    """
+    from drf_yasg.codecs import OpenAPICodecJson
+    from drf_yasg.generators import OpenAPISchemaGenerator
+
+    generator = OpenAPISchemaGenerator(get_info())
+    schema = generator.get_schema(request=None, public=True)
+    return json.loads(OpenAPICodecJson(validators=[]).encode(schema))
+
+
+def write(path, schema, digest):
+    # readers in other processes never see a partial file
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'urlconf_hash': digest, 'schema': schema}, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+class Rendering:
+    """
+    A rendering of the schema with its compressed variants, by encoding.
+    """
+
+    def __init__(self, content, media_type):
+        self.media_type = media_type
+        self.etag = hashlib.sha256(content).hexdigest()[:32]
+        self.content = {'identity': content, 'gzip': gzip.compress(content, 9)}
+        if brotli is not None:
+            self.content['br'] = brotli.compress(content)
+
+
+class PrecomputedSchema:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._renderings = None
+
+    def get(self, format):
+        """
+        Returns the Rendering of `format` (json or yaml), loaded on first use.
+        """
+        if self._renderings is None:
+            self.load()
+        return self._renderings[format]
+
+    def load(self):
+        from drf_yasg.codecs import yaml_sane_dump
+
+        with self._lock:
+            if self._renderings is not None:
+                return
+            digest = urlconf_hash()
+            schema = self._read(digest)
+            if schema is None:
+                schema = generate()
+                self._write(schema, digest)
+            self._renderings = {
+                'json': Rendering(
+                    json.dumps(schema, ensure_ascii=False).encode(),
+                    MEDIA_TYPES['json'],
+                ),
+                'yaml': Rendering(
+                    yaml_sane_dump(schema, binary=True), MEDIA_TYPES['yaml']
+                ),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._renderings = None
+
+    def _read(self, digest):
+        path = settings.API_SCHEMA_PATH
+        if not path:
+            return None
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('urlconf_hash') != digest:
+            return None
+        return data['schema']
+
+    def _write(self, schema, digest):
+        path = settings.API_SCHEMA_PATH
+        if not path:
+            return
+        try:
+            write(path, schema, digest)
+        except OSError as e:
+            logger.warning(f'Could not write the schema to {path}: {e}')
+
+
+api_schema = PrecomputedSchema()
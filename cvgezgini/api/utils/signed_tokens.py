@@ -0,0 +1,199 @@
+"""
+Signed, short-lived access tokens and longer-lived refresh tokens, used
+when AUTH_TOKEN_MODE is "signed".
+
+Tokens are signed with HMAC (django.core.signing) by the first key of
+SIGNED_TOKEN_KEYS, the others still verify so keys can be rotated. An access
+token carries the user id and token_version, so it is verified without
+touching the database. Revoked tokens are kept out by `deny_list`, an
+in-memory copy of the unexpired TokenRevocation rows topped up every
+TOKEN_DENY_LIST_REFRESH seconds with the rows created since, so
+revocations made by other processes are seen within that delay.
+Refreshing checks the database itself.
+"""
+import secrets
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+from django.utils.timezone import now
+
+from cvgezgini.apps.accounts.models import TokenRevocation
+from cvgezgini.apps.core.db import routers
+
+ACCESS = 'access'
+REFRESH = 'refresh'
+
+# created_at is set before the row commits and by the clock of the process
+# revoking, rows created this long before the newest one read are read again
+WATERMARK_OVERLAP = timedelta(seconds=60)
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def _lifetime(kind):
+    if kind == ACCESS:
+        return settings.ACCESS_TOKEN_LIFETIME
+    return settings.REFRESH_TOKEN_LIFETIME
+
+
+def _salt(kind):
+    return f'cvgezgini.signed_tokens.{kind}'
+
+
+def encode(user, kind):
+    payload = {'u': user.pk, 'v': user.token_version, 'j': secrets.token_hex(8)}
+    keys = settings.SIGNED_TOKEN_KEYS
+    return signing.dumps(payload, key=keys[0], salt=_salt(kind), compress=True)
+
+
+def decode(token, kind):
+    """
+    Returns the payload of a valid, unexpired and not revoked token, raises
+    InvalidToken otherwise.
+    """
+    keys = settings.SIGNED_TOKEN_KEYS
+    try:
+        payload = signing.loads(
+            token,
+            key=keys[0],
+            fallback_keys=keys[1:],
+            salt=_salt(kind),
+            max_age=_lifetime(kind),
+        )
+    except signing.BadSignature:
+        raise InvalidToken()
+    if deny_list.is_revoked(payload):
+        raise InvalidToken()
+    return payload
+
+
+def is_revoked_stored(payload):
+    """
+    Looks the token up in TokenRevocation itself, for the refresh tokens
+    whose revocation must not wait for the next deny list refresh.
+    """
+    with routers.primary():
+        return TokenRevocation.objects.filter(
+            Q(jti=payload['j'])
+            | Q(user_id=payload['u'], min_version__gt=payload['v']),
+            expire_at__gt=now(),
+        ).exists()
+
+
+def issue(user):
+    return {'token': encode(user, ACCESS), 'refresh': encode(user, REFRESH)}
+
+
+class DenyList:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # jti -> expiry timestamp
+        self._tokens = {}
+        # user id -> (min version, expiry timestamp)
+        self._versions = {}
+        self._next_check = 0
+        # created_at of the newest row read, None until the first refresh
+        self._watermark = None
+
+    def needs_refresh(self):
+        return time.monotonic() >= self._next_check
+
+    def refresh(self):
+        if not self.needs_refresh():
+            return
+        self._next_check = time.monotonic() + settings.TOKEN_DENY_LIST_REFRESH
+
+        # the first refresh reads every unexpired row, the next ones only the
+        # rows created since, ids do not follow the commit order
+        current = now()
+        rows = TokenRevocation.objects.filter(expire_at__gt=current)
+        watermark = self._watermark
+        if watermark is not None:
+            rows = rows.filter(created_at__gt=watermark - WATERMARK_OVERLAP)
+        with routers.primary():
+            rows = list(
+                rows.only('user_id', 'jti', 'min_version', 'expire_at', 'created_at')
+            )
+
+        expired = current.timestamp()
+        with self._lock:
+            for row in rows:
+                self._add(row, self._tokens, self._versions)
+                if self._watermark is None or row.created_at > self._watermark:
+                    self._watermark = row.created_at
+            if self._watermark is None:
+                self._watermark = current - WATERMARK_OVERLAP
+            self._tokens = {
+                jti: expire_at
+                for jti, expire_at in self._tokens.items()
+                if expire_at > expired
+            }
+            self._versions = {
+                user_id: version
+                for user_id, version in self._versions.items()
+                if version[1] > expired
+            }
+
+    def is_revoked(self, payload):
+        if self.needs_refresh():
+            self.refresh()
+        with self._lock:
+            if payload['j'] in self._tokens:
+                return True
+            min_version = self._versions.get(payload['u'], (0, 0))[0]
+        return payload['v'] < min_version
+
+    def revoke_token(self, payload, kind):
+        self._revoke(
+            TokenRevocation(
+                user_id=payload['u'],
+                jti=payload['j'],
+                expire_at=now() + timedelta(seconds=_lifetime(kind)),
+            )
+        )
+
+    def revoke_user(self, user_id, min_version):
+        """
+        Revokes every token of the user with a token_version below
+        `min_version`.
+        """
+        self._revoke(
+            TokenRevocation(
+                user_id=user_id,
+                min_version=min_version,
+                expire_at=now() + timedelta(seconds=settings.REFRESH_TOKEN_LIFETIME),
+            )
+        )
+
+    def clear(self):
+        with self._lock:
+            self._tokens = {}
+            self._versions = {}
+            self._next_check = 0
+            self._watermark = None
+
+    def _revoke(self, revocation):
+        revocation.save()
+        # this process sees it at once, the others on their next refresh
+        with self._lock:
+            self._add(revocation, self._tokens, self._versions)
+
+    def _add(self, row, tokens, versions):
+        expire_at = row.expire_at.timestamp()
+        if row.jti:
+            tokens[row.jti] = expire_at
+        else:
+            current = versions.get(row.user_id, (0, 0))
+            versions[row.user_id] = (
+                max(current[0], row.min_version),
+                max(current[1], expire_at),
+            )
+
+
+deny_list = DenyList()
@@ -1,3 +1,205 @@
-from django.test import TestCase
+import time
 
-# Create your tests here.
+from django.contrib.auth.hashers import check_password
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+from cvgezgini.apps.accounts.models import User
+from cvgezgini.apps.core.models import AuthAttempt
+from . import hashing
+from .authentication import CachedTokenAuthentication, token_cache
+from .permissions import CanAttemptPerm
+from .ratelimit import CacheBackend, DatabaseBackend, MemoryBackend
+
+EMAIL = 'test@example.com'
+
+
+class CachedTokenAuthenticationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user = User.objects.create_user(
+            username='newuser', password='helloword'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.request = RequestFactory().get(
+            '/', HTTP_AUTHORIZATION=f'Token {self.token.key}'
+        )
+        self.authentication = CachedTokenAuthentication()
+
+    def test_cached_lookup(self):
+        with self.assertNumQueries(1):
+            user, token = self.authentication.authenticate(self.request)
+        self.assertEqual(user, self.user)
+        self.assertEqual(token.key, self.token.key)
+
+        with self.assertNumQueries(0):
+            user, _ = self.authentication.authenticate(self.request)
+        self.assertEqual(user, self.user)
+
+    def test_shared_tier(self):
+        self.authentication.authenticate(self.request)
+        # another process has an empty local tier
+        token_cache.clear()
+        with self.assertNumQueries(0):
+            self.authentication.authenticate(self.request)
+
+    def test_invalidated_on_password_change(self):
+        self.authentication.authenticate(self.request)
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('new-password')
+        user.save()
+
+        user, _ = self.authentication.authenticate(self.request)
+        self.assertTrue(user.check_password('new-password'))
+
+    def test_invalidated_on_deactivation(self):
+        self.authentication.authenticate(self.request)
+        user = User.objects.get(pk=self.user.pk)
+        user.is_active = False
+        user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate(self.request)
+
+    def test_user_is_read_fresh(self):
+        self.authentication.authenticate(self.request)
+        User.objects.filter(pk=self.user.pk).update(first_name='Ali')
+
+        user, _ = self.authentication.authenticate(self.request)
+        self.assertEqual(user.first_name, 'Ali')
+
+    def test_deactivated_by_update(self):
+        self.authentication.authenticate(self.request)
+        # no signal, the cached id survives but the user is not loaded
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+
+        user, _ = self.authentication.authenticate(self.request)
+        with self.assertRaises(AuthenticationFailed):
+            user.email
+
+    def test_invalidated_on_token_delete(self):
+        self.authentication.authenticate(self.request)
+        self.token.delete()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate(self.request)
+
+    def test_unrelated_save_keeps_cache(self):
+        self.authentication.authenticate(self.request)
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = 'John'
+        user.save()
+
+        with self.assertNumQueries(0):
+            self.authentication.authenticate(self.request)
+
+
+class LimitedView(APIView):
+    authentication_classes = []
+    permission_classes = [CanAttemptPerm]
+    attempt_limit = 2
+    attempt_scope = 'limited'
+
+    def post(self, request, *args, **kwargs):
+        return Response()
+
+
+class AttemptLimiterTestCase(TestCase):
+    IP = '100.10.10.10'
+
+    def setUp(self):
+        cache.clear()
+
+    def assert_limits(self, backend):
+        for _ in range(10):
+            self.assertTrue(backend.attempt('auth', self.IP, EMAIL, 10, 3600))
+        # both the ip and the email are limited
+        self.assertFalse(
+            backend.attempt('auth', self.IP, 'other@example.com', 10, 3600)
+        )
+        self.assertFalse(backend.attempt('auth', '100.10.10.11', EMAIL, 10, 3600))
+        self.assertTrue(
+            backend.attempt('auth', '100.10.10.11', 'other@example.com', 10, 3600)
+        )
+
+    def test_memory_backend(self):
+        self.assert_limits(MemoryBackend())
+
+    def test_cache_backend(self):
+        self.assert_limits(CacheBackend())
+
+    def test_database_backend(self):
+        self.assert_limits(DatabaseBackend())
+        self.assertEqual(AuthAttempt.objects.count(), 11)
+
+    def test_scopes_are_separate(self):
+        backend = MemoryBackend()
+        self.assertTrue(backend.attempt('login', self.IP, EMAIL, 1, 3600))
+        self.assertFalse(backend.attempt('login', self.IP, EMAIL, 1, 3600))
+        self.assertTrue(backend.attempt('register', self.IP, EMAIL, 1, 3600))
+
+    def test_ip_or_email(self):
+        for backend in (MemoryBackend(), DatabaseBackend()):
+            with self.subTest(backend=type(backend).__name__):
+                attempt = lambda ip, email: backend.attempt('auth', ip, email, 3, 3600)
+                self.assertTrue(attempt(self.IP, EMAIL))
+                self.assertTrue(attempt(self.IP, 'other@example.com'))
+                self.assertTrue(attempt('100.10.10.11', EMAIL))
+                # 3 attempts from the ip or with the email
+                self.assertFalse(attempt(self.IP, EMAIL))
+
+    @override_settings(ATTEMPT_AUDIT_LOG=True)
+    def test_view_limit(self):
+        view = LimitedView.as_view()
+        factory = APIRequestFactory()
+
+        def post():
+            request = factory.post('/', {'email': EMAIL}, REMOTE_ADDR=self.IP)
+            return view(request).status_code
+
+        self.assertEqual([post(), post(), post()], [200, 200, 403])
+        # denied attempts are not recorded
+        self.assertEqual(AuthAttempt.objects.count(), 2)
+
+    @override_settings(ATTEMPT_AUDIT_LOG=False)
+    def test_without_audit_log(self):
+        request = APIRequestFactory().post(
+            '/', {'email': EMAIL}, REMOTE_ADDR=self.IP
+        )
+        self.assertEqual(LimitedView.as_view()(request).status_code, 200)
+        self.assertFalse(AuthAttempt.objects.exists())
+
+
+class HashingTestCase(TestCase):
+    def test_inline(self):
+        user = User(username='newuser')
+        hashing.set_password(user, 'helloword')
+        self.assertTrue(user.check_password('helloword'))
+        self.assertTrue(hashing.verify_password(user, 'helloword'))
+        self.assertFalse(hashing.verify_password(user, 'wrong-password'))
+
+    @override_settings(PASSWORD_HASHING_WORKERS=1, PASSWORD_HASHING_QUEUE_SIZE=0)
+    def test_saturated_pool(self):
+        self.addCleanup(hashing.shutdown)
+        future = hashing.submit(time.sleep, 0.5)
+        with self.assertRaises(hashing.HashingUnavailable):
+            hashing.submit(time.sleep, 0)
+        future.result()
+        # the slot is free again
+        self.assertIsNone(hashing.submit(time.sleep, 0).result())
+
+    @override_settings(PASSWORD_HASHING_WORKERS=1, PASSWORD_HASHING_QUEUE_SIZE=0)
+    def test_batch_waits_for_a_slot(self):
+        self.addCleanup(hashing.shutdown)
+        hashing.submit(time.sleep, 0.2)
+        encoded = hashing.hash_passwords(['first', 'second'])
+        self.assertTrue(check_password('second', encoded[1]))
+        # the batch gave its slot back
+        self.assertIsNone(hashing.submit(time.sleep, 0).result())
@@ -0,0 +1,140 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse
+from django.utils.decorators import classonlymethod
+from django.views import View
+
+from rest_framework import exceptions
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.serializers import as_serializer_error
+
+from cvgezgini.apps.core import tracing
+from .authentication import (
+    AsyncSessionAuthentication,
+    CachedTokenAuthentication,
+    SignedTokenAuthentication,
+)
+
+# permissions which never touch the database, checked without a thread hop
+NON_BLOCKING_PERMISSIONS = (AllowAny, IsAuthenticated)
+
+
+class AsyncAPIView(View):
+    """
+    Async counterpart of APIView for the hot auth endpoints under ASGI.
+
+    Parses JSON and form bodies into `request.data`, authenticates with
+    `authentication_classes` (the api's defaults, they must implement
+    `aauthenticate`), checks `permission_classes` (awaiting `ahas_permission`
+    when the permission has one) and renders APIExceptions as DRF does.
+    Handlers return JsonResponse.
+    """
+
+    authentication_classes = [
+        CachedTokenAuthentication,
+        SignedTokenAuthentication,
+        AsyncSessionAuthentication,
+    ]
+    permission_classes = [IsAuthenticated]
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        handler = getattr(self, request.method.lower(), None)
+        if request.method.lower() not in self.http_method_names or handler is None:
+            return await self.http_method_not_allowed(request, *args, **kwargs)
+
+        try:
+            request.data = self.parse(request)
+            await self.perform_authentication(request)
+            await self.check_permissions(request)
+            return await handler(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return self.handle_exception(exc)
+
+    def parse(self, request):
+        if request.content_type == 'application/json':
+            try:
+                return json.loads(request.body or b'{}')
+            except ValueError as exc:
+                raise exceptions.ParseError(f'JSON parse error - {exc}')
+        return request.POST
+
+    async def perform_authentication(self, request):
+        request.user, request.auth = AnonymousUser(), None
+        request.successful_authenticator = None
+        for authentication in self.get_authenticators():
+            user_auth = await authentication.aauthenticate(request)
+            if user_auth is not None:
+                request.user, request.auth = user_auth
+                request.successful_authenticator = authentication
+                return
+
+    def get_authenticators(self):
+        return [authentication() for authentication in self.authentication_classes]
+
+    async def check_permissions(self, request):
+        for permission in [permission() for permission in self.permission_classes]:
+            if isinstance(permission, NON_BLOCKING_PERMISSIONS):
+                allowed = permission.has_permission(request, self)
+            elif hasattr(permission, 'ahas_permission'):
+                allowed = await permission.ahas_permission(request, self)
+            else:
+                allowed = await sync_to_async(permission.has_permission)(
+                    request, self
+                )
+            if not allowed:
+                if (
+                    self.authentication_classes
+                    and request.successful_authenticator is None
+                ):
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied(
+                    getattr(permission, 'message', None)
+                )
+
+    def handle_exception(self, exc):
+        auth_header = None
+        if isinstance(
+            exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)
+        ):
+            authenticators = self.get_authenticators()
+            if authenticators:
+                auth_header = authenticators[0].authenticate_header(self.request)
+            else:
+                exc.status_code = 403
+
+        if isinstance(exc.detail, (list, dict)):
+            data = exc.detail
+        else:
+            data = {'detail': exc.detail}
+
+        response = JsonResponse(data, status=exc.status_code, safe=False)
+        if auth_header:
+            response['WWW-Authenticate'] = auth_header
+        if getattr(exc, 'wait', None):
+            response['Retry-After'] = '%d' % exc.wait
+        return response
+
+
+async def avalidate(serializer):
+    """
+    Async counterpart of `serializer.is_valid(raise_exception=True)`, the
+    serializer implements the object level checks in `avalidate`.
+    """
+    try:
+        with tracing.stage('validation'):
+            attrs = serializer.to_internal_value(serializer.initial_data)
+            attrs = await serializer.avalidate(attrs)
+    except exceptions.ValidationError as exc:
+        raise exceptions.ValidationError(as_serializer_error(exc))
+
+    serializer._validated_data = attrs
+    serializer._errors = {}
+    return attrs
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from cvgezgini.apps.core.admin import LargeTableAdmin
 from .models import (
     User,
     Profile,
@@ -8,7 +9,41 @@ from .models import (
 )
 
 
-admin.site.register(User)
-admin.site.register(Profile)
-admin.site.register(Invitation)
-admin.site.register(VerifyCode)
\ No newline at end of file
+@admin.register(User)
+class UserAdmin(LargeTableAdmin):
+    list_display = ('id', 'email', 'full_name', 'is_active', 'is_premium', 'date_joined')
+    list_filter = ('is_staff', 'is_active', 'is_premium')
+    # accounts_user_email_prefix_idx on PostgreSQL, see migration 0009
+    search_fields = ('^email',)
+    search_help_text = 'E-posta adresinin başıyla arar.'
+    date_hierarchy = 'date_joined'
+    readonly_fields = ('last_login', 'date_joined', 'token_version')
+    filter_horizontal = ('groups', 'user_permissions')
+
+
+@admin.register(Profile)
+class ProfileAdmin(LargeTableAdmin):
+    list_display = ('user', 'invite_code')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
+    search_fields = ('invite_code__exact', '^user__email')
+    search_help_text = 'Davet koduyla ya da e-posta adresinin başıyla arar.'
+
+
+@admin.register(Invitation)
+class InvitationAdmin(LargeTableAdmin):
+    list_display = ('invited', 'inviter', 'created_at')
+    list_select_related = ('invited', 'inviter')
+    autocomplete_fields = ('inviter', 'invited')
+    search_fields = ('^invited__email', '^inviter__email')
+    search_help_text = 'Davet edilenin ya da edenin e-posta adresinin başıyla arar.'
+    date_hierarchy = 'created_at'
+
+
+@admin.register(VerifyCode)
+class VerifyCodeAdmin(LargeTableAdmin):
+    list_display = ('value', 'is_email', 'is_phone', 'expire_at')
+    # the unique index of value, case sensitive prefixes
+    search_fields = ('value__startswith',)
+    search_help_text = 'E-posta adresinin ya da telefon numarasının başıyla arar.'
+    date_hierarchy = 'expire_at'
@@ -0,0 +1,120 @@
+"""
+Coalesced last_login writes.
+
+`record` skips a login within LAST_LOGIN_PRECISION seconds of the stored
+last_login. Otherwise, with LAST_LOGIN_FLUSH_INTERVAL > 0, the timestamp is
+buffered per user (a later login replaces an earlier one) and a background
+thread writes the buffer every LAST_LOGIN_FLUSH_INTERVAL seconds with one
+UPDATE per chunk, so last_login may lag by up to that long. With 0 every
+login is written at once. A write never moves last_login backwards, a
+buffered login may reach the database after a later one of another process.
+"""
+import atexit
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Case, DateTimeField, F, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from cvgezgini.apps.core.periodic import PeriodicThread
+from .models import User
+
+logger = logging.getLogger('LastLogin')
+
+_pending = {}
+_lock = threading.Lock()
+_flusher = None
+
+
+def record(user):
+    when = _stamp(user)
+    if when is None:
+        return
+    if settings.LAST_LOGIN_FLUSH_INTERVAL <= 0:
+        User.objects.filter(pk=user.pk).update(last_login=_latest(when))
+    else:
+        _buffer(user.pk, when)
+
+
+async def arecord(user):
+    when = _stamp(user)
+    if when is None:
+        return
+    if settings.LAST_LOGIN_FLUSH_INTERVAL <= 0:
+        await User.objects.filter(pk=user.pk).aupdate(last_login=_latest(when))
+    else:
+        _buffer(user.pk, when)
+
+
+def flush(chunk_size=500):
+    """
+    Writes the buffered timestamps, returns the updated row count.
+    """
+    with _lock:
+        pending = list(_pending.items())
+        _pending.clear()
+
+    updated = 0
+    for i in range(0, len(pending), chunk_size):
+        chunk = pending[i:i + chunk_size]
+        updated += User.objects.filter(pk__in=[pk for pk, _ in chunk]).update(
+            last_login=Case(
+                *[When(pk=pk, then=_latest(when)) for pk, when in chunk],
+                output_field=DateTimeField(),
+            )
+        )
+    return updated
+
+
+def _latest(when):
+    # GREATEST is NULL with a NULL argument on SQLite and MySQL
+    when = Value(when, output_field=DateTimeField())
+    return Greatest(Coalesce(F('last_login'), when), when)
+
+
+def _stamp(user):
+    """
+    Sets user.last_login to now and returns it, None if the stored value is
+    recent enough to keep.
+    """
+    when = timezone.now()
+    precision = timedelta(seconds=settings.LAST_LOGIN_PRECISION)
+    if user.last_login is not None and when - user.last_login < precision:
+        return None
+    user.last_login = when
+    return when
+
+
+def _buffer(user_id, when):
+    with _lock:
+        _pending[user_id] = when
+    if _flusher is None:
+        start_flusher()
+
+
+def start_flusher():
+    global _flusher
+
+    with _lock:
+        if _flusher is None:
+            _flusher = PeriodicThread(
+                'last-login-flusher', settings.LAST_LOGIN_FLUSH_INTERVAL, flush, logger
+            )
+            _flusher.start()
+            atexit.register(stop_flusher)
+    return _flusher
+
+
+def stop_flusher():
+    global _flusher
+
+    with _lock:
+        flusher, _flusher = _flusher, None
+    if flusher is not None:
+        flusher.stop()
+        flusher.join()
+    # what is left goes out with the last flush
+    flush()
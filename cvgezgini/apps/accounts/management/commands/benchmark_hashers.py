@@ -0,0 +1,46 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+
+class Command(BaseCommand):
+    help = 'Reports hashes/sec per core of every password hasher tier with the configured costs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seconds',
+            type=float,
+            default=3,
+            help='Time spent on each hasher.',
+        )
+
+    def handle(self, *args, **options):
+        cores = os.cpu_count() or 1
+        for name, path in settings.TUNED_PASSWORD_HASHERS.items():
+            hasher = import_string(path)()
+            try:
+                hasher.encode('benchmark-password', hasher.salt())
+            except (ImportError, ValueError) as e:
+                self.stdout.write(f'{name}: skipped ({e})')
+                continue
+
+            count = 0
+            started = time.perf_counter()
+            while time.perf_counter() - started < options['seconds']:
+                hasher.encode('benchmark-password', hasher.salt())
+                count += 1
+            rate = count / (time.perf_counter() - started)
+
+            summary = hasher.safe_summary(hasher.encode('x', hasher.salt()))
+            params = ', '.join(
+                f'{key}={value}'
+                for key, value in summary.items()
+                if key not in ('algorithm', 'salt', 'hash')
+            )
+            self.stdout.write(
+                f'{name} ({params}): '
+                f'{rate:.1f} hashes/sec per core, ~{rate * cores:.0f} on {cores} cores'
+            )
@@ -0,0 +1,82 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cvgezgini.api.utils.hashing import process_pool
+from cvgezgini.apps.accounts.provisioning import FORMATS, UserImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Creates users in bulk from a CSV or JSON lines file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, - for stdin.')
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='Guessed from the file extension by default.',
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Password hashing processes, 0 uses the shared hashing pool.',
+        )
+        parser.add_argument(
+            '--max-errors',
+            type=int,
+            default=1000,
+            help='Errors to print, the rest are only counted.',
+        )
+        parser.add_argument(
+            '--send-codes',
+            action='store_true',
+            help='Queue a verification code for every new user.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format']
+        if format is None:
+            format = 'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+        executor = None
+        if options['workers'] > 0:
+            executor = process_pool(options['workers'])
+        try:
+            if path == '-':
+                importer = self.run(sys.stdin, format, executor, options)
+            else:
+                try:
+                    with open(path, newline='', encoding='utf-8') as f:
+                        importer = self.run(f, format, executor, options)
+                except OSError as e:
+                    raise CommandError(e)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        for error in importer.errors:
+            self.stderr.write(
+                f"line {error['line']} ({error['email']}): "
+                + ' '.join(error['errors'])
+            )
+        self.stdout.write(
+            f'Created {importer.created} users, {importer.error_count} errors.'
+        )
+
+    def run(self, lines, format, executor, options):
+        importer = UserImporter(
+            chunk_size=options['chunk_size'],
+            send_codes=options['send_codes'],
+            executor=executor,
+            max_errors=options['max_errors'],
+        )
+        return importer.run(
+            read_rows(lines, format),
+            on_chunk=lambda importer: self.stdout.write(
+                f'{importer.created} users created...'
+            ),
+        )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from cvgezgini.apps.accounts import referrals
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes the referral closure table and counters from the '
+        'invitations, e.g. after invitations or users were deleted.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = referrals.rebuild(options['chunk_size'])
+        self.stdout.write(f'Rebuilt the referrals of {count} invitations.')
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cvgezgini.apps.accounts import presence
+
+
+class Command(BaseCommand):
+    help = 'Clears User.is_online of the users whose presence heartbeat expired.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running, reconciling every --interval seconds.',
+        )
+        parser.add_argument('--interval', type=int, default=60)
+
+    def handle(self, *args, **options):
+        while True:
+            cleared = presence.reconcile(options['chunk_size'])
+            self.stdout.write(f'Marked {cleared} users offline.')
+
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
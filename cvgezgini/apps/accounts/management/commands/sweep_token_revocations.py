@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cvgezgini.apps.accounts.models import TokenRevocation
+
+
+class Command(BaseCommand):
+    help = 'Deletes the revocations of signed tokens which already expired.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running, sweeping every --interval seconds.',
+        )
+        parser.add_argument('--interval', type=int, default=3600)
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = TokenRevocation.sweep_expired()
+            self.stdout.write(f'Deleted {deleted} expired token revocations.')
+
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cvgezgini.apps.accounts.models import VerifyCode
+
+
+class Command(BaseCommand):
+    help = 'Deletes the expired verification codes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running, sweeping every --interval seconds.',
+        )
+        parser.add_argument('--interval', type=int, default=600)
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = VerifyCode.sweep_expired(options['chunk_size'])
+            self.stdout.write(f'Deleted {deleted} expired verification codes.')
+
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.6 on 2026-10-18 19:32
+
+from django.db import migrations, models
+
+from cvgezgini.apps.core.db.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY, the codes are written on every sign up and
+    # password reset
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0003_remove_verifycode_user_alter_profile_invite_code_and_more'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='verifycode',
+            index=models.Index(fields=['expire_at'], name='accounts_verifycode_expire_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.6 on 2026-10-18 19:50
+
+from django.db import migrations, models
+
+from cvgezgini.apps.core.db.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY, every user is a row of the table
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0004_verifycode_expire_at_index'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='user',
+            index=models.Index(condition=models.Q(('is_online', True)), fields=['id'], name='accounts_user_online_idx'),
+        ),
+    ]
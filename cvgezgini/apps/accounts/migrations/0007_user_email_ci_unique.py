@@ -0,0 +1,109 @@
+# Generated by Django 4.2.6 on 2026-10-18 20:04
+
+import cvgezgini.apps.accounts.models
+from django.conf import settings
+from django.db import migrations, models, transaction
+import django.db.models.deletion
+from django.db.models import Count, F
+from django.db.models.functions import Lower
+import django.db.models.functions.text
+
+from cvgezgini.apps.core.db.operations import AddUniqueIndexConstraintConcurrently
+
+BATCH_SIZE = 1000
+
+
+def dedupe_emails(apps, schema_editor):
+    """
+    Emails differing in case only are duplicates from now on. The account
+    logged in last (then the oldest) keeps the email, the email of the
+    others is cleared and kept in ClearedEmail, their rows are left
+    otherwise untouched. Every batch is committed on its own, the rows are
+    not locked until the end.
+    """
+    User = apps.get_model('accounts', 'User')
+    ClearedEmail = apps.get_model('accounts', 'ClearedEmail')
+    alias = schema_editor.connection.alias
+    users = (
+        User.objects.using(alias)
+        .exclude(email='')
+        .annotate(email_lower=Lower('email'))
+    )
+    while True:
+        duplicates = list(
+            users.values('email_lower')
+            .annotate(count=Count('id'))
+            .filter(count__gt=1)
+            .values_list('email_lower', flat=True)[:BATCH_SIZE]
+        )
+        if not duplicates:
+            return
+
+        kept = set()
+        cleared = []
+        for user_id, email, email_lower in users.filter(
+            email_lower__in=duplicates
+        ).order_by(
+            'email_lower', F('last_login').desc(nulls_last=True), 'id'
+        ).values_list('id', 'email', 'email_lower'):
+            if email_lower in kept:
+                cleared.append(ClearedEmail(user_id=user_id, email=email))
+            else:
+                kept.add(email_lower)
+        with transaction.atomic(using=alias):
+            ClearedEmail.objects.using(alias).bulk_create(cleared)
+            User.objects.using(alias).filter(
+                id__in=[row.user_id for row in cleared]
+            ).update(email='')
+
+
+def restore_emails(apps, schema_editor):
+    """
+    Puts the cleared emails back, unless the user set another one since.
+    """
+    User = apps.get_model('accounts', 'User')
+    ClearedEmail = apps.get_model('accounts', 'ClearedEmail')
+    alias = schema_editor.connection.alias
+    while True:
+        rows = list(ClearedEmail.objects.using(alias).order_by('id')[:BATCH_SIZE])
+        if not rows:
+            return
+        with transaction.atomic(using=alias):
+            for row in rows:
+                User.objects.using(alias).filter(id=row.user_id, email='').update(
+                    email=row.email
+                )
+            ClearedEmail.objects.using(alias).filter(
+                id__in=[row.id for row in rows]
+            ).delete()
+
+
+class Migration(migrations.Migration):
+    # batches committed one by one, the unique index built CONCURRENTLY
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0006_signed_tokens'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', cvgezgini.apps.accounts.models.UserManager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ClearedEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(dedupe_emails, restore_emails),
+        AddUniqueIndexConstraintConcurrently(
+            model_name='user',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), condition=models.Q(('email', ''), _negated=True), name='accounts_user_email_ci_unique'),
+        ),
+    ]
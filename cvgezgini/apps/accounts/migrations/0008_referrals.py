@@ -0,0 +1,42 @@
+# Generated by Django 4.2.6 on 2026-10-18 20:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_user_email_ci_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferralCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='referral_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('direct', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-total', 'user'], name='accounts_referral_total_idx'), models.Index(fields=['-direct', 'user'], name='accounts_referral_direct_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ReferralPath',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='referral_descendants', to=settings.AUTH_USER_MODEL)),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='referral_ancestors', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ancestor', 'depth'], name='accounts_referral_depth_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='referralpath',
+            constraint=models.UniqueConstraint(fields=('ancestor', 'descendant'), name='accounts_referralpath_unique'),
+        ),
+    ]
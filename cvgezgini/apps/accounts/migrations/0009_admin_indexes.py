@@ -0,0 +1,48 @@
+# Generated by Django 4.2.6 on 2026-10-18 20:17
+
+from django.db import migrations, models
+
+from cvgezgini.apps.core.db.operations import AddIndexConcurrently
+
+EMAIL_PREFIX_INDEX = 'accounts_user_email_prefix_idx'
+
+
+def create_email_prefix_index(apps, schema_editor):
+    """
+    email__istartswith (the admin's "^email" search) compiles to
+    UPPER("email"::text) LIKE UPPER('...%') on PostgreSQL, only a pattern
+    index on that expression serves it. Other databases go without.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {EMAIL_PREFIX_INDEX} '
+        f'ON accounts_user (UPPER(email::text) text_pattern_ops)'
+    )
+
+
+def drop_email_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {EMAIL_PREFIX_INDEX}')
+
+
+class Migration(migrations.Migration):
+    # the indexes are built CONCURRENTLY, writes to the users go on
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0008_referrals'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='invitation',
+            index=models.Index(fields=['created_at'], name='accounts_invite_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='user',
+            index=models.Index(fields=['date_joined'], name='accounts_user_joined_idx'),
+        ),
+        migrations.RunPython(create_email_prefix_index, drop_email_prefix_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.6 on 2026-10-18 20:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tokenrevocation',
+            name='jti',
+            field=models.CharField(blank=True, db_index=True, max_length=32),
+        ),
+    ]
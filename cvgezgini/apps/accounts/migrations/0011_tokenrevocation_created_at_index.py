@@ -0,0 +1,21 @@
+# Generated by Django 4.2.6 on 2026-10-18 20:50
+
+from django.db import migrations, models
+
+from cvgezgini.apps.core.db.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY, every process revokes into the table
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0010_tokenrevocation_jti_index'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='tokenrevocation',
+            index=models.Index(fields=['created_at'], name='accounts_tokenrev_created_idx'),
+        ),
+    ]
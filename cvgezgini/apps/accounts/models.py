@@ -1,5 +1,6 @@
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.db.models.functions import Lower
+from django.contrib.auth.models import AbstractUser, UserManager as BaseUserManager
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.utils.timezone import now
@@ -9,13 +10,45 @@ from random import choice
 
 from phonenumber_field.modelfields import PhoneNumberField
 
+from cvgezgini.apps.core.models import OutboundMessage
 from .utils import (
     CodeExpired,
-    generate_invite_code,
-    send_email
+    encode_invite_code,
     )
 
 
+# named in the IntegrityError of a taken email, see RegisterSerializer
+EMAIL_UNIQUE_CONSTRAINT = 'accounts_user_email_ci_unique'
+
+
+class UserQuerySet(models.QuerySet):
+    """
+    Emails are unique regardless of case, look users up by email through
+    these methods, they probe the Lower(email) index.
+    """
+
+    def filter_by_email(self, email):
+        return self._emails().filter(email_lower=email.strip().lower())
+
+    def filter_by_emails(self, emails):
+        emails = {email.strip().lower() for email in emails}
+        return self._emails().filter(email_lower__in=emails)
+
+    def get_by_email(self, email):
+        return self.filter_by_email(email).get()
+
+    async def aget_by_email(self, email):
+        return await self.filter_by_email(email).aget()
+
+    def _emails(self):
+        # the index leaves out empty emails, the query must as well
+        return self.alias(email_lower=Lower('email')).exclude(email='')
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
+    pass
+
+
 class User(AbstractUser):
     class Genders(models.TextChoices):
         MAN = 'MN', 'Erkek'
@@ -28,22 +61,109 @@ class User(AbstractUser):
     birth_date = models.DateField(null=True, blank=True)
     is_online = models.BooleanField('is online', default=False)
     gender = models.CharField(max_length=3, choices=Genders.choices)
+    # part of the signed tokens, bumping it invalidates the issued ones
+    token_version = models.PositiveIntegerField(default=0)
 
+    objects = UserManager()
 
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            models.UniqueConstraint(
+                Lower('email'),
+                condition=~models.Q(email=''),
+                name=EMAIL_UNIQUE_CONSTRAINT,
+            ),
+        ]
+        indexes = [
+            # online users, scanned by presence.reconcile
+            models.Index(
+                fields=['id'],
+                condition=models.Q(is_online=True),
+                name='accounts_user_online_idx',
+            ),
+            # the admin's date hierarchy
+            models.Index(fields=['date_joined'], name='accounts_user_joined_idx'),
+        ]
+
+    # fields whose database value is remembered to detect changes on save
+    TRACKED_FIELDS = (
+        'password',
+        'is_active',
+        'first_name',
+        'last_name',
+        'token_version',
+    )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            name: value
+            for name, value in zip(field_names, values)
+            if name in cls.TRACKED_FIELDS
+        }
+        return instance
+
+    def has_changed(self, field_name):
+        """
+        Returns True if the field differs from the value loaded from database.
+        Unsaved instances count as changed, deferred fields as unchanged.
+        """
+        if field_name not in self.__dict__:
+            return False
+        loaded_values = getattr(self, '_loaded_values', None)
+        if loaded_values is None:
+            return True
+        return loaded_values.get(field_name) != self.__dict__[field_name]
 
     def save(self, *args, **kwargs):
-        self.full_name = f'{self.first_name} {self.last_name}'
-        return super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        names = ('first_name', 'last_name')
+        if update_fields is not None:
+            names = [name for name in names if name in update_fields]
+        if any(self.has_changed(name) for name in names):
+            self.full_name = f'{self.first_name} {self.last_name}'
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'full_name'}
+
+        result = super().save(*args, **kwargs)
+        saved = self.TRACKED_FIELDS
+        if update_fields is not None:
+            saved = [name for name in saved if name in update_fields]
+        if getattr(self, '_loaded_values', None) is None:
+            self._loaded_values = {}
+        self._loaded_values.update(
+            (name, self.__dict__[name]) for name in saved if name in self.__dict__
+        )
+        return result
 
     def __str__(self):
         return self.full_name or self.get_full_name() or str(self.id)
 
+    def bump_token_version(self):
+        """
+        Invalidates the signed tokens issued so far once the user is saved,
+        see accounts.signals.
+        """
+        self.token_version += 1
+
+
+class ProfileManager(models.Manager):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for profile in objs:
+            if not profile.invite_code:
+                profile.set_invite_code()
+        return super().bulk_create(objs, *args, **kwargs)
+
 
 class Profile(models.Model):
     user = models.OneToOneField(User, models.CASCADE)
     about = models.TextField(blank=True, null=True)
     invite_code = models.CharField(max_length=8, unique=True,help_text='auto add active',null=True,blank=True)
 
+    objects = ProfileManager()
+
     def __str__(self):
         return str(self.user)
 
@@ -53,15 +173,10 @@ class Profile(models.Model):
         super().save(*args, **kwargs)
 
     def set_invite_code(self):
-        self.invite_code = self._get_an_invite_code()
+        # derived from the user id, so it is unique without any lookup
+        self.invite_code = encode_invite_code(self.user_id)
+
 
-    def _get_an_invite_code(self):
-        while True:
-            code = generate_invite_code()
-            if Profile.objects.filter(invite_code=code).exists():
-                continue
-            return code
-    
 class Invitation(models.Model):
     inviter = models.ForeignKey(
         User, models.CASCADE, 'invitings_as_inviter', null=True, blank=True
@@ -70,10 +185,73 @@ class Invitation(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # the admin's date hierarchy
+            models.Index(fields=['created_at'], name='accounts_invite_created_idx'),
+        ]
+
     def __str__(self):
         return f'{self.inviter} invite {self.invited}'
 
 
+class ReferralPath(models.Model):
+    """
+    Closure table of the invitation tree, a row for every user and each of
+    their direct or indirect inviters, `depth` invitations apart (1 is a
+    direct invitation). Maintained by accounts.referrals.
+    """
+
+    ancestor = models.ForeignKey(User, models.CASCADE, 'referral_descendants')
+    descendant = models.ForeignKey(User, models.CASCADE, 'referral_ancestors')
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['ancestor', 'descendant'],
+                name='accounts_referralpath_unique',
+            ),
+        ]
+        indexes = [
+            # downlines, by depth
+            models.Index(
+                fields=['ancestor', 'depth'], name='accounts_referral_depth_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.ancestor_id} > {self.descendant_id} ({self.depth})'
+
+
+class ReferralCounter(models.Model):
+    """
+    Invitation counts of a user: `direct` invitations and the `total` size
+    of the invitation subtree below the user. Maintained by
+    accounts.referrals, users without invitations have no row.
+    """
+
+    user = models.OneToOneField(
+        User, models.CASCADE, primary_key=True, related_name='referral_counter'
+    )
+    direct = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # top referrers
+            models.Index(
+                fields=['-total', 'user'], name='accounts_referral_total_idx'
+            ),
+            models.Index(
+                fields=['-direct', 'user'], name='accounts_referral_direct_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.direct} direct, {self.total} total'
+
+
 class VerifyCode(models.Model):
     value = models.CharField(max_length=64,unique=True)  # email or phone
     code = models.CharField(max_length=8)
@@ -81,11 +259,38 @@ class VerifyCode(models.Model):
     is_phone = models.BooleanField(default=False)
     expire_at = models.DateTimeField()
 
+    class Meta:
+        indexes = [
+            # the expired code sweep
+            models.Index(fields=['expire_at'], name='accounts_verifycode_expire_idx'),
+        ]
+
     def __str__(self):
         return self.value
 
+    # upsert, generating again for the same value replaces the code
+    UPSERT = {
+        'update_conflicts': True,
+        'unique_fields': ['value'],
+        'update_fields': ['code', 'is_email', 'is_phone', 'expire_at'],
+    }
+
     @classmethod
     def generate(cls, value, is_email=False, is_phone=False, expire_at=None, code=None):
+        verify_code = cls._build(value, is_email, is_phone, expire_at, code)
+        cls.objects.bulk_create([verify_code], **cls.UPSERT)
+        return verify_code
+
+    @classmethod
+    async def agenerate(
+        cls, value, is_email=False, is_phone=False, expire_at=None, code=None
+    ):
+        verify_code = cls._build(value, is_email, is_phone, expire_at, code)
+        await cls.objects.abulk_create([verify_code], **cls.UPSERT)
+        return verify_code
+
+    @classmethod
+    def _build(cls, value, is_email, is_phone, expire_at, code):
         if is_email == is_phone:
             raise ValidationError(
                 "Both is_email and is_phone should not be True or False."
@@ -99,7 +304,7 @@ class VerifyCode(models.Model):
         if expire_at is None:
             expire_at = now() + settings.VERIFICATION_CODE_EXPIRE_TIME
 
-        return cls.objects.create(
+        return cls(
             value=value,
             code=code,
             is_email=is_email,
@@ -117,17 +322,109 @@ class VerifyCode(models.Model):
     def is_valid(cls, value, code):
         return cls.objects.filter(value=value, code=code, expire_at__gt=now()).exists()
 
+    @classmethod
+    def consume(cls, value, code):
+        """
+        Verifies and uses up the code with a single DELETE, returns True if
+        the code was valid.
+        """
+        deleted, _ = cls.objects.filter(
+            value=value, code=code, expire_at__gt=now()
+        ).delete()
+        return deleted > 0
+
+    @classmethod
+    async def aconsume(cls, value, code):
+        deleted, _ = await cls.objects.filter(
+            value=value, code=code, expire_at__gt=now()
+        ).adelete()
+        return deleted > 0
+
+    @classmethod
+    def sweep_expired(cls, chunk_size=5000):
+        """
+        Deletes the expired codes in chunks, returns the deleted count.
+        """
+        deleted = 0
+        while True:
+            ids = list(
+                cls.objects.filter(expire_at__lte=now()).values_list(
+                    'id', flat=True
+                )[:chunk_size]
+            )
+            if not ids:
+                return deleted
+            deleted += cls.objects.filter(id__in=ids).delete()[0]
+
     def send(self):
+        """
+        Queues the code, send_outbound_messages delivers it.
+        """
+        for args, kwargs in self._messages():
+            OutboundMessage.enqueue(*args, **kwargs)
+
+    async def asend(self):
+        for args, kwargs in self._messages():
+            await OutboundMessage.aenqueue(*args, **kwargs)
+
+    def _messages(self):
         if self.expire_at < now():
             raise CodeExpired()
 
+        message = _(f"Doğrulama kodunuz: {self.code}. \nCvGezgini®")
+        messages = []
         if self.is_phone and settings.ENABLE_SENDING_SMS:
-            pass
-            # return send_phone()
-        if self.is_email and settings.ENABLE_SENDING_EMAIL:
-            send_email(
-                email=self.value,
-                message=_(f"Doğrulama kodunuz: {self.code}. \nCvGezgini®"),
+            messages.append(
+                ((OutboundMessage.Channels.SMS, self.value, message), {})
             )
-        return
+        if self.is_email and settings.ENABLE_SENDING_EMAIL:
+            messages.append((
+                (OutboundMessage.Channels.EMAIL, self.value, message),
+                {'subject': _("Doğrulama kodu")},
+            ))
+        return messages
+
+
+class TokenRevocation(models.Model):
+    """
+    Revoked signed tokens, either a single token (jti) or every token of
+    the user older than min_version. Mirrored in memory by the deny list of
+    cvgezgini.api.utils.signed_tokens.
+    """
+
+    user = models.ForeignKey(User, models.CASCADE, 'token_revocations')
+    jti = models.CharField(max_length=32, blank=True, db_index=True)
+    min_version = models.PositiveIntegerField(null=True, blank=True)
+    # no token it covers is valid after this
+    expire_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # the deny list refresh reads the rows created since the last one
+            models.Index(fields=['created_at'], name='accounts_tokenrev_created_idx'),
+        ]
 
+    def __str__(self):
+        return f'{self.user_id} {self.jti or self.min_version}'
+
+    @classmethod
+    def sweep_expired(cls):
+        """
+        Deletes the revocations of tokens which expired anyway, returns the
+        deleted count.
+        """
+        return cls.objects.filter(expire_at__lte=now()).delete()[0]
+
+
+class ClearedEmail(models.Model):
+    """
+    Emails cleared by migration 0007 as duplicates of another account's
+    email in a different case, put back when the migration is reversed.
+    """
+
+    user = models.ForeignKey(User, models.CASCADE, '+')
+    email = models.EmailField()
+
+    def __str__(self):
+        return f'{self.user_id} {self.email}'
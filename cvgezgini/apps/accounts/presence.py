@@ -0,0 +1,135 @@
+"""
+Presence of the users, kept in the cache instead of the accounts_user table.
+
+A heartbeat refreshes a cache key of the user living PRESENCE_TIMEOUT
+seconds, the user is online while the key exists. User.is_online is an
+aggregated copy for filtering and the admin, written in batches: `flush`
+marks the users who sent a heartbeat to this process since the last flush
+(every PRESENCE_FLUSH_INTERVAL seconds from a background thread) and
+`reconcile` clears the ones whose key expired (reconcile_presence command).
+The cache must be shared by the workers, `check --deploy` reports a per
+process one (core.E003).
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+
+from cvgezgini.apps.core.periodic import PeriodicThread
+from .models import User
+
+logger = logging.getLogger('Presence')
+
+PREFIX = 'presence:'
+
+_pending = set()
+_lock = threading.Lock()
+_flusher = None
+
+
+def _key(user_id):
+    return f'{PREFIX}{user_id}'
+
+
+def heartbeat(user_id):
+    cache.set(_key(user_id), 1, settings.PRESENCE_TIMEOUT)
+    _add_pending(user_id)
+
+
+async def aheartbeat(user_id):
+    await cache.aset(_key(user_id), 1, settings.PRESENCE_TIMEOUT)
+    _add_pending(user_id)
+
+
+def disconnect(user_id):
+    cache.delete(_key(user_id))
+    with _lock:
+        _pending.discard(user_id)
+
+
+def is_online(user_id):
+    return cache.get(_key(user_id)) is not None
+
+
+def online(user_ids):
+    """
+    Returns the set of the online users among `user_ids`, a single cache
+    round trip.
+    """
+    keys = {_key(user_id): user_id for user_id in user_ids}
+    return {keys[key] for key in cache.get_many(keys)}
+
+
+def flush(chunk_size=1000):
+    """
+    Sets is_online of the users who sent a heartbeat to this process since
+    the last flush, returns the updated row count.
+    """
+    with _lock:
+        user_ids = list(_pending)
+        _pending.clear()
+
+    # some may have expired or disconnected meanwhile
+    user_ids = sorted(online(user_ids))
+    updated = 0
+    for i in range(0, len(user_ids), chunk_size):
+        updated += User.objects.filter(
+            id__in=user_ids[i:i + chunk_size], is_online=False
+        ).update(is_online=True)
+    return updated
+
+
+def reconcile(chunk_size=1000):
+    """
+    Clears is_online of the users without a live heartbeat, returns the
+    updated row count.
+    """
+    cleared = 0
+    last_id = 0
+    while True:
+        user_ids = list(
+            User.objects.filter(is_online=True, id__gt=last_id)
+            .order_by('id')
+            .values_list('id', flat=True)[:chunk_size]
+        )
+        if not user_ids:
+            return cleared
+        last_id = user_ids[-1]
+
+        offline = set(user_ids) - online(user_ids)
+        if offline:
+            cleared += User.objects.filter(id__in=offline).update(is_online=False)
+
+
+def _add_pending(user_id):
+    with _lock:
+        _pending.add(user_id)
+    if settings.PRESENCE_FLUSH_INTERVAL > 0 and _flusher is None:
+        start_flusher()
+
+
+def start_flusher():
+    global _flusher
+
+    with _lock:
+        if _flusher is None:
+            _flusher = PeriodicThread(
+                'presence-flusher', settings.PRESENCE_FLUSH_INTERVAL, flush, logger
+            )
+            _flusher.start()
+            atexit.register(stop_flusher)
+    return _flusher
+
+
+def stop_flusher():
+    global _flusher
+
+    with _lock:
+        flusher, _flusher = _flusher, None
+    if flusher is not None:
+        flusher.stop()
+        flusher.join()
+    # what is left goes out with the last flush
+    flush()
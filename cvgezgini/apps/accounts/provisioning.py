@@ -0,0 +1,236 @@
+"""
+Bulk user provisioning, used by the import_users command and the
+users/import/ endpoint.
+
+Rows are streamed from CSV or JSON lines and inserted in chunks, one
+INSERT per model per chunk after hashing the chunk's passwords in
+parallel. A bad row is reported with its line number and skipped, the rest
+of the batch goes on.
+
+Columns: email (required), password or password_hash (an already encoded
+hash, e.g. exported from another system, is stored as is and upgraded on
+first login), first_name, last_name and inviter (invite code of the
+inviting user).
+"""
+import csv
+import json
+from collections import namedtuple
+
+from django.contrib.auth.hashers import identify_hasher
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.utils.translation import gettext as _
+
+from cvgezgini.api.utils import hashing
+from cvgezgini.apps.core.models import OutboundMessage
+from . import referrals
+from .models import Invitation, Profile, User, VerifyCode
+
+FORMATS = ('csv', 'jsonl')
+
+Entry = namedtuple('Entry', 'number user password inviter')
+
+
+def read_rows(lines, format):
+    """
+    Yields (line number, row dict) from an iterable of text lines, the row
+    is None if the line cannot be parsed.
+    """
+    if format == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+    elif format == 'jsonl':
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield number, row if isinstance(row, dict) else None
+    else:
+        raise ValueError(f'Unknown format {format!r}, expected one of {FORMATS}.')
+
+
+class UserImporter:
+    """
+    Inserts the rows given to `run` in chunks of `chunk_size` users.
+
+    Passwords are hashed on `executor` (a concurrent.futures executor), the
+    shared hashing pool when it is None. With `send_codes` a verification
+    code is generated and queued for every new user. Only the first
+    `max_errors` errors are kept in `errors`, `error_count` counts them all.
+    """
+
+    def __init__(
+        self, chunk_size=1000, send_codes=False, executor=None, max_errors=100
+    ):
+        self.chunk_size = chunk_size
+        self.send_codes = send_codes
+        self.executor = executor
+        self.max_errors = max_errors
+        self.created = 0
+        self.errors = []
+        self.error_count = 0
+        self._seen = set()
+        self._unresolved = set()
+
+    def run(self, rows, on_chunk=None):
+        chunk = []
+        for number, row in rows:
+            entry = self._build(number, row)
+            if entry is not None:
+                chunk.append(entry)
+            if len(chunk) >= self.chunk_size:
+                self._flush(chunk)
+                chunk = []
+                if on_chunk is not None:
+                    on_chunk(self)
+        if chunk:
+            self._flush(chunk)
+            if on_chunk is not None:
+                on_chunk(self)
+        return self
+
+    def add_error(self, number, email, messages):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': number, 'email': email, 'errors': messages})
+
+    def _build(self, number, row):
+        if row is None:
+            self.add_error(number, None, [_('Satır okunamadı.')])
+            return None
+
+        email = User.objects.normalize_email((row.get('email') or '').strip())
+        try:
+            validate_email(email)
+        except ValidationError as e:
+            self.add_error(number, email, e.messages)
+            return None
+        if email.lower() in self._seen:
+            self.add_error(number, email, [_('Bu e-posta dosyada tekrar ediyor.')])
+            return None
+
+        user = User(
+            email=email,
+            first_name=row.get('first_name') or '',
+            last_name=row.get('last_name') or '',
+        )
+        # User.save is skipped by bulk_create
+        user.full_name = f'{user.first_name} {user.last_name}'
+
+        password = row.get('password') or None
+        if row.get('password_hash'):
+            try:
+                # one of PASSWORD_HASHERS, anything else could never log in
+                identify_hasher(row['password_hash'])
+            except ValueError:
+                self.add_error(number, email, [_('Şifre özeti tanınmadı.')])
+                return None
+            user.password = row['password_hash']
+        elif password is not None:
+            try:
+                validate_password(password, user)
+            except ValidationError as e:
+                self.add_error(number, email, e.messages)
+                return None
+        else:
+            user.set_unusable_password()
+
+        self._seen.add(email.lower())
+        return Entry(number, user, password, (row.get('inviter') or '').strip())
+
+    def _flush(self, chunk):
+        existing = {
+            email.lower()
+            for email in User.objects.filter_by_emails(
+                [entry.user.email for entry in chunk]
+            ).values_list('email', flat=True)
+        }
+        entries = []
+        for entry in chunk:
+            if entry.user.email.lower() in existing:
+                self.add_error(
+                    entry.number,
+                    entry.user.email,
+                    [_('Bu e-posta ile kayıtlı bir kullanıcı var.')],
+                )
+            else:
+                entries.append(entry)
+        if not entries:
+            return
+
+        to_hash = [entry for entry in entries if entry.password]
+        encoded = hashing.hash_passwords(
+            [entry.password for entry in to_hash], self.executor
+        )
+        for entry, password in zip(to_hash, encoded):
+            entry.user.password = password
+
+        try:
+            with transaction.atomic():
+                self._insert(entries)
+        except IntegrityError:
+            # somebody else inserted a conflicting row, find it one by one
+            for entry in entries:
+                entry.user.pk = None
+                entry.user._state.adding = True
+                try:
+                    with transaction.atomic():
+                        self._insert([entry])
+                except IntegrityError as e:
+                    self.add_error(entry.number, entry.user.email, [str(e)])
+                    self._unresolved.discard(entry.number)
+
+        for entry in entries:
+            if entry.number in self._unresolved:
+                self.add_error(
+                    entry.number, entry.user.email, [_('Davet kodu bulunamadı.')]
+                )
+        self._unresolved.clear()
+
+    def _insert(self, entries):
+        users = User.objects.bulk_create([entry.user for entry in entries])
+        Profile.objects.bulk_create(Profile(user=user) for user in users)
+
+        invite_codes = {entry.inviter for entry in entries if entry.inviter}
+        inviters = dict(
+            Profile.objects.filter(invite_code__in=invite_codes).values_list(
+                'invite_code', 'user_id'
+            )
+        )
+        # the user is created anyway, the unknown code is reported
+        self._unresolved.update(
+            entry.number
+            for entry in entries
+            if entry.inviter and entry.inviter not in inviters
+        )
+        invitations = Invitation.objects.bulk_create(
+            Invitation(inviter_id=inviters[entry.inviter], invited=entry.user)
+            for entry in entries
+            if entry.inviter in inviters
+        )
+        # bulk_create sends no post_save
+        referrals.add_invitations(invitations)
+
+        if self.send_codes:
+            codes = VerifyCode.objects.bulk_create(
+                [
+                    VerifyCode._build(user.email, True, False, None, None)
+                    for user in users
+                ],
+                **VerifyCode.UPSERT,
+            )
+            OutboundMessage.objects.bulk_create(
+                [
+                    OutboundMessage._build(*args, **kwargs)
+                    for code in codes
+                    for args, kwargs in code._messages()
+                ],
+                ignore_conflicts=True,
+            )
+        self.created += len(users)
@@ -0,0 +1,197 @@
+"""
+The invitation tree, kept queryable without recursive walks.
+
+Every Invitation adds its paths to the ReferralPath closure table and bumps
+the ReferralCounter rows of the inviter and everybody above, see
+`add_invitations`. Saving an Invitation does it through accounts.signals,
+bulk inserts must call it themselves. Reads are single indexed queries:
+
+    referrals.subtree_size(user.pk)
+    referrals.counts(user.pk)
+    referrals.top_referrers(10)
+    referrals.downline(user.pk, max_depth=2)
+
+Deleting invitations or users leaves the counters of the users above as
+they were, the rebuild_referrals command recomputes everything.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import Invitation, ReferralCounter, ReferralPath, User
+
+
+def add_invitations(invitations, chunk_size=500):
+    """
+    Adds the paths and counts of saved invitations, in any order. Raises
+    ValueError if one would make a user their own inviter.
+    """
+    edges = [
+        (invitation.inviter_id, invitation.invited_id)
+        for invitation in invitations
+        if invitation.inviter_id is not None
+    ]
+    if not edges:
+        return
+    inviters = {inviter for inviter, _ in edges}
+    invited = {user for _, user in edges}
+
+    with transaction.atomic():
+        # a concurrent invitation touching the same users waits until the
+        # paths read below are written, locked in id order against deadlocks
+        list(
+            User.objects.select_for_update()
+            .filter(pk__in=inviters | invited)
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        paths, direct, total = _paths(edges, inviters, invited)
+        ReferralPath.objects.bulk_create(paths, batch_size=chunk_size)
+        _add_counts(direct, total, chunk_size)
+
+
+def _paths(edges, inviters, invited):
+    # only what the edges need: above the inviters and below the invited
+    ancestors = {user: {} for user in inviters}
+    for ancestor, descendant, depth in ReferralPath.objects.filter(
+        descendant__in=inviters
+    ).values_list('ancestor', 'descendant', 'depth'):
+        ancestors[descendant][ancestor] = depth
+    descendants = {user: {} for user in invited}
+    for ancestor, descendant, depth in ReferralPath.objects.filter(
+        ancestor__in=invited
+    ).values_list('ancestor', 'descendant', 'depth'):
+        descendants[ancestor][descendant] = depth
+
+    paths = []
+    direct = Counter()
+    total = Counter()
+    for inviter, user in edges:
+        above = {inviter: 0, **ancestors[inviter]}
+        below = {user: 0, **descendants[user]}
+        if user in above:
+            raise ValueError(f'User {user} would be their own inviter.')
+
+        for ancestor, up in above.items():
+            for descendant, down in below.items():
+                depth = up + down + 1
+                paths.append(
+                    ReferralPath(
+                        ancestor_id=ancestor, descendant_id=descendant, depth=depth
+                    )
+                )
+                # later edges of the batch see the new paths
+                if descendant in ancestors:
+                    ancestors[descendant][ancestor] = depth
+                if ancestor in descendants:
+                    descendants[ancestor][descendant] = depth
+            total[ancestor] += len(below)
+        direct[inviter] += 1
+    return paths, direct, total
+
+
+def check_invitation(invitation):
+    """
+    Raises ValueError if the invitation would make the invited user their
+    own inviter, checked before it is saved.
+    """
+    inviter, user = invitation.inviter_id, invitation.invited_id
+    if inviter is None:
+        return
+    if inviter == user or ReferralPath.objects.filter(
+        ancestor_id=user, descendant_id=inviter
+    ).exists():
+        raise ValueError(f'User {user} would be their own inviter.')
+
+
+def _add_counts(direct, total, chunk_size):
+    users = list(total)
+    ReferralCounter.objects.bulk_create(
+        [ReferralCounter(user_id=user) for user in users],
+        batch_size=chunk_size,
+        ignore_conflicts=True,
+    )
+    for i in range(0, len(users), chunk_size):
+        chunk = users[i:i + chunk_size]
+        ReferralCounter.objects.filter(user_id__in=chunk).update(
+            direct=F('direct') + _increments(chunk, direct),
+            total=F('total') + _increments(chunk, total),
+        )
+
+
+def _increments(users, counts):
+    return Case(
+        *[
+            When(user_id=user, then=Value(counts[user]))
+            for user in users
+            if counts[user]
+        ],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def rebuild(chunk_size=1000):
+    """
+    Recomputes the paths and counters of every invitation, in a single
+    transaction. Returns the number of invitations.
+    """
+    count = 0
+    with transaction.atomic():
+        ReferralPath.objects.all().delete()
+        ReferralCounter.objects.all().delete()
+        queryset = Invitation.objects.filter(inviter__isnull=False).only(
+            'inviter', 'invited'
+        )
+        chunk = []
+        for invitation in queryset.iterator(chunk_size):
+            chunk.append(invitation)
+            if len(chunk) >= chunk_size:
+                add_invitations(chunk)
+                count += len(chunk)
+                chunk = []
+        add_invitations(chunk)
+        count += len(chunk)
+    return count
+
+
+def counts(user_id):
+    """
+    Returns {'direct': ..., 'total': ...}, the number of users the user
+    invited directly and in total.
+    """
+    counter = (
+        ReferralCounter.objects.filter(user_id=user_id)
+        .values('direct', 'total')
+        .first()
+    )
+    return counter or {'direct': 0, 'total': 0}
+
+
+def subtree_size(user_id):
+    """
+    Number of users the user invited, directly or indirectly.
+    """
+    return counts(user_id)['total']
+
+
+def top_referrers(limit=10, direct=False):
+    """
+    ReferralCounters of the users with the largest subtrees (or the most
+    direct invitations), with their users.
+    """
+    order = '-direct' if direct else '-total'
+    queryset = ReferralCounter.objects.select_related('user')
+    return queryset.order_by(order, 'user_id')[:limit]
+
+
+def downline(user_id, max_depth=None):
+    """
+    ReferralPaths to the users below the user, at most `max_depth`
+    invitations deep, nearest first, with the users.
+    """
+    queryset = ReferralPath.objects.filter(ancestor_id=user_id)
+    if max_depth is not None:
+        queryset = queryset.filter(depth__lte=max_depth)
+    return queryset.select_related('descendant').order_by('depth', 'descendant_id')
@@ -0,0 +1,49 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from cvgezgini.api.utils.authentication import token_cache
+from cvgezgini.api.utils.profile_cache import profile_cache
+from cvgezgini.api.utils.signed_tokens import deny_list
+from . import referrals
+from .models import Invitation, Profile, User
+
+
+@receiver(post_save, sender=User)
+def invalidate_cached_tokens(sender, instance, created, **kwargs):
+    if created:
+        return
+    if instance.has_changed('password') or instance.has_changed('is_active'):
+        token_cache.delete_for_user(instance.pk)
+    if instance.has_changed('token_version'):
+        deny_list.revoke_user(instance.pk, instance.token_version)
+
+
+@receiver(post_save, sender=User)
+def invalidate_cached_me(sender, instance, created, **kwargs):
+    if not created:
+        profile_cache.bump(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_cached_me_of_profile(sender, instance, **kwargs):
+    profile_cache.bump(instance.user_id)
+
+
+@receiver(pre_save, sender=Invitation)
+def check_referral_cycle(sender, instance, **kwargs):
+    if instance._state.adding:
+        referrals.check_invitation(instance)
+
+
+@receiver(post_save, sender=Invitation)
+def add_referral_paths(sender, instance, created, **kwargs):
+    if created:
+        referrals.add_invitations([instance])
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    token_cache.delete(instance.key)
@@ -1,3 +1,386 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import IntegrityError, connection, connections, transaction
+from django.test import (
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+    skipUnlessDBFeature,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import now
+
+from cvgezgini.apps.core.models import OutboundMessage
+
+from . import presence, referrals
+from .models import Invitation, Profile, ReferralCounter, ReferralPath, User, VerifyCode
+from .provisioning import UserImporter, read_rows
+from .utils import INVITE_CODE_LENGTH, encode_invite_code
+
+
+class InviteCodeTestCase(TestCase):
+    def test_encode(self):
+        code = encode_invite_code(1)
+        self.assertEqual(len(code), INVITE_CODE_LENGTH)
+        self.assertEqual(code, encode_invite_code(1))
+        self.assertNotEqual(code, encode_invite_code(2))
+        self.assertEqual(len(encode_invite_code(2 ** 36 - 1)), INVITE_CODE_LENGTH)
+        with self.assertRaises(ValueError):
+            encode_invite_code(2 ** 36)
+
+    def test_unique_in_database(self):
+        # both halves of the Feistel domain and its ends
+        users = User.objects.bulk_create(
+            User(pk=pk, username=f'user{pk}', email=f'user{pk}@example.com')
+            for pk in (1, 2, 2 ** 18, 2 ** 18 + 1, 2 ** 36 - 1)
+        )
+        Profile.objects.bulk_create(Profile(user=user) for user in users)
+        self.assertEqual(Profile.objects.values('invite_code').distinct().count(), 5)
+
+        user = User.objects.create(email='test@example.com')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Profile.objects.create(user=user, invite_code=encode_invite_code(1))
+
+    def test_profile_without_lookup(self):
+        user = User.objects.create(email='test@example.com')
+        with self.assertNumQueries(1):
+            profile = Profile.objects.create(user=user)
+        self.assertEqual(profile.invite_code, encode_invite_code(user.pk))
+
+    def test_bulk_create(self):
+        users = User.objects.bulk_create(
+            User(username=f'user{i}', email=f'user{i}@example.com') for i in range(50)
+        )
+        Profile.objects.bulk_create(Profile(user=user) for user in users)
+        self.assertEqual(
+            Profile.objects.values('invite_code').distinct().count(), 50
+        )
+
+
+class ConcurrentInviteCodeTestCase(TransactionTestCase):
+    # every thread has a connection of its own, which the SQLite test
+    # database does not allow
+    @skipUnlessDBFeature('test_db_allows_multiple_connections')
+    def test_concurrent_creators(self):
+        def create(worker):
+            try:
+                profiles = []
+                for i in range(10):
+                    user = User.objects.create(
+                        username=f'user{worker}-{i}',
+                        email=f'user{worker}-{i}@example.com',
+                    )
+                    profiles.append(Profile.objects.create(user=user).invite_code)
+                return profiles
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(create, range(4)))
+
+        codes = [code for result in results for code in result]
+        self.assertEqual(len(set(codes)), 40)
+        self.assertEqual(
+            Profile.objects.values('invite_code').distinct().count(), 40
+        )
+
+
+class VerifyCodeTestCase(TestCase):
+    EMAIL = 'test@example.com'
+
+    def test_generate_again(self):
+        VerifyCode.generate(value=self.EMAIL, is_email=True, code='1111')
+        with self.assertNumQueries(1):
+            VerifyCode.generate(value=self.EMAIL, is_email=True, code='2222')
+        self.assertEqual(VerifyCode.objects.get(value=self.EMAIL).code, '2222')
+
+    def test_consume(self):
+        VerifyCode.generate(value=self.EMAIL, is_email=True, code='1111')
+        self.assertFalse(VerifyCode.consume(self.EMAIL, '2222'))
+        with self.assertNumQueries(1):
+            self.assertTrue(VerifyCode.consume(self.EMAIL, '1111'))
+        # a code can be used once
+        self.assertFalse(VerifyCode.consume(self.EMAIL, '1111'))
+
+    def test_expired(self):
+        VerifyCode.generate(
+            value=self.EMAIL,
+            is_email=True,
+            code='1111',
+            expire_at=now() - timedelta(seconds=1),
+        )
+        VerifyCode.generate(value='other@example.com', is_email=True)
+        self.assertFalse(VerifyCode.consume(self.EMAIL, '1111'))
+
+        self.assertEqual(VerifyCode.sweep_expired(), 1)
+        self.assertEqual(
+            list(VerifyCode.objects.values_list('value', flat=True)),
+            ['other@example.com'],
+        )
+
+
+class UserImporterTestCase(TestCase):
+    def setUp(self):
+        self.inviter = User.objects.create(email='inviter@example.com')
+        self.invite_code = Profile.objects.create(user=self.inviter).invite_code
+
+    def test_csv(self):
+        lines = [
+            'email,password,first_name,last_name,inviter\n',
+            f'a@example.com,TestPassword123,Ali,Veli,{self.invite_code}\n',
+            'not-an-email,TestPassword123,,,\n',
+            'b@example.com,123,,,\n',
+            'a@example.com,TestPassword123,,,\n',
+            'inviter@example.com,TestPassword123,,,\n',
+            'c@example.com,,,,unknown\n',
+        ]
+        importer = UserImporter(chunk_size=2).run(read_rows(lines, 'csv'))
+
+        self.assertEqual(importer.created, 2)
+        self.assertEqual(
+            [error['line'] for error in importer.errors], [3, 4, 5, 6, 7]
+        )
+        user = User.objects.get(email='a@example.com')
+        self.assertTrue(user.check_password('TestPassword123'))
+        self.assertEqual(user.full_name, 'Ali Veli')
+        self.assertTrue(Profile.objects.filter(user=user).exists())
+        self.assertEqual(Invitation.objects.get(invited=user).inviter, self.inviter)
+        self.assertEqual(referrals.subtree_size(self.inviter.pk), 1)
+        # created without a password or an invitation
+        user = User.objects.get(email='c@example.com')
+        self.assertFalse(user.has_usable_password())
+        self.assertFalse(Invitation.objects.filter(invited=user).exists())
+
+    @override_settings(ENABLE_SENDING_EMAIL=True)
+    def test_jsonl(self):
+        lines = [
+            '{"email": "a@example.com", "password_hash": "%s"}\n'
+            % make_password('TestPassword123'),
+            '\n',
+            '{"email": \n',
+        ]
+        importer = UserImporter(send_codes=True).run(read_rows(lines, 'jsonl'))
+
+        self.assertEqual(importer.created, 1)
+        self.assertEqual(importer.errors[0]['line'], 3)
+        user = User.objects.get(email='a@example.com')
+        self.assertTrue(user.check_password('TestPassword123'))
+        self.assertTrue(VerifyCode.objects.filter(value=user.email).exists())
+        self.assertTrue(OutboundMessage.objects.filter(recipient=user.email).exists())
+
+    def test_invalid_rows(self):
+        lines = [
+            '{"email": "a@example.com", "password_hash": "plaintext"}\n',
+            '{"email": "b@example.com", "password": "123"}\n',
+            '{"email": \n',
+        ]
+        importer = UserImporter(max_errors=2).run(read_rows(lines, 'jsonl'))
+
+        self.assertEqual(importer.created, 0)
+        self.assertEqual(importer.error_count, 3)
+        self.assertEqual([error['line'] for error in importer.errors], [1, 2])
+
+
+class UserSaveTestCase(TestCase):
+    def test_full_name(self):
+        user = User.objects.create(email='test@example.com', first_name='Ali')
+        self.assertEqual(user.full_name, 'Ali ')
+
+        user = User.objects.get(pk=user.pk)
+        user.last_name = 'Veli'
+        user.save(update_fields=['last_name'])
+        user.refresh_from_db()
+        self.assertEqual(user.full_name, 'Ali Veli')
+
+        # an unrelated partial save leaves full_name alone
+        User.objects.filter(pk=user.pk).update(full_name='Custom')
+        user.first_name = 'Ayşe'
+        user.save(update_fields=['is_online'])
+        user.refresh_from_db()
+        self.assertEqual(user.full_name, 'Custom')
+
+
+@override_settings(PRESENCE_FLUSH_INTERVAL=0)
+class PresenceTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        presence.flush()
+        self.users = User.objects.bulk_create(
+            User(username=f'user{i}', email=f'user{i}@example.com') for i in range(3)
+        )
+        self.ids = [user.pk for user in self.users]
+
+    def test_heartbeat_without_writes(self):
+        with self.assertNumQueries(0):
+            presence.heartbeat(self.ids[0])
+            presence.heartbeat(self.ids[1])
+        self.assertTrue(presence.is_online(self.ids[0]))
+        self.assertEqual(presence.online(self.ids), set(self.ids[:2]))
+
+    def test_flush_and_reconcile(self):
+        presence.heartbeat(self.ids[0])
+        presence.heartbeat(self.ids[1])
+        with self.assertNumQueries(1):
+            self.assertEqual(presence.flush(), 2)
+        self.assertEqual(presence.flush(), 0)
+
+        presence.disconnect(self.ids[1])
+        self.assertEqual(presence.reconcile(), 1)
+        self.assertEqual(
+            list(User.objects.filter(is_online=True).values_list('id', flat=True)),
+            self.ids[:1],
+        )
+
+
+class ReferralsTestCase(TestCase):
+    def setUp(self):
+        # a -> b -> c -> d, a -> e
+        self.users = {
+            name: User.objects.create_user(username=name, email=f'{name}@example.com')
+            for name in 'abcde'
+        }
+
+    def invite(self, inviter, invited):
+        Invitation.objects.create(
+            inviter=self.users[inviter], invited=self.users[invited]
+        )
+
+    def paths(self):
+        names = {user.pk: name for name, user in self.users.items()}
+        return sorted(
+            (names[ancestor], names[descendant], depth)
+            for ancestor, descendant, depth in ReferralPath.objects.values_list(
+                'ancestor', 'descendant', 'depth'
+            )
+        )
+
+    def counts(self):
+        return {name: referrals.counts(user.pk) for name, user in self.users.items()}
+
+    def test_tree(self):
+        # out of order, subtrees are joined
+        self.invite('c', 'd')
+        self.invite('a', 'b')
+        self.invite('b', 'c')
+        self.invite('a', 'e')
+
+        self.assertEqual(
+            self.paths(),
+            [
+                ('a', 'b', 1), ('a', 'c', 2), ('a', 'd', 3), ('a', 'e', 1),
+                ('b', 'c', 1), ('b', 'd', 2), ('c', 'd', 1),
+            ],
+        )
+        counts = self.counts()
+        self.assertEqual(counts['a'], {'direct': 2, 'total': 4})
+        self.assertEqual(counts['b'], {'direct': 1, 'total': 2})
+        self.assertEqual(counts['d'], {'direct': 0, 'total': 0})
+
+        a = self.users['a']
+        self.assertEqual(
+            [path.descendant.username for path in referrals.downline(a.pk, 1)],
+            ['b', 'e'],
+        )
+        self.assertEqual(len(referrals.downline(a.pk)), 4)
+        self.assertEqual(
+            [counter.user.username for counter in referrals.top_referrers(2)],
+            ['a', 'b'],
+        )
+
+        with self.assertRaises(ValueError):
+            self.invite('d', 'a')
+
+        paths, counts = self.paths(), self.counts()
+        ReferralCounter.objects.update(total=0)
+        self.assertEqual(referrals.rebuild(chunk_size=2), 4)
+        self.assertEqual(self.paths(), paths)
+        self.assertEqual(self.counts(), counts)
+
+    def test_single_batch(self):
+        referrals.add_invitations(
+            Invitation.objects.bulk_create(
+                [
+                    Invitation(inviter=self.users['c'], invited=self.users['d']),
+                    Invitation(inviter=self.users['b'], invited=self.users['c']),
+                    Invitation(inviter=self.users['a'], invited=self.users['b']),
+                ]
+            )
+        )
+        self.assertEqual(len(self.paths()), 6)
+        self.assertEqual(referrals.subtree_size(self.users['a'].pk), 3)
+
+
+class AdminTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='x'
+        )
+        self.client.force_login(self.admin)
+
+    def invite(self, count):
+        for _ in range(count):
+            inviter = User.objects.create_user(
+                username=f'inviter{User.objects.count()}',
+                email=f'inviter{User.objects.count()}@example.com',
+            )
+            invited = User.objects.create_user(
+                username=f'invited{User.objects.count()}',
+                email=f'invited{User.objects.count()}@example.com',
+            )
+            Profile.objects.create(user=invited)
+            Invitation.objects.create(inviter=inviter, invited=invited)
+
+    def test_changelists(self):
+        self.invite(1)
+        for model in ('user', 'profile', 'invitation', 'verifycode'):
+            url = reverse(f'admin:accounts_{model}_changelist')
+            for params in ({}, {'q': 'inv'}):
+                res = self.client.get(url, params)
+                self.assertEqual(res.status_code, 200, (model, params))
+        res = self.client.get(reverse('admin:core_authattempt_changelist'), {'q': 'a'})
+        self.assertEqual(res.status_code, 200)
+
+        res = self.client.get(reverse('admin:accounts_user_changelist'), {'q': 'INVITED'})
+        self.assertEqual(len(res.context['cl'].result_list), 1)
+
+        invitation = Invitation.objects.get()
+        for url in (
+            reverse('admin:accounts_user_change', args=[invitation.invited_id]),
+            reverse('admin:accounts_invitation_change', args=[invitation.pk]),
+        ):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_constant_queries(self):
+        urls = [
+            reverse('admin:accounts_invitation_changelist'),
+            reverse('admin:accounts_profile_changelist'),
+        ]
+        self.invite(1)
+        counts = []
+        for url in urls:
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            counts.append(len(queries))
+
+        # no query per row
+        self.invite(4)
+        for url, count in zip(urls, counts):
+            with self.assertNumQueries(count):
+                self.client.get(url)
+
+    def test_autocomplete(self):
+        self.invite(1)
+        res = self.client.get(
+            reverse('admin:autocomplete'),
+            {
+                'app_label': 'accounts',
+                'model_name': 'invitation',
+                'field_name': 'inviter',
+                'term': 'inviter',
+            },
+        )
+        self.assertEqual(len(res.json()['results']), 1)
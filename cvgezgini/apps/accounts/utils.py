@@ -1,13 +1,54 @@
-import random
+import hashlib
+import hmac
 from string import ascii_uppercase, digits
 
+from django.conf import settings
+from django.core.mail import send_mail
+from django.utils.translation import gettext as _
+
+from cvgezgini.apps.core.sms import get_sms_backend
+
 CHARACTER_POOL = ascii_uppercase + digits
 
+# 7 characters hold the 36 bit Feistel domain (2^36 < 36^7), legacy random
+# codes are 6 characters so the two never collide.
+INVITE_CODE_LENGTH = 7
+_HALF_BITS = 18
+_HALF_MASK = (1 << _HALF_BITS) - 1
 
-def generate_invite_code():
-    code = ''.join(random.choices(CHARACTER_POOL, k=6))
-    return code
-def send_email():
-    pass
+
+def encode_invite_code(number):
+    """
+    Maps a number below 2^36 (a user id) to an invite code with a keyed
+    Feistel permutation, distinct numbers always get distinct codes.
+    INVITE_CODE_KEY must never change once codes are issued.
+    """
+    if not 0 <= number < 1 << 2 * _HALF_BITS:
+        raise ValueError(f"{number} is out of the invite code range")
+
+    key = settings.INVITE_CODE_KEY.encode()
+    left, right = number >> _HALF_BITS, number & _HALF_MASK
+    for round_ in range(4):
+        digest = hmac.new(
+            key, bytes([round_]) + right.to_bytes(3, 'big'), hashlib.sha256
+        ).digest()
+        left, right = right, left ^ (int.from_bytes(digest[:3], 'big') & _HALF_MASK)
+    value = left << _HALF_BITS | right
+
+    code = []
+    for _ in range(INVITE_CODE_LENGTH):
+        value, index = divmod(value, len(CHARACTER_POOL))
+        code.append(CHARACTER_POOL[index])
+    return ''.join(code)
+def send_email(email, message, subject=None, connection=None):
+    send_mail(
+        subject or _('CvGezgini'),
+        message,
+        None,
+        [email],
+        connection=connection,
+    )
+def send_sms(phone, message, backend=None):
+    (backend or get_sms_backend()).send(phone, message)
 class CodeExpired(Exception):
-    pass
\ No newline at end of file
+    pass
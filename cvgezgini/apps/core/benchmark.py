@@ -0,0 +1,59 @@
+"""
+Small helpers shared by the benchmark management commands.
+"""
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+
+
+@contextmanager
+def rolled_back():
+    """
+    Runs the block in a transaction which is always rolled back, so the
+    benchmarks can seed rows without leaving anything behind.
+    """
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+@contextmanager
+def test_database(name='benchmark'):
+    """
+    Runs the block against a freshly migrated test database of the default
+    connection, destroyed afterwards. SQLite gets a temporary file instead
+    of memory, in-memory test databases lock whole tables under concurrent
+    writers.
+    """
+    if connection.vendor == 'sqlite':
+        connection.settings_dict['TEST']['NAME'] = os.path.join(
+            tempfile.gettempdir(), f'{name}.sqlite3'
+        )
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def measure(func, iterations):
+    """
+    Calls `func` `iterations` times and returns (elapsed seconds, calls/sec).
+    """
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = time.perf_counter() - started
+    return elapsed, iterations / elapsed if elapsed else float('inf')
+
+
+def percentile(samples, percent):
+    """
+    Nearest-rank percentile of a list of samples.
+    """
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
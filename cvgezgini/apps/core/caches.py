@@ -0,0 +1,11 @@
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def is_shared(alias=DEFAULT_CACHE_ALIAS):
+    """
+    False for the caches every process keeps to itself (locmem, dummy),
+    whose entries other workers neither see nor invalidate.
+    """
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
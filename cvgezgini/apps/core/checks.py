@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.core.checks import Error, register
+from django.utils.module_loading import import_string
+
+from .caches import is_shared
+
+
+@register(deploy=True)
+def check_attempt_limiter_cache(app_configs, **kwargs):
+    from cvgezgini.api.utils.ratelimit import CacheBackend
+
+    backend = import_string(settings.ATTEMPT_LIMITER_BACKEND)
+    if issubclass(backend, CacheBackend) and not is_shared():
+        return [
+            Error(
+                'The attempt limiter counts in a per process cache, every '
+                'worker allows ATTEMPT_LIMIT attempts of its own.',
+                hint=(
+                    'Set CACHE_URL to a cache shared by the workers (e.g. '
+                    'redis) or use the DatabaseBackend.'
+                ),
+                id='core.E001',
+            )
+        ]
+    return []
+
+
+
+@register(deploy=True)
+def check_presence_cache(app_configs, **kwargs):
+    if not is_shared():
+        return [
+            Error(
+                'Presence is kept in a per process cache, a user is online '
+                'only for the worker which received their heartbeat.',
+                hint='Set CACHE_URL to a cache shared by the workers (e.g. redis).',
+                id='core.E003',
+            )
+        ]
+    return []
+
+INVITE_CODE_KEY_MIN_LENGTH = 32
+
+
+@register(deploy=True)
+def check_invite_code_key(app_configs, **kwargs):
+    if len(settings.INVITE_CODE_KEY) < INVITE_CODE_KEY_MIN_LENGTH:
+        return [
+            Error(
+                'INVITE_CODE_KEY is empty or too short, the invite codes of '
+                'every user can be guessed from their ids.',
+                hint=(
+                    f'Set it to a random string of at least '
+                    f'{INVITE_CODE_KEY_MIN_LENGTH} characters before issuing '
+                    f'any invite code, it cannot be changed afterwards.'
+                ),
+                id='core.E002',
+            )
+        ]
+    return []
@@ -0,0 +1,61 @@
+"""
+Migration operations building indexes without blocking writes on PostgreSQL.
+
+A plain CREATE INDEX holds a lock that blocks every INSERT, UPDATE and
+DELETE of the table until the index is built, minutes on the large tables.
+These operations build it CONCURRENTLY on PostgreSQL and fall back to the
+regular operation on the other databases (the test suite's SQLite). The
+migration must set `atomic = False`. A concurrent build that fails leaves
+an INVALID index behind, drop it before migrating again.
+"""
+from django.contrib.postgres.operations import (
+    AddIndexConcurrently as BaseAddIndexConcurrently,
+    NotInTransactionMixin,
+)
+from django.db.migrations.operations import AddConstraint, AddIndex
+
+
+def _is_postgresql(schema_editor):
+    return schema_editor.connection.vendor == 'postgresql'
+
+
+class AddIndexConcurrently(BaseAddIndexConcurrently):
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if _is_postgresql(schema_editor):
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            AddIndex.database_forwards(
+                self, app_label, schema_editor, from_state, to_state
+            )
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if _is_postgresql(schema_editor):
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            AddIndex.database_backwards(
+                self, app_label, schema_editor, from_state, to_state
+            )
+
+
+class AddUniqueIndexConstraintConcurrently(NotInTransactionMixin, AddConstraint):
+    """
+    AddConstraint of a UniqueConstraint with expressions or a condition,
+    which PostgreSQL keeps as a unique index, built CONCURRENTLY.
+    """
+
+    atomic = False
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not _is_postgresql(schema_editor):
+            return super().database_forwards(
+                app_label, schema_editor, from_state, to_state
+            )
+
+        self._ensure_not_in_transaction(schema_editor)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            statement = self.constraint.create_sql(model, schema_editor)
+            statement.template = statement.template.replace(
+                'CREATE UNIQUE INDEX', 'CREATE UNIQUE INDEX CONCURRENTLY', 1
+            )
+            schema_editor.execute(statement)
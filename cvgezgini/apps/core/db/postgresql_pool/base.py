@@ -0,0 +1,131 @@
+"""
+PostgreSQL backend taking its connections from an in-process psycopg2 pool,
+enabled with DB_POOL.
+
+Under ASGI every request runs in its own context, so persistent connections
+(CONN_MAX_AGE) are never reused and each request connects again. Here
+closing a connection hands it back to the pool instead, open transactions
+are rolled back on the way. The pool is configured by OPTIONS["pool"]:
+
+    "OPTIONS": {"pool": {"min_size": 2, "max_size": 10, "timeout": 10}}
+
+A request waits up to `timeout` seconds for a free connection, then
+OperationalError is raised. Use it with CONN_MAX_AGE = 0. With
+CONN_HEALTH_CHECKS a checked out connection is probed with SELECT 1 first,
+one dropped by the server (restart, idle timeout) is replaced.
+"""
+import os
+import threading
+
+from django.db.backends.postgresql import base
+from psycopg2 import extensions, extras, pool
+
+_pools = {}
+_lock = threading.Lock()
+
+
+def is_usable(connection):
+    """
+    False if the server dropped the connection, psycopg2 notices on the next
+    query only.
+    """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        if connection.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            connection.rollback()
+    except base.Database.Error:
+        return False
+    return True
+
+
+class ConnectionPool(pool.ThreadedConnectionPool):
+    def __init__(self, min_size, max_size, timeout, **conn_params):
+        # physical connections opened, checkouts are not counted
+        self.connects = 0
+        super().__init__(min_size, max_size, **conn_params)
+        self.pid = os.getpid()
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def _connect(self, key=None):
+        self.connects += 1
+        return super()._connect(key)
+
+    def acquire(self, check=False):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise base.Database.OperationalError(
+                f'No free connection in the pool within {self.timeout}s.'
+            )
+        try:
+            connection = self.getconn()
+            # dropped by the server meanwhile, all the idle ones may be
+            for _ in range(self.maxconn):
+                if not connection.closed and (not check or is_usable(connection)):
+                    break
+                self.putconn(connection, close=True)
+                connection = self.getconn()
+        except BaseException:
+            self._slots.release()
+            raise
+        return connection
+
+    def release(self, connection, close=False):
+        try:
+            self.putconn(connection, close=close or bool(connection.closed))
+        finally:
+            self._slots.release()
+
+
+def get_pool(alias, options, conn_params):
+    with _lock:
+        connection_pool = _pools.get(alias)
+        # connections must not be shared with a forked worker
+        if connection_pool is None or connection_pool.pid != os.getpid():
+            connection_pool = _pools[alias] = ConnectionPool(
+                options.get('min_size', 1),
+                options.get('max_size', 10),
+                options.get('timeout', 10),
+                **conn_params,
+            )
+        return connection_pool
+
+
+def close_pools():
+    with _lock:
+        for connection_pool in _pools.values():
+            if connection_pool.pid == os.getpid():
+                connection_pool.closeall()
+        _pools.clear()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop('pool', None)
+        return conn_params
+
+    def get_new_connection(self, conn_params):
+        options = self.settings_dict['OPTIONS']
+        connection_pool = get_pool(self.alias, options.get('pool', {}), conn_params)
+        connection = connection_pool.acquire(
+            check=self.settings_dict['CONN_HEALTH_CHECKS']
+        )
+
+        if 'isolation_level' in options:
+            self.isolation_level = base.IsolationLevel(options['isolation_level'])
+            connection.isolation_level = self.isolation_level
+        else:
+            self.isolation_level = base.IsolationLevel.READ_COMMITTED
+        # see the parent, repeated since a pooled connection may be new
+        extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+        self._pool = connection_pool
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                # a connection left in a broken state is not reused
+                self._pool.release(
+                    self.connection, close=self.errors_occurred
+                )
@@ -0,0 +1,142 @@
+"""
+Read replica routing, enabled when DATABASE_REPLICAS lists replica aliases.
+
+Only reads made while ReplicaMiddleware handles a request go to a replica,
+everything else (management commands, shells, background threads) stays on
+the primary. Within a request reads go back to the primary for good once
+something was written or a transaction was opened, and the response sets a
+cookie pinning the client's next REPLICA_STICKINESS seconds to the primary,
+so it reads its own writes despite the replication lag. Reads which must
+not be stale, like the login lookups, run in `primary()`:
+
+    with routers.primary():
+        user = User.objects.get_by_email(email)
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+COOKIE_NAME = 'db_primary'
+
+
+class RequestState:
+    __slots__ = ('pinned', 'written')
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.written = False
+
+
+# a mutable state, writes in copied contexts (sync_to_async) must pin the
+# whole request
+_request = ContextVar('db_request', default=None)
+_primary = ContextVar('db_primary', default=False)
+
+
+@contextmanager
+def primary():
+    """
+    Sends the reads of the block to the primary.
+    """
+    token = _primary.set(True)
+    try:
+        yield
+    finally:
+        _primary.reset(token)
+
+
+def pin(written=False):
+    """
+    Sends the remaining reads of the current request to the primary.
+    """
+    state = _request.get()
+    if state is not None:
+        state.pinned = True
+        state.written = state.written or written
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        state = _request.get()
+        if (
+            state is None
+            or state.pinned
+            or _primary.get()
+            or not settings.DATABASE_REPLICAS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        pin(written=True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas follow the primary
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaMiddleware:
+    """
+    Lets the reads of the request go to the replicas and keeps the client on
+    the primary for REPLICA_STICKINESS seconds after a write. Left out of the
+    stack when there are no DATABASE_REPLICAS.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        state = RequestState(pinned=COOKIE_NAME in request.COOKIES)
+        token = _request.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request.reset(token)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        state = RequestState(pinned=COOKIE_NAME in request.COOKIES)
+        token = _request.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request.reset(token)
+        return self.finish(request, response, state)
+
+    def finish(self, request, response, state):
+        if state.written:
+            response.set_cookie(
+                COOKIE_NAME,
+                '1',
+                max_age=settings.REPLICA_STICKINESS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
@@ -0,0 +1,69 @@
+import random
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from cvgezgini.api.utils.ratelimit import (
+    CacheBackend,
+    DatabaseBackend,
+    MemoryBackend,
+)
+from cvgezgini.apps.core.benchmark import measure, rolled_back
+from cvgezgini.apps.core.models import AuthAttempt
+
+
+class Command(BaseCommand):
+    help = 'Measures the attempt limiter backends while the AuthAttempt history grows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--history',
+            type=int,
+            nargs='+',
+            default=[0, 10_000, 100_000, 1_000_000],
+            help='AuthAttempt row counts to measure with.',
+        )
+        parser.add_argument('--attempts', type=int, default=1000)
+        parser.add_argument('--chunk-size', type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        backends = [MemoryBackend(), CacheBackend(), DatabaseBackend()]
+
+        with rolled_back():
+            rows = 0
+            for history in sorted(options['history']):
+                self._seed(history - rows, options['chunk_size'])
+                rows = max(rows, history)
+
+                for backend in backends:
+                    with rolled_back():
+                        elapsed, _ = measure(
+                            lambda: backend.attempt(
+                                'benchmark', self._ip(), self._email(), 10, 3600
+                            ),
+                            options['attempts'],
+                        )
+                    self.stdout.write(
+                        f'history={rows} {type(backend).__name__}: '
+                        f'{elapsed / options["attempts"] * 1e6:.1f} us/attempt'
+                    )
+
+    def _seed(self, count, chunk_size):
+        now = timezone.now()
+        while count > 0:
+            size = min(count, chunk_size)
+            AuthAttempt.objects.bulk_create(
+                AuthAttempt(ip=self._ip(), email=self._email()) for _ in range(size)
+            )
+            count -= size
+        # seeded history is older than the limiter window
+        AuthAttempt.objects.filter(time__gte=now).update(
+            time=now - timedelta(hours=2)
+        )
+
+    def _ip(self):
+        return '.'.join(str(random.randint(1, 254)) for _ in range(4))
+
+    def _email(self):
+        return f'user{random.getrandbits(32)}@example.com'
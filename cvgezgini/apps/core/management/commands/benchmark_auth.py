@@ -0,0 +1,324 @@
+import json
+import random
+import re
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.authtoken.models import Token
+
+from cvgezgini.apps.accounts import last_login
+from cvgezgini.apps.accounts.models import Profile, User
+from cvgezgini.apps.core.benchmark import percentile, test_database
+
+PASSWORD = 'benchmark-password'
+DEFAULT_MIX = 'login=60,register=10,update-password=10,forgot-password=20'
+QUERIES = re.compile(r'queries;desc="(\d+)"')
+
+
+class Command(BaseCommand):
+    help = (
+        'Replays mixed register/login/update-password/forgot-password traffic '
+        'against the api URLconf and reports throughput, p50/p95/p99 latency '
+        'and queries per request, optionally saved as JSON to compare commits.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Users to seed.')
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=1)
+        parser.add_argument(
+            '--mix',
+            default=DEFAULT_MIX,
+            help=f'Weights of the operations, default {DEFAULT_MIX}.',
+        )
+        parser.add_argument(
+            '--url',
+            help=(
+                'Base url of a locally running server (e.g. http://127.0.0.1:8000) '
+                'sharing this database, started with DEVELOPMENT_MODE, '
+                'TRACING_ENABLED and USE_FALLBACK_CODE and without '
+                'ATTEMPT_PROTECTION. By default requests are made in process '
+                'against a throwaway test database.'
+            ),
+        )
+        parser.add_argument(
+            '--fast-hashing',
+            action='store_true',
+            help='Use the MD5 hasher to measure everything but hashing (in process only).',
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed.')
+        parser.add_argument('--output', help='Write the results as JSON here.')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.weights = self.parse_mix(options['mix'])
+        self.prefix = f'bench{int(time.time())}'
+        self.api = {
+            'login': reverse('api:login'),
+            'register': reverse('api:register'),
+            'update-password': reverse('api:update-password'),
+            'forgot-password-with-email-first-step': reverse(
+                'api:forgot-password-with-email-first-step'
+            ),
+            'forgot-password-with-email-second-step': reverse(
+                'api:forgot-password-with-email-second-step'
+            ),
+        }
+
+        with ExitStack() as stack:
+            if options['url']:
+                self.send = self.send_http
+            else:
+                self.send = self.send_in_process
+                stack.enter_context(test_database('benchmark_auth'))
+                stack.enter_context(override_settings(**self.overrides()))
+
+            started = time.perf_counter()
+            self.users = self.seed(options['users'])
+            self.stdout.write(
+                f"Seeded {len(self.users)} users in "
+                f"{time.perf_counter() - started:.1f}s."
+            )
+            try:
+                results, elapsed = self.replay()
+            finally:
+                # buffered last_login values go to this database
+                last_login.stop_flusher()
+                if options['url']:
+                    User.objects.filter(email__startswith=self.prefix).delete()
+
+        report = self.report(results, elapsed)
+        for route, row in report['routes'].items():
+            queries = row['queries_per_request']
+            self.stdout.write(
+                f"{route}: {row['requests']} requests, {row['errors']} errors, "
+                f"{row['throughput']:.1f} req/s, p50={row['p50_ms']:.1f}ms "
+                f"p95={row['p95_ms']:.1f}ms p99={row['p99_ms']:.1f}ms, "
+                f"queries/request={'-' if queries is None else f'{queries:.1f}'}"
+            )
+        self.stdout.write(
+            f"total: {report['requests']} requests in {elapsed:.2f}s, "
+            f"{report['throughput']:.1f} req/s"
+        )
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Saved to {options['output']}.")
+
+    def overrides(self):
+        overrides = {
+            'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'],
+            'ATTEMPT_PROTECTION': False,
+            # Server-Timing carries the query count
+            'DEVELOPMENT_MODE': True,
+            'TRACING_ENABLED': True,
+            'USE_FALLBACK_CODE': True,
+        }
+        if self.options['fast_hashing']:
+            overrides['PASSWORD_HASHERS'] = [
+                'django.contrib.auth.hashers.MD5PasswordHasher'
+            ]
+        return overrides
+
+    def parse_mix(self, mix):
+        weights = {}
+        for part in mix.split(','):
+            name, _, weight = part.partition('=')
+            if name not in ('login', 'register', 'update-password', 'forgot-password'):
+                raise CommandError(f'Unknown operation {name!r} in --mix.')
+            try:
+                weights[name] = float(weight)
+            except ValueError:
+                raise CommandError(f'Invalid weight {weight!r} in --mix.')
+        return weights
+
+    def seed(self, count):
+        """
+        Inserts the users, profiles and tokens with one bulk_create each and
+        a single password hash shared by every user.
+        """
+        password = make_password(PASSWORD)
+        users = User.objects.bulk_create(
+            User(
+                username=f'{self.prefix}-{i}',
+                email=f'{self.prefix}-{i}@example.com',
+                password=password,
+                full_name=' ',
+            )
+            for i in range(count)
+        )
+        Profile.objects.bulk_create(Profile(user=user) for user in users)
+        tokens = Token.objects.bulk_create(
+            Token(key=Token.generate_key(), user=user) for user in users
+        )
+        return [(user.email, token.key) for user, token in zip(users, tokens)]
+
+    def replay(self):
+        rng = random.Random(self.options['seed'])
+        names, weights = zip(*self.weights.items())
+        operations = [
+            (name, rng.randrange(len(self.users)))
+            for name in rng.choices(names, weights, k=self.options['requests'])
+        ]
+        results = []
+        lock = threading.Lock()
+        registered = iter(range(len(operations)))
+
+        def run(operation):
+            name, index = operation
+            email, token = self.users[index]
+            if name == 'register':
+                with lock:
+                    email = f'{self.prefix}-new-{next(registered)}@example.com'
+            samples = getattr(self, f"op_{name.replace('-', '_')}")(email, token)
+            with lock:
+                results.extend(samples)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(self.options['concurrency']) as executor:
+            list(executor.map(run, operations))
+        return results, time.perf_counter() - started
+
+    def op_login(self, email, token):
+        return [self.send('login', 'post', {'email': email, 'password': PASSWORD})]
+
+    def op_register(self, email, token):
+        return [
+            self.send(
+                'register',
+                'post',
+                {'email': email, 'password': PASSWORD},
+                as_json=True,
+            )
+        ]
+
+    def op_update_password(self, email, token):
+        # the same password again, the seeded state stays valid
+        data = {'old_password': PASSWORD, 'new_password': PASSWORD}
+        return [self.send('update-password', 'put', data, as_json=True, token=token)]
+
+    def op_forgot_password(self, email, token):
+        first = self.send(
+            'forgot-password-with-email-first-step',
+            'post',
+            {'email': email},
+            as_json=True,
+        )
+        data = {
+            'email': email,
+            'code': str(settings.VERIFICATION_CODE_FALLBACK),
+            'new_password': PASSWORD,
+        }
+        second = self.send(
+            'forgot-password-with-email-second-step', 'post', data, as_json=True
+        )
+        return [first, second]
+
+    _local = threading.local()
+
+    def send_in_process(self, route, method, data, as_json=False, token=None):
+        # django.test.Client is not thread safe, one per thread
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = Client()
+        kwargs = {'content_type': 'application/json'} if as_json else {}
+        if token:
+            kwargs['HTTP_AUTHORIZATION'] = f'Token {token}'
+
+        started = time.perf_counter()
+        response = getattr(client, method)(self.api[route], data, **kwargs)
+        elapsed = time.perf_counter() - started
+        return route, elapsed, response.status_code, response.get('Server-Timing')
+
+    def send_http(self, route, method, data, as_json=False, token=None):
+        headers = {}
+        if as_json:
+            body = json.dumps(data).encode()
+            headers['Content-Type'] = 'application/json'
+        else:
+            body = urllib.parse.urlencode(data).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if token:
+            headers['Authorization'] = f'Token {token}'
+        request = urllib.request.Request(
+            self.options['url'].rstrip('/') + self.api[route],
+            body,
+            headers,
+            method=method.upper(),
+        )
+
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                status, timing = response.status, response.headers['Server-Timing']
+        except urllib.error.HTTPError as e:
+            status, timing = e.code, e.headers['Server-Timing']
+        return route, time.perf_counter() - started, status, timing
+
+    def report(self, results, elapsed):
+        by_route = defaultdict(list)
+        for sample in results:
+            by_route[sample[0]].append(sample)
+
+        routes = {}
+        for route, samples in sorted(by_route.items()):
+            latencies = [latency for _, latency, _, _ in samples]
+            queries = [
+                int(match.group(1))
+                for _, _, _, timing in samples
+                if timing and (match := QUERIES.search(timing))
+            ]
+            routes[route] = {
+                'requests': len(samples),
+                'errors': sum(not 200 <= status < 300 for _, _, status, _ in samples),
+                'throughput': len(samples) / elapsed,
+                'p50_ms': percentile(latencies, 50) * 1000,
+                'p95_ms': percentile(latencies, 95) * 1000,
+                'p99_ms': percentile(latencies, 99) * 1000,
+                'queries_per_request': (
+                    sum(queries) / len(queries) if queries else None
+                ),
+            }
+
+        return {
+            'commit': self.commit(),
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'target': self.options['url'] or 'in-process',
+            'options': {
+                name: self.options[name]
+                for name in (
+                    'users', 'requests', 'concurrency', 'mix', 'fast_hashing', 'seed'
+                )
+            },
+            'requests': len(results),
+            'throughput': len(results) / elapsed,
+            'routes': routes,
+        }
+
+    def commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', 'HEAD'],
+                capture_output=True,
+                text=True,
+                cwd=settings.BASE_DIR,
+            ).stdout.strip() or None
+        except OSError:
+            return None
@@ -0,0 +1,108 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+from django.test import AsyncRequestFactory, RequestFactory, override_settings
+
+from rest_framework.authtoken.models import Token
+
+from cvgezgini.api.auth import async_views
+from cvgezgini.api.auth import views
+from cvgezgini.apps.accounts import last_login
+from cvgezgini.apps.accounts.models import User
+from cvgezgini.apps.core.benchmark import percentile, test_database
+
+PASSWORD = 'benchmark-password'
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares p50/p99 latency of the sync (WSGI) and async (ASGI) auth '
+        'views at a fixed concurrency. Runs against a throwaway test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=16)
+
+    def handle(self, *args, **options):
+        requests = options['requests']
+        concurrency = options['concurrency']
+
+        with test_database('benchmark_auth_views'):
+            with override_settings(ATTEMPT_PROTECTION=False):
+                users = self.seed(concurrency)
+                for name, run in (('wsgi', self.run_sync), ('asgi', self.run_async)):
+                    for endpoint in ('login', 'forgot-password'):
+                        results = run(endpoint, users, requests, concurrency)
+                        latencies = [latency for latency, _ in results]
+                        errors = sum(status != 200 for _, status in results)
+                        self.stdout.write(
+                            f'{name} {endpoint}: '
+                            f'p50={percentile(latencies, 50) * 1000:.1f}ms '
+                            f'p99={percentile(latencies, 99) * 1000:.1f}ms '
+                            f'({requests} requests, concurrency {concurrency}, '
+                            f'{errors} errors)'
+                        )
+                last_login.stop_flusher()
+
+    def seed(self, count):
+        users = [
+            User.objects.create_user(
+                username=f'benchmark{i}',
+                email=f'benchmark{i}@example.com',
+                password=PASSWORD,
+            )
+            for i in range(count)
+        ]
+        # returning users, the token is not created under concurrency
+        for user in users:
+            Token.objects.create(user=user)
+        return users
+
+    def build(self, factory, endpoint, user):
+        if endpoint == 'login':
+            data = {'email': user.email, 'password': PASSWORD}
+        else:
+            data = {'email': user.email}
+        return factory.post('/', data)
+
+    def run_sync(self, endpoint, users, requests, concurrency):
+        view = {
+            'login': views.LoginWithEmailView,
+            'forgot-password': views.ForgotPasswordWithEmailFirstStep,
+        }[endpoint].as_view()
+        factory = RequestFactory()
+
+        def call(i):
+            request = self.build(factory, endpoint, users[i % len(users)])
+            started = time.perf_counter()
+            response = view(request)
+            return time.perf_counter() - started, response.status_code
+
+        # one thread per WSGI worker thread
+        with ThreadPoolExecutor(concurrency) as executor:
+            return list(executor.map(call, range(requests)))
+
+    def run_async(self, endpoint, users, requests, concurrency):
+        view = {
+            'login': async_views.LoginWithEmailAsyncView,
+            'forgot-password': async_views.ForgotPasswordWithEmailFirstStepAsyncView,
+        }[endpoint].as_view()
+        factory = AsyncRequestFactory()
+
+        async def main():
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def call(i):
+                request = self.build(factory, endpoint, users[i % len(users)])
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await view(request)
+                    return time.perf_counter() - started, response.status_code
+
+            return await asyncio.gather(*(call(i) for i in range(requests)))
+
+        return async_to_sync(main)()
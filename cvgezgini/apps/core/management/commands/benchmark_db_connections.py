@@ -0,0 +1,139 @@
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections
+from django.db.backends.signals import connection_created
+from django.db.utils import load_backend
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from cvgezgini.apps.accounts.models import Profile, User
+from cvgezgini.apps.core.benchmark import percentile, test_database
+
+PASSWORD = 'benchmark-password'
+POOL_ENGINE = 'cvgezgini.apps.core.db.postgresql_pool'
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares logins/sec with a new database connection per request, '
+        'persistent connections (CONN_MAX_AGE, with and without health '
+        'checks) and the in-process pool (PostgreSQL only), on a throwaway '
+        'test database of the configured server.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--pool-size', type=int, default=4)
+
+    def handle(self, *args, **options):
+        self.client = Client()
+        self.opened = 0
+        connection_created.connect(self.count_connection)
+
+        # hashing would hide the connection setup, MD5 leaves the rest
+        with test_database('benchmark_db_connections'), override_settings(
+            ALLOWED_HOSTS=['testserver'],
+            ATTEMPT_PROTECTION=False,
+            AUTH_TOKEN_MODE='token',
+            LAST_LOGIN_FLUSH_INTERVAL=0,
+            LAST_LOGIN_PRECISION=3600,
+            PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+        ):
+            user = User.objects.create(
+                username='benchmark', email='benchmark@example.com'
+            )
+            user.password = make_password(PASSWORD)
+            user.save(update_fields=['password'])
+            Profile.objects.get_or_create(user=user)
+
+            modes = [
+                ('per request', {'CONN_MAX_AGE': 0}),
+                ('persistent', {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': False}),
+                (
+                    'persistent + health checks',
+                    {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True},
+                ),
+            ]
+            if connections[DEFAULT_DB_ALIAS].vendor == 'postgresql':
+                size = options['pool_size']
+                db_options = connections[DEFAULT_DB_ALIAS].settings_dict['OPTIONS']
+                pool = {'min_size': size, 'max_size': size}
+                modes.append(
+                    (
+                        'pool',
+                        {
+                            'ENGINE': POOL_ENGINE,
+                            'CONN_MAX_AGE': 0,
+                            'OPTIONS': {**db_options, 'pool': pool},
+                        },
+                    )
+                )
+            else:
+                self.stdout.write('The pool needs PostgreSQL, skipped.')
+
+            for name, overrides in modes:
+                self.run(name, overrides, options['requests'], user.email)
+
+        connection_created.disconnect(self.count_connection)
+
+    def count_connection(self, sender, connection, **kwargs):
+        # sent on every checkout of the pool too, its connects are counted
+        # by the pool itself
+        if connection.settings_dict['ENGINE'] != POOL_ENGINE:
+            self.opened += 1
+
+    def pool_connects(self, backend):
+        pools = getattr(backend, '_pools', {})
+        return sum(connection_pool.connects for connection_pool in pools.values())
+
+    def run(self, name, overrides, requests, email):
+        original = connections[DEFAULT_DB_ALIAS]
+        original.close()
+        settings_dict = {**original.settings_dict, **overrides}
+        backend = load_backend(settings_dict['ENGINE'])
+        connections[DEFAULT_DB_ALIAS] = backend.DatabaseWrapper(
+            settings_dict, DEFAULT_DB_ALIAS
+        )
+        try:
+            latencies = self.replay(requests, email, backend)
+        finally:
+            connections[DEFAULT_DB_ALIAS].close()
+            if settings_dict['ENGINE'] == POOL_ENGINE:
+                backend.close_pools()
+            connections[DEFAULT_DB_ALIAS] = original
+
+        elapsed = sum(latencies)
+        self.stdout.write(
+            f'{name}: {requests / elapsed:.0f} logins/s, '
+            f'p50={percentile(latencies, 50) * 1000:.2f}ms '
+            f'p95={percentile(latencies, 95) * 1000:.2f}ms, '
+            f'{self.opened} connections opened'
+        )
+
+    def replay(self, requests, email, backend):
+        url = reverse('api:login')
+        data = {'email': email, 'password': PASSWORD}
+        # warm up, the first request of every mode connects
+        self.login(url, data)
+        self.opened = 0
+        pool_connects = self.pool_connects(backend)
+
+        latencies = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = self.login(url, data)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise CommandError(f'Login failed: {response.status_code}.')
+        self.opened += self.pool_connects(backend) - pool_connects
+        return latencies
+
+    def login(self, url, data):
+        # django.test.Client leaves connections open, this is what the
+        # request_started and request_finished handlers do
+        close_old_connections()
+        response = self.client.post(url, data)
+        close_old_connections()
+        return response
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from cvgezgini.apps.core.benchmark import rolled_back
+from cvgezgini.apps.core.messaging import deliver_pending
+from cvgezgini.apps.core.models import OutboundMessage
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures the outbound message throughput against local sinks. Mails '
+        'go to the in-memory backend, or with --smtp-port to run_message_sink.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=5000)
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--smtp-port', type=int, default=None)
+
+    def handle(self, *args, **options):
+        email_settings = {
+            'EMAIL_BACKEND': 'django.core.mail.backends.locmem.EmailBackend'
+        }
+        if options['smtp_port']:
+            email_settings = {
+                'EMAIL_BACKEND': 'django.core.mail.backends.smtp.EmailBackend',
+                'EMAIL_HOST': '127.0.0.1',
+                'EMAIL_PORT': options['smtp_port'],
+                'EMAIL_USE_TLS': False,
+                'EMAIL_HOST_USER': '',
+                'EMAIL_HOST_PASSWORD': '',
+            }
+
+        with override_settings(
+            SMS_BACKEND='cvgezgini.apps.core.sms.LocmemSmsBackend', **email_settings
+        ), rolled_back():
+            for i in range(options['messages']):
+                channel = (
+                    OutboundMessage.Channels.SMS
+                    if i % 2
+                    else OutboundMessage.Channels.EMAIL
+                )
+                OutboundMessage.enqueue(channel, f'user{i}@example.com', f'{i}')
+
+            started = time.perf_counter()
+            while deliver_pending(options['batch_size']):
+                pass
+            elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f'Delivered {options["messages"]} messages in {elapsed:.2f}s '
+            f'({options["messages"] / elapsed:.0f} messages/s)'
+        )
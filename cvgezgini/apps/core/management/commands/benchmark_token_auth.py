@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from cvgezgini.api.utils.authentication import (
+    CachedTokenAuthentication,
+    token_cache,
+)
+from cvgezgini.apps.accounts.models import User
+from cvgezgini.apps.core.benchmark import measure, rolled_back
+
+
+class Command(BaseCommand):
+    help = 'Compares authenticated requests/sec of TokenAuthentication and CachedTokenAuthentication.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        iterations = options['requests']
+
+        with rolled_back():
+            user = User.objects.create_user(username='benchmark-token-auth')
+            token = Token.objects.create(user=user)
+            request = RequestFactory().get(
+                '/', HTTP_AUTHORIZATION=f'Token {token.key}'
+            )
+
+            for authentication in (
+                TokenAuthentication(),
+                CachedTokenAuthentication(),
+            ):
+                token_cache.delete(token.key)
+                # views read the user, which loads the lazy cached one
+                elapsed, rate = measure(
+                    lambda: authentication.authenticate(request)[0].is_active,
+                    iterations,
+                )
+                self.stdout.write(
+                    f'{type(authentication).__name__}: '
+                    f'{rate:.0f} req/s ({iterations} requests in {elapsed:.2f}s)'
+                )
+
+            token_cache.delete(token.key)
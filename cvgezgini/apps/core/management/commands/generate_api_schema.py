@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from cvgezgini.api.utils import schema
+
+
+class Command(BaseCommand):
+    help = (
+        'Generates the OpenAPI schema of the api and writes it to '
+        'API_SCHEMA_PATH, where the processes load it from. Run it on deploy.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Defaults to API_SCHEMA_PATH.')
+
+    def handle(self, *args, **options):
+        path = options['output'] or settings.API_SCHEMA_PATH
+        if not path:
+            raise CommandError('API_SCHEMA_PATH is empty, pass --output.')
+        schema.write(path, schema.generate(), schema.urlconf_hash())
+        self.stdout.write(f'Wrote the schema to {path}.')
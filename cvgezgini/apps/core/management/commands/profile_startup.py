@@ -0,0 +1,103 @@
+import json
+import os
+import subprocess
+import sys
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+PROBE = 'cvgezgini.apps.core.startup'
+
+
+def parse_importtime(output):
+    """
+    Returns (module, self seconds, cumulative seconds, depth) of every line
+    of `python -X importtime` output.
+    """
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or line.endswith('| imported package'):
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append(
+            (name.strip(), int(own) / 1e6, int(cumulative) / 1e6, depth)
+        )
+    return imports
+
+
+def ms(seconds):
+    return f'{seconds * 1000:.1f}ms'
+
+
+class Command(BaseCommand):
+    help = (
+        'Starts a fresh interpreter the way a worker starts and reports the '
+        'import time per module and package, the import/models/ready() cost '
+        'of every app and the cost of the warm up steps.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument(
+            '--sort',
+            choices=['cumulative', 'self'],
+            default='cumulative',
+            help=(
+                'cumulative lists the imports made by Django and the project '
+                'directly, self every module by its own import time.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': os.environ.get(
+                'DJANGO_SETTINGS_MODULE', 'cvgezgini.settings'
+            ),
+        }
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-m', PROBE],
+            capture_output=True,
+            text=True,
+            cwd=settings.BASE_DIR,
+            env=env,
+        )
+        if process.returncode:
+            raise CommandError(f'The probe failed:\n{process.stderr[-2000:]}')
+        report = json.loads(process.stdout.splitlines()[-1])
+        imports = parse_importtime(process.stderr)
+
+        self.stdout.write(f"settings: {ms(report['settings'])}")
+        self.stdout.write(f"django.setup(): {ms(report['setup'])}")
+        for label, timings in report['apps'].items():
+            self.stdout.write(
+                f"  {label}: import={ms(timings.get('import', 0))} "
+                f"models={ms(timings.get('import_models', 0))} "
+                f"ready={ms(timings.get('ready', 0))}"
+            )
+        self.stdout.write(f"warm up: {ms(sum(report['warm_up'].values()))}")
+        for step, seconds in report['warm_up'].items():
+            self.stdout.write(f'  {step}: {ms(seconds)}')
+
+        total = sum(own for _, own, _, _ in imports)
+        self.stdout.write(f'imports: {len(imports)} modules, {ms(total)}')
+        packages = Counter()
+        for name, own, _, _ in imports:
+            packages[name.partition('.')[0]] += own
+        self.stdout.write('by package:')
+        for package, seconds in packages.most_common(options['limit']):
+            self.stdout.write(f'  {package}: {ms(seconds)}')
+
+        if options['sort'] == 'self':
+            rows = sorted(imports, key=lambda row: row[1], reverse=True)
+        else:
+            rows = sorted(
+                (row for row in imports if row[3] == 0),
+                key=lambda row: row[2],
+                reverse=True,
+            )
+        self.stdout.write(f"by module ({options['sort']}):")
+        for name, own, cumulative, _ in rows[:options['limit']]:
+            self.stdout.write(f'  {name}: self={ms(own)} cumulative={ms(cumulative)}')
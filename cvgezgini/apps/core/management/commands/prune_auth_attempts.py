@@ -0,0 +1,39 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from cvgezgini.apps.core.retention import compact_auth_attempts
+
+
+class Command(BaseCommand):
+    help = 'Rolls the AuthAttempt rows older than the limiter window up into hourly rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than',
+            type=int,
+            default=None,
+            help='In seconds, defaults to ATTEMPT_WINDOW.',
+        )
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running, pruning every --interval seconds.',
+        )
+        parser.add_argument('--interval', type=int, default=600)
+
+    def handle(self, *args, **options):
+        older_than = options['older_than'] or settings.ATTEMPT_WINDOW
+
+        while True:
+            before = timezone.now() - timedelta(seconds=older_than)
+            pruned = compact_auth_attempts(before, options['chunk_size'])
+            self.stdout.write(f'Pruned {pruned} auth attempts older than {before}.')
+
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,49 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Runs a fake SMTP server which accepts and drops every mail, for offline benchmarks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=1025)
+
+    def handle(self, *args, **options):
+        self.received = 0
+        asyncio.run(self.serve(options['host'], options['port']))
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.session, host, port)
+        self.stdout.write(f'SMTP sink listening on {host}:{port}')
+        async with server:
+            await server.serve_forever()
+
+    async def session(self, reader, writer):
+        def reply(line):
+            writer.write(f'{line}\r\n'.encode())
+
+        reply('220 sink ready')
+        in_data = False
+        while line := await reader.readline():
+            if in_data:
+                if line.rstrip(b'\r\n') == b'.':
+                    in_data = False
+                    self.received += 1
+                    if self.received % 1000 == 0:
+                        self.stdout.write(f'{self.received} mails received')
+                    reply('250 OK')
+            else:
+                command = line[:4].upper()
+                if command == b'DATA':
+                    in_data = True
+                    reply('354 End data with <CR><LF>.<CR><LF>')
+                elif command == b'QUIT':
+                    reply('221 Bye')
+                    await writer.drain()
+                    break
+                else:
+                    reply('250 OK')
+            await writer.drain()
+        writer.close()
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cvgezgini.apps.core.messaging import deliver_pending
+
+
+class Command(BaseCommand):
+    help = 'Sends the queued emails and SMS in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running as a worker, polling every --interval seconds.',
+        )
+        parser.add_argument('--interval', type=float, default=1)
+
+    def handle(self, *args, **options):
+        while True:
+            handled = 0
+            while batch := deliver_pending(options['batch_size']):
+                handled += batch
+            if handled:
+                self.stdout.write(f'Handled {handled} messages.')
+
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,105 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from cvgezgini.apps.accounts.utils import send_email, send_sms
+from .models import OutboundMessage
+from .sms import get_sms_backend
+
+logger = logging.getLogger("Messaging")
+
+
+def deliver_pending(batch_size=100):
+    """
+    Sends one batch of due messages and returns how many were handled.
+    The batch is claimed in a short transaction, pushing its next_attempt_at
+    OUTBOUND_CLAIM_TIMEOUT seconds ahead so concurrent workers skip it, and
+    sent without holding any lock. A failed message (including a provider
+    that cannot be reached) is retried with exponential backoff until
+    OUTBOUND_MAX_ATTEMPTS; the messages of a worker dying mid batch are sent
+    again once the claim expires.
+    """
+    messages = _claim(batch_size)
+    if not messages:
+        return 0
+
+    # one connection per channel for the whole batch
+    email_connection = get_connection()
+    sms_backend = get_sms_backend()
+    try:
+        for message in messages:
+            _deliver(message, email_connection, sms_backend)
+    finally:
+        try:
+            email_connection.close()
+        except Exception as e:
+            logger.warning(f"Could not close the email connection, exception={e}")
+
+    OutboundMessage.objects.bulk_update(
+        messages,
+        [
+            'status',
+            'attempts',
+            'next_attempt_at',
+            'last_error',
+            'dedupe_key',
+            'sent_at',
+        ],
+    )
+    return len(messages)
+
+
+def _claim(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        messages = list(
+            OutboundMessage.objects.select_for_update(skip_locked=True)
+            .filter(
+                status=OutboundMessage.Statuses.PENDING,
+                next_attempt_at__lte=now,
+            )
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        claimed_until = now + timedelta(seconds=settings.OUTBOUND_CLAIM_TIMEOUT)
+        for message in messages:
+            # kept by the bulk_update of a message that is neither sent nor failed
+            message.next_attempt_at = claimed_until
+        if messages:
+            OutboundMessage.objects.filter(
+                pk__in=[message.pk for message in messages]
+            ).update(next_attempt_at=claimed_until)
+    return messages
+
+
+def _deliver(message, email_connection, sms_backend):
+    message.attempts += 1
+    try:
+        if message.channel == OutboundMessage.Channels.EMAIL:
+            # opened by the first email, a failure fails this message only
+            email_connection.open()
+            send_email(
+                message.recipient,
+                message.body,
+                subject=message.subject,
+                connection=email_connection,
+            )
+        else:
+            send_sms(message.recipient, message.body, backend=sms_backend)
+    except Exception as e:
+        logger.warning(f"Could not send message id={message.pk}, exception={e}")
+        message.last_error = str(e)
+        if message.attempts >= settings.OUTBOUND_MAX_ATTEMPTS:
+            message.status = OutboundMessage.Statuses.FAILED
+            message.dedupe_key = None
+        else:
+            delay = settings.OUTBOUND_RETRY_DELAY * 2 ** (message.attempts - 1)
+            message.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+        return
+
+    message.status = OutboundMessage.Statuses.SENT
+    message.sent_at = timezone.now()
+    message.dedupe_key = None
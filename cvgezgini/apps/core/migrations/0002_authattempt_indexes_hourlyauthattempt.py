@@ -0,0 +1,39 @@
+# Generated by Django 4.2.6 on 2026-10-18 19:29
+
+from django.db import migrations, models
+
+from cvgezgini.apps.core.db.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY, the table takes a row per login attempt
+    atomic = False
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HourlyAuthAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('ip', models.GenericIPAddressField()),
+                ('email', models.EmailField(max_length=254)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        AddIndexConcurrently(
+            model_name='authattempt',
+            index=models.Index(fields=['ip', 'time'], name='core_authat_ip_892cad_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='authattempt',
+            index=models.Index(fields=['email', 'time'], name='core_authat_email_ef365b_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='hourlyauthattempt',
+            constraint=models.UniqueConstraint(fields=('hour', 'ip', 'email'), name='unique_hourly_auth_attempt'),
+        ),
+    ]
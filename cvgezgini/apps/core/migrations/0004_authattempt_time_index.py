@@ -0,0 +1,21 @@
+# Generated by Django 4.2.6 on 2026-10-18 20:17
+
+from django.db import migrations, models
+
+from cvgezgini.apps.core.db.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY, the table takes a row per login attempt
+    atomic = False
+
+    dependencies = [
+        ('core', '0003_outboundmessage'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='authattempt',
+            index=models.Index(fields=['time'], name='core_authat_time_d2d43a_idx'),
+        ),
+    ]
@@ -1,4 +1,7 @@
+import hashlib
+
 from django.db import models
+from django.utils.timezone import now
 
 # Create your models here.
 
@@ -11,3 +14,93 @@ class AuthAttempt(models.Model):
     ip = models.GenericIPAddressField()
     email = models.EmailField()
     time = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ip', 'time']),
+            models.Index(fields=['email', 'time']),
+            # retention and the admin's date hierarchy
+            models.Index(fields=['time']),
+        ]
+
+
+class HourlyAuthAttempt(models.Model):
+    """
+    Attempts rolled up per hour, ip and email once they are pruned from
+    AuthAttempt. Kept for abuse analytics.
+    """
+
+    hour = models.DateTimeField()
+    ip = models.GenericIPAddressField()
+    email = models.EmailField()
+    attempts = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['hour', 'ip', 'email'], name='unique_hourly_auth_attempt'
+            ),
+        ]
+
+
+class OutboundMessage(models.Model):
+    """
+    Queue of emails and SMS, drained by the send_outbound_messages command.
+    """
+
+    class Channels(models.TextChoices):
+        EMAIL = 'email', 'E-posta'
+        SMS = 'sms', 'SMS'
+
+    class Statuses(models.TextChoices):
+        PENDING = 'pending', 'Bekliyor'
+        SENT = 'sent', 'Gönderildi'
+        FAILED = 'failed', 'Başarısız'
+
+    channel = models.CharField(max_length=5, choices=Channels.choices)
+    recipient = models.CharField(max_length=254)
+    subject = models.CharField(max_length=255, blank=True)
+    body = models.TextField()
+    status = models.CharField(
+        max_length=7, choices=Statuses.choices, default=Statuses.PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=now)
+    last_error = models.TextField(blank=True)
+    # set while the message is pending, an equal message is not queued twice
+    dedupe_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+    def __str__(self):
+        return f'{self.channel} to {self.recipient}'
+
+    @classmethod
+    def enqueue(cls, channel, recipient, body, subject=''):
+        cls.objects.bulk_create(
+            [cls._build(channel, recipient, body, subject)], ignore_conflicts=True
+        )
+
+    @classmethod
+    async def aenqueue(cls, channel, recipient, body, subject=''):
+        await cls.objects.abulk_create(
+            [cls._build(channel, recipient, body, subject)], ignore_conflicts=True
+        )
+
+    @classmethod
+    def _build(cls, channel, recipient, body, subject=''):
+        # lazy translations are rendered once, here
+        body, subject = str(body), str(subject)
+        dedupe_key = hashlib.sha256(
+            '\0'.join((channel, recipient, subject, body)).encode()
+        ).hexdigest()
+        return cls(
+            channel=channel,
+            recipient=recipient,
+            subject=subject,
+            body=body,
+            dedupe_key=dedupe_key,
+        )
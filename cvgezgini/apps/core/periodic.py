@@ -0,0 +1,33 @@
+import threading
+
+from django.db import close_old_connections
+
+
+class PeriodicThread(threading.Thread):
+    """
+    Daemon thread calling `func` every `interval` seconds until `stop`,
+    used by the in-process write buffers to flush themselves. Outside of a
+    request nothing closes the thread's database connection, so it is
+    checked around every call as the request signals do, and a call that
+    fails is logged without ending the loop.
+    """
+
+    def __init__(self, name, interval, func, logger):
+        super().__init__(name=name, daemon=True)
+        self.interval = interval
+        self.func = func
+        self.logger = logger
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            close_old_connections()
+            try:
+                self.func()
+            except Exception as e:
+                self.logger.error(f'{self.name} failed! exception={e}')
+            finally:
+                close_old_connections()
+
+    def stop(self):
+        self._stopped.set()
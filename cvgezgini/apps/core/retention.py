@@ -0,0 +1,59 @@
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+
+from .models import AuthAttempt, HourlyAuthAttempt
+
+
+def compact_auth_attempts(before, chunk_size=5000):
+    """
+    Moves the AuthAttempt rows older than `before` into HourlyAuthAttempt,
+    one short transaction per `chunk_size` rows. Returns the pruned count.
+    """
+    pruned = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                AuthAttempt.objects.filter(time__lt=before)
+                .order_by('id')
+                .values_list('id', flat=True)[:chunk_size]
+            )
+            if not ids:
+                return pruned
+
+            rows = (
+                AuthAttempt.objects.filter(id__in=ids)
+                .annotate(hour=TruncHour('time'))
+                .values('hour', 'ip', 'email')
+                .annotate(attempts=Count('id'))
+                .order_by()
+            )
+            _add_to_hourly(rows)
+            AuthAttempt.objects.filter(id__in=ids).delete()
+        pruned += len(ids)
+
+
+def _add_to_hourly(rows):
+    rows = {(row['hour'], row['ip'], row['email']): row['attempts'] for row in rows}
+    existing = {
+        (hourly.hour, hourly.ip, hourly.email): hourly
+        for hourly in HourlyAuthAttempt.objects.select_for_update().filter(
+            hour__in={key[0] for key in rows},
+            ip__in={key[1] for key in rows},
+        )
+    }
+
+    updated, created = [], []
+    for key, attempts in rows.items():
+        hourly = existing.get(key)
+        if hourly is None:
+            hour, ip, email = key
+            created.append(
+                HourlyAuthAttempt(hour=hour, ip=ip, email=email, attempts=attempts)
+            )
+        else:
+            hourly.attempts += attempts
+            updated.append(hourly)
+
+    HourlyAuthAttempt.objects.bulk_update(updated, ['attempts'])
+    HourlyAuthAttempt.objects.bulk_create(created)
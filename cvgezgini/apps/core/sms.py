@@ -0,0 +1,35 @@
+import logging
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger("Sms")
+
+
+class BaseSmsBackend:
+    def send(self, phone, message):
+        raise NotImplementedError
+
+
+class DummySmsBackend(BaseSmsBackend):
+    """
+    Stub until an SMS provider is integrated, only logs the messages.
+    """
+
+    def send(self, phone, message):
+        logger.info(f"SMS to {phone}: {message}")
+
+
+class LocmemSmsBackend(BaseSmsBackend):
+    """
+    Sink keeping the messages in `outbox`, for tests and offline benchmarks.
+    """
+
+    outbox = []
+
+    def send(self, phone, message):
+        self.outbox.append((phone, message))
+
+
+def get_sms_backend():
+    return import_string(settings.SMS_BACKEND)()
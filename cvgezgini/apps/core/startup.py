@@ -0,0 +1,123 @@
+"""
+Worker start up.
+
+`warm_up` loads what the first requests of a worker would otherwise load
+themselves. wsgi.py and asgi.py call it when WARM_UP is set, with gunicorn's
+--preload it runs once in the master and the workers inherit the result.
+
+Running this module (`python -X importtime -m cvgezgini.apps.core.startup`)
+sets Django up with every app's import, models and ready() timed, warms up
+and prints the timings as JSON, see the profile_startup command.
+"""
+import json
+import time
+
+
+def _hashers():
+    from django.contrib.auth.hashers import get_hasher, get_hashers
+
+    get_hashers()
+    get_hasher('default')
+
+
+def _password_validators():
+    from django.contrib.auth.password_validation import (
+        get_default_password_validators,
+    )
+
+    # CommonPasswordValidator reads its gzipped list here
+    get_default_password_validators()
+
+
+def _populate(resolver):
+    resolver.reverse_dict
+    for _, namespace in resolver.namespace_dict.values():
+        _populate(namespace)
+
+
+def _urls():
+    from django.urls import get_resolver
+
+    # imports every view and serializer and compiles the patterns
+    _populate(get_resolver())
+
+
+def _phone_numbers():
+    from phonenumbers import PhoneMetadata
+
+    # by default the metadata of a region is loaded when first parsed
+    PhoneMetadata.load_all()
+
+
+STEPS = [
+    ('hashers', _hashers),
+    ('password validators', _password_validators),
+    ('urls', _urls),
+    ('phone numbers', _phone_numbers),
+]
+
+
+def warm_up():
+    """
+    Touches neither the database nor the cache, safe to call before forking.
+    Returns the seconds spent on each step.
+    """
+    timings = {}
+    for name, step in STEPS:
+        started = time.perf_counter()
+        step()
+        timings[name] = time.perf_counter() - started
+    return timings
+
+
+def _timed(timings, name, func):
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings[name] = time.perf_counter() - started
+
+    return wrapper
+
+
+def probe():
+    import django
+    from django.apps import AppConfig
+    from django.conf import settings
+
+    report = {'apps': {}}
+    started = time.perf_counter()
+    settings.INSTALLED_APPS
+    report['settings'] = time.perf_counter() - started
+
+    create = AppConfig.create.__func__
+
+    def timed_create(cls, entry):
+        created = time.perf_counter()
+        app_config = create(cls, entry)
+        timings = report['apps'][app_config.label] = {
+            'import': time.perf_counter() - created
+        }
+        for method in ('import_models', 'ready'):
+            setattr(
+                app_config,
+                method,
+                _timed(timings, method, getattr(app_config, method)),
+            )
+        return app_config
+
+    AppConfig.create = classmethod(timed_create)
+    started = time.perf_counter()
+    try:
+        django.setup()
+    finally:
+        AppConfig.create = classmethod(create)
+    report['setup'] = time.perf_counter() - started
+
+    report['warm_up'] = warm_up()
+    return report
+
+
+if __name__ == '__main__':
+    print(json.dumps(probe()))
@@ -1,3 +1,341 @@
-from django.test import TestCase
+from datetime import datetime, timedelta, timezone as dt_timezone
 
-# Create your tests here.
+from unittest import mock
+
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from psycopg2 import OperationalError, extensions
+from django.utils import timezone
+
+from .admin import EstimatedCountPaginator
+from .checks import check_invite_code_key, check_presence_cache
+from .db import routers
+from .management.commands.profile_startup import parse_importtime
+from .db.postgresql_pool.base import ConnectionPool
+from .messaging import deliver_pending
+from .periodic import PeriodicThread
+from .models import AuthAttempt, HourlyAuthAttempt, OutboundMessage
+from .retention import compact_auth_attempts
+from .sms import BaseSmsBackend, LocmemSmsBackend
+from .startup import warm_up
+
+IP = '100.10.10.10'
+EMAIL = 'test@example.com'
+
+
+class CompactAuthAttemptsTestCase(TestCase):
+    def create_attempt(self, time, ip=IP, email=EMAIL):
+        attempt = AuthAttempt.objects.create(ip=ip, email=email)
+        AuthAttempt.objects.filter(pk=attempt.pk).update(time=time)
+
+    def test_compact(self):
+        hour = datetime(2023, 10, 1, 12, tzinfo=dt_timezone.utc)
+        for minute in (1, 20, 59):
+            self.create_attempt(hour + timedelta(minutes=minute))
+        self.create_attempt(hour + timedelta(minutes=5), email='other@example.com')
+        self.create_attempt(hour + timedelta(hours=1))
+        self.create_attempt(timezone.now())
+
+        pruned = compact_auth_attempts(
+            timezone.now() - timedelta(hours=1), chunk_size=2
+        )
+
+        self.assertEqual(pruned, 5)
+        self.assertEqual(AuthAttempt.objects.count(), 1)
+        self.assertEqual(
+            set(HourlyAuthAttempt.objects.values_list('hour', 'email', 'attempts')),
+            {
+                (hour, EMAIL, 3),
+                (hour, 'other@example.com', 1),
+                (hour + timedelta(hours=1), EMAIL, 1),
+            },
+        )
+
+    def test_compact_adds_to_existing_hour(self):
+        hour = datetime(2023, 10, 1, 12, tzinfo=dt_timezone.utc)
+        HourlyAuthAttempt.objects.create(hour=hour, ip=IP, email=EMAIL, attempts=4)
+        self.create_attempt(hour + timedelta(minutes=30))
+
+        compact_auth_attempts(timezone.now())
+
+        self.assertEqual(HourlyAuthAttempt.objects.get().attempts, 5)
+
+
+class FailingSmsBackend(BaseSmsBackend):
+    def send(self, phone, message):
+        raise ConnectionError('provider is down')
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def open(self):
+        raise OSError('smtp is down')
+
+    def send_messages(self, email_messages):
+        self.open()
+
+
+@override_settings(SMS_BACKEND='cvgezgini.apps.core.sms.LocmemSmsBackend')
+class OutboundMessageTestCase(TestCase):
+    def setUp(self):
+        LocmemSmsBackend.outbox.clear()
+
+    def test_enqueue_dedupes_pending(self):
+        for _ in range(2):
+            OutboundMessage.enqueue(OutboundMessage.Channels.EMAIL, EMAIL, '1234')
+        self.assertEqual(OutboundMessage.objects.count(), 1)
+
+        deliver_pending()
+        # a sent message no longer blocks the same one
+        OutboundMessage.enqueue(OutboundMessage.Channels.EMAIL, EMAIL, '1234')
+        self.assertEqual(OutboundMessage.objects.count(), 2)
+
+    def test_deliver(self):
+        OutboundMessage.enqueue(
+            OutboundMessage.Channels.EMAIL, EMAIL, 'hello', subject='hi'
+        )
+        OutboundMessage.enqueue(OutboundMessage.Channels.SMS, '+905555555555', 'hi')
+
+        self.assertEqual(deliver_pending(), 2)
+        self.assertEqual(deliver_pending(), 0)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [EMAIL])
+        self.assertEqual(LocmemSmsBackend.outbox, [('+905555555555', 'hi')])
+        self.assertFalse(
+            OutboundMessage.objects.exclude(
+                status=OutboundMessage.Statuses.SENT
+            ).exists()
+        )
+
+    @override_settings(
+        SMS_BACKEND='cvgezgini.apps.core.tests.FailingSmsBackend',
+        OUTBOUND_MAX_ATTEMPTS=2,
+        OUTBOUND_RETRY_DELAY=0,
+    )
+    def test_retry(self):
+        OutboundMessage.enqueue(OutboundMessage.Channels.SMS, '+905555555555', 'hi')
+
+        with self.assertLogs('Messaging', 'WARNING'):
+            deliver_pending()
+        message = OutboundMessage.objects.get()
+        self.assertEqual(message.status, OutboundMessage.Statuses.PENDING)
+        self.assertEqual(message.attempts, 1)
+        self.assertEqual(message.last_error, 'provider is down')
+
+        with self.assertLogs('Messaging', 'WARNING'):
+            deliver_pending()
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboundMessage.Statuses.FAILED)
+        self.assertIsNone(message.dedupe_key)
+
+    @override_settings(EMAIL_BACKEND='cvgezgini.apps.core.tests.FailingEmailBackend')
+    def test_unreachable_email_server(self):
+        OutboundMessage.enqueue(OutboundMessage.Channels.EMAIL, EMAIL, 'hello')
+        OutboundMessage.enqueue(OutboundMessage.Channels.SMS, '+905555555555', 'hi')
+
+        with self.assertLogs('Messaging', 'WARNING'):
+            self.assertEqual(deliver_pending(), 2)
+        # the SMS of the batch went out, the email waits for its retry
+        self.assertEqual(LocmemSmsBackend.outbox, [('+905555555555', 'hi')])
+        message = OutboundMessage.objects.get(channel=OutboundMessage.Channels.EMAIL)
+        self.assertEqual(message.status, OutboundMessage.Statuses.PENDING)
+        self.assertEqual(message.attempts, 1)
+        self.assertEqual(message.last_error, 'smtp is down')
+        self.assertGreater(message.next_attempt_at, timezone.now())
+
+    def test_claimed_batch_is_skipped(self):
+        OutboundMessage.enqueue(OutboundMessage.Channels.SMS, '+905555555555', 'hi')
+        with mock.patch('cvgezgini.apps.core.messaging._deliver') as deliver:
+            # a worker holding the batch, it neither sent nor recorded anything
+            deliver_pending()
+            OutboundMessage.objects.update(status=OutboundMessage.Statuses.PENDING)
+        self.assertEqual(deliver_pending(), 0)
+        self.assertEqual(deliver.call_count, 1)
+
+
+def fake_connection(*args, **kwargs):
+    connection = mock.MagicMock(closed=0)
+    connection.info.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+    return connection
+
+
+@mock.patch('psycopg2.pool.psycopg2.connect', side_effect=fake_connection)
+class ConnectionPoolTestCase(SimpleTestCase):
+    def test_reuse(self, connect):
+        pool = ConnectionPool(1, 1, 0.01, dbname='test')
+        connection = pool.acquire()
+        with self.assertRaises(OperationalError):
+            pool.acquire()
+
+        pool.release(connection)
+        self.assertIs(pool.acquire(), connection)
+        self.assertEqual(connect.call_count, 1)
+
+    def test_broken_connections_are_replaced(self, connect):
+        pool = ConnectionPool(1, 2, 0.01, dbname='test')
+        connection = pool.acquire()
+        pool.release(connection, close=True)
+        connection.close.assert_called_once()
+
+        other = pool.acquire()
+        self.assertIsNot(other, connection)
+        other.closed = 1
+        pool.release(other)
+        self.assertIsNot(pool.acquire(), other)
+
+    def test_dead_connections_are_replaced_on_check(self, connect):
+        pool = ConnectionPool(1, 1, 0.01, dbname='test')
+        connection = pool.acquire(check=True)
+        pool.release(connection)
+        # closed by the server, psycopg2 still reports it open
+        connection.cursor.side_effect = OperationalError
+
+        other = pool.acquire(check=True)
+        self.assertIsNot(other, connection)
+        connection.close.assert_called_once()
+        self.assertEqual(pool.connects, 2)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_STICKINESS=5)
+class ReplicaRouterTestCase(SimpleTestCase):
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def handle(self, request, view):
+        return routers.ReplicaMiddleware(view)(request)
+
+    def test_outside_requests(self):
+        self.assertEqual(self.router.db_for_read(OutboundMessage), 'default')
+
+    def test_read_your_writes(self):
+        reads = []
+
+        def view(request):
+            reads.append(self.router.db_for_read(OutboundMessage))
+            with routers.primary():
+                reads.append(self.router.db_for_read(OutboundMessage))
+            reads.append(self.router.db_for_read(OutboundMessage))
+            self.assertEqual(self.router.db_for_write(OutboundMessage), 'default')
+            reads.append(self.router.db_for_read(OutboundMessage))
+            return HttpResponse()
+
+        response = self.handle(self.factory.post('/'), view)
+        self.assertEqual(reads, ['replica', 'default', 'replica', 'default'])
+        cookie = response.cookies[routers.COOKIE_NAME]
+        self.assertEqual(cookie['max-age'], 5)
+
+        # the next requests of the client stay on the primary
+        request = self.factory.get('/')
+        request.COOKIES[routers.COOKIE_NAME] = cookie.value
+        response = self.handle(
+            request,
+            lambda request: HttpResponse(self.router.db_for_read(OutboundMessage)),
+        )
+        self.assertEqual(response.content, b'default')
+        self.assertNotIn(routers.COOKIE_NAME, response.cookies)
+
+
+class StartupTestCase(SimpleTestCase):
+    def test_warm_up(self):
+        # a SimpleTestCase fails on any query
+        timings = warm_up()
+        self.assertEqual(
+            list(timings), ['hashers', 'password validators', 'urls', 'phone numbers']
+        )
+
+    def test_parse_importtime(self):
+        output = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |     yaml.reader\n'
+            'import time:       300 |       1500 |   yaml\n'
+            'import time:      1000 |       2500 | drf_yasg\n'
+        )
+        self.assertEqual(
+            parse_importtime(output),
+            [
+                ('yaml.reader', 0.00012, 0.00012, 2),
+                ('yaml', 0.0003, 0.0015, 1),
+                ('drf_yasg', 0.001, 0.0025, 0),
+            ],
+        )
+
+
+class ChecksTestCase(SimpleTestCase):
+    def test_invite_code_key(self):
+        for key in ('', 'short-key'):
+            with self.settings(INVITE_CODE_KEY=key):
+                errors = check_invite_code_key(None)
+            self.assertEqual([e.id for e in errors], ['core.E002'])
+
+        with self.settings(INVITE_CODE_KEY='k' * 32):
+            self.assertEqual(check_invite_code_key(None), [])
+
+    def test_presence_cache(self):
+        with mock.patch('cvgezgini.apps.core.checks.is_shared', return_value=False):
+            errors = check_presence_cache(None)
+        self.assertEqual([e.id for e in errors], ['core.E003'])
+        with mock.patch('cvgezgini.apps.core.checks.is_shared', return_value=True):
+            self.assertEqual(check_presence_cache(None), [])
+
+
+class PeriodicThreadTestCase(SimpleTestCase):
+    def test_survives_failures(self):
+        calls = []
+
+        def func():
+            calls.append(len(calls))
+            if len(calls) == 1:
+                raise ValueError('boom')
+            thread.stop()
+
+        logger = mock.Mock()
+        thread = PeriodicThread('test', 0.01, func, logger)
+        with mock.patch('cvgezgini.apps.core.periodic.close_old_connections') as close:
+            thread.start()
+            thread.join(timeout=5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(calls, [0, 1])
+        logger.error.assert_called_once()
+        self.assertEqual(close.call_count, 4)
+
+
+class EstimatedCountPaginatorTestCase(TestCase):
+    def setUp(self):
+        AuthAttempt.objects.bulk_create(
+            AuthAttempt(ip='127.0.0.1', email=f'{i}@example.com') for i in range(3)
+        )
+
+    def paginator(self, queryset):
+        return EstimatedCountPaginator(queryset.order_by('-pk'), 2)
+
+    def test_exact_count(self):
+        # not PostgreSQL
+        self.assertEqual(self.paginator(AuthAttempt.objects.all()).count, 3)
+
+    def test_estimate(self):
+        cursor = mock.MagicMock()
+        postgresql = mock.MagicMock(vendor='postgresql')
+        postgresql.cursor.return_value.__enter__.return_value = cursor
+        connections = {'default': postgresql}
+
+        with mock.patch('cvgezgini.apps.core.admin.connections', connections):
+            cursor.fetchone.return_value = (50000.0,)
+            paginator = self.paginator(AuthAttempt.objects.all())
+            self.assertEqual(paginator.count, 50000)
+            self.assertEqual(paginator.num_pages, 25000)
+            self.assertIn('pg_class', cursor.execute.call_args[0][0])
+
+            cursor.fetchone.return_value = ('[{"Plan": {"Plan Rows": 20000}}]',)
+            paginator = self.paginator(AuthAttempt.objects.filter(ip='127.0.0.1'))
+            self.assertEqual(paginator.count, 20000)
+            self.assertTrue(cursor.execute.call_args[0][0].startswith('EXPLAIN'))
+
+            # small results and unanalyzed tables are counted
+            cursor.fetchone.return_value = (-1.0,)
+            self.assertEqual(self.paginator(AuthAttempt.objects.all()).count, 3)
+            cursor.fetchone.return_value = ([{'Plan': {'Plan Rows': 40}}],)
+            queryset = AuthAttempt.objects.filter(ip='127.0.0.1')
+            self.assertEqual(self.paginator(queryset).count, 3)
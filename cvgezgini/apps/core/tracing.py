@@ -0,0 +1,226 @@
+"""
+Per request timings of the auth hot path.
+
+TracingMiddleware opens a trace for every request; code on the hot path
+reports into it with `stage`:
+
+    with tracing.stage('hashing'):
+        ...
+
+Stages nest (validation includes hashing) and are no-ops outside a traced
+request. Database queries are counted and timed by an execute wrapper
+installed on every new connection. Finished traces go into per process
+histograms labelled with the url name, exported by the metrics endpoint in
+Prometheus text or JSON. In DEVELOPMENT_MODE the timings of a request are
+also sent back in the Server-Timing header.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+# upper bounds of the histogram buckets
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_current = ContextVar('trace', default=None)
+
+
+class Trace:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.queries = 0
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0) + seconds
+
+    def add_query(self, seconds):
+        self.queries += 1
+        self.add('db', seconds)
+
+
+@contextmanager
+def stage(name):
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, time.perf_counter() - started)
+
+
+def query_wrapper(execute, sql, params, many, context):
+    trace = _current.get()
+    if trace is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        trace.add_query(time.perf_counter() - started)
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    # connection_created receiver, see CoreConfig.ready
+    if query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_wrapper)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # the last count is +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip((*self.buckets, '+Inf'), self.counts):
+            total += count
+            yield bound, total
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.seconds = {}
+            self.queries = {}
+
+    def record(self, route, trace, total):
+        with self._lock:
+            for name, seconds in (*trace.stages.items(), ('request', total)):
+                key = (route, name)
+                if key not in self.seconds:
+                    self.seconds[key] = Histogram(SECONDS_BUCKETS)
+                self.seconds[key].observe(seconds)
+            if route not in self.queries:
+                self.queries[route] = Histogram(QUERIES_BUCKETS)
+            self.queries[route].observe(trace.queries)
+
+    def as_json(self):
+        with self._lock:
+            return {
+                'stage_seconds': [
+                    {'route': route, 'stage': name, **self._json(histogram)}
+                    for (route, name), histogram in sorted(self.seconds.items())
+                ],
+                'db_queries': [
+                    {'route': route, **self._json(histogram)}
+                    for route, histogram in sorted(self.queries.items())
+                ],
+            }
+
+    def as_prometheus(self):
+        lines = []
+        with self._lock:
+            lines += self._prometheus(
+                'cvgezgini_stage_seconds',
+                'Time spent per request stage.',
+                {
+                    f'route="{route}",stage="{name}"': histogram
+                    for (route, name), histogram in sorted(self.seconds.items())
+                },
+            )
+            lines += self._prometheus(
+                'cvgezgini_db_queries',
+                'Database queries per request.',
+                {
+                    f'route="{route}"': histogram
+                    for route, histogram in sorted(self.queries.items())
+                },
+            )
+        return '\n'.join(lines) + '\n'
+
+    def _json(self, histogram):
+        return {
+            'buckets': {str(bound): count for bound, count in histogram.cumulative()},
+            'sum': histogram.sum,
+            'count': histogram.count,
+        }
+
+    def _prometheus(self, metric, help, histograms):
+        lines = [f'# HELP {metric} {help}', f'# TYPE {metric} histogram']
+        for labels, histogram in histograms.items():
+            for bound, count in histogram.cumulative():
+                lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{metric}_sum{{{labels}}} {histogram.sum}')
+            lines.append(f'{metric}_count{{{labels}}} {histogram.count}')
+        return lines
+
+
+registry = Registry()
+
+
+class TracingMiddleware:
+    """
+    Opens the trace of the request and records it once the response is
+    ready. Left out of the stack when TRACING_ENABLED is False.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.TRACING_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        trace = Trace()
+        token = _current.set(trace)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, trace)
+
+    async def __acall__(self, request):
+        trace = Trace()
+        token = _current.set(trace)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, trace)
+
+    def finish(self, request, response, trace):
+        total = time.perf_counter() - trace.started
+        match = getattr(request, 'resolver_match', None)
+        # unmatched paths share a label, they must not grow the registry
+        route = match.url_name if match and match.url_name else 'unmatched'
+        registry.record(route, trace, total)
+
+        if settings.DEVELOPMENT_MODE:
+            timings = [
+                f'{name};dur={seconds * 1000:.1f}'
+                for name, seconds in trace.stages.items()
+            ]
+            timings.append(f'queries;desc="{trace.queries}"')
+            timings.append(f'total;dur={total * 1000:.1f}')
+            response['Server-Timing'] = ', '.join(timings)
+        return response
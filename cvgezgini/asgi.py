@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cvgezgini.settings')
 
 application = get_asgi_application()
+
+if settings.WARM_UP:
+    # before the workers fork when the server preloads the application
+    from cvgezgini.apps.core.startup import warm_up
+
+    warm_up()
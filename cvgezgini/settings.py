@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/4.2/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
+import sys
 from datetime import timedelta
 
 from corsheaders.defaults import default_headers
@@ -24,10 +25,17 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 env = Env()
 env.read_env(BASE_DIR / ".env")
 
+TESTING = sys.argv[1:2] == ["test"]
+
 
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = env.str("SECRET_KEY")
 
+# Keys the invite code permutation, must never change once codes are issued,
+# unlike SECRET_KEY it is never rotated. `check --deploy` rejects a key shorter
+# than 32 characters (core.E002).
+INVITE_CODE_KEY = env.str("INVITE_CODE_KEY")
+
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = env.bool("DEBUG", True)
 
@@ -35,6 +43,17 @@ DEVELOPMENT_MODE = env.bool('DEVELOPMENT_MODE', False)
 
 # Keeps system safe from abusing, may need to False on development mode
 ATTEMPT_PROTECTION = env.bool('ATTEMPT_PROTECTION', True)
+# MemoryBackend, CacheBackend or DatabaseBackend of cvgezgini.api.utils.ratelimit,
+# CacheBackend needs a cache shared by the workers (CACHE_URL)
+ATTEMPT_LIMITER_BACKEND = env.str(
+    'ATTEMPT_LIMITER_BACKEND', 'cvgezgini.api.utils.ratelimit.CacheBackend'
+)
+ATTEMPT_LIMIT = env.int('ATTEMPT_LIMIT', 10)
+# in seconds
+ATTEMPT_WINDOW = env.int('ATTEMPT_WINDOW', 3600)
+# keeps writing AuthAttempt rows for history when the backend does not,
+# an INSERT per attempt
+ATTEMPT_AUDIT_LOG = env.bool('ATTEMPT_AUDIT_LOG', False)
 
 
 ALLOWED_HOSTS = []
@@ -55,14 +74,25 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework.authtoken',
     'django_filters',
-    'drf_yasg',
     'cvgezgini.apps.accounts',
     'cvgezgini.apps.core'
 ]
 
+# the swagger routes, importing drf_yasg (and pkg_resources through it) is a
+# large part of a worker's start up
+API_DOCS = env.bool("API_DOCS", True)
+if API_DOCS:
+    INSTALLED_APPS.append('drf_yasg')
+
+# wsgi.py and asgi.py load what the first requests would, see
+# cvgezgini.apps.core.startup
+WARM_UP = env.bool("WARM_UP", not DEBUG)
+
 AUTH_USER_MODEL = 'accounts.User'
 
 MIDDLEWARE = [
+    'cvgezgini.apps.core.tracing.TracingMiddleware',
+    'cvgezgini.apps.core.db.routers.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,6 +105,14 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'cvgezgini.urls'
 
+# per stage timings of the requests, see cvgezgini.apps.core.tracing. The
+# histograms are per worker process, api/metrics/ only returns the ones of the
+# worker answering it.
+TRACING_ENABLED = env.bool("TRACING_ENABLED", True)
+# lets a scraper read api/metrics/ with the X-Metrics-Token header, admins
+# can always read it
+METRICS_TOKEN = env.str("METRICS_TOKEN", "")
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -93,6 +131,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'cvgezgini.wsgi.application'
 
+# mounts the async auth views, for ASGI deployments
+ASYNC_AUTH_VIEWS = env.bool("ASYNC_AUTH_VIEWS", False)
+
 
 DATABASES = {
     "default": {
@@ -102,9 +143,44 @@ DATABASES = {
         "PASSWORD": env.str("DB_PASSWORD"),
         "HOST": env.str("DB_HOST", "localhost"),
         "PORT": env.str("DB_PORT", "5432"),
+        # in seconds, 0 closes the connection at the end of every request
+        "CONN_MAX_AGE": env.int("DB_CONN_MAX_AGE", 60),
+        "CONN_HEALTH_CHECKS": env.bool("DB_CONN_HEALTH_CHECKS", True),
     }
 }
 
+# in-process connection pool (PostgreSQL), for ASGI workers where persistent
+# connections are not reused across requests, see apps.core.db.postgresql_pool
+DB_POOL = env.bool("DB_POOL", False)
+if DB_POOL:
+    DATABASES["default"].update(
+        ENGINE="cvgezgini.apps.core.db.postgresql_pool",
+        CONN_MAX_AGE=0,
+        OPTIONS={
+            "pool": {
+                "min_size": env.int("DB_POOL_MIN_SIZE", 2),
+                "max_size": env.int("DB_POOL_MAX_SIZE", 10),
+                # in seconds, waiting for a free connection
+                "timeout": env.int("DB_POOL_TIMEOUT", 10),
+            }
+        },
+    )
+
+# read replicas of the default database (same name and credentials), reads of
+# the requests go there, see apps.core.db.routers
+for index, host in enumerate(env.list("DB_REPLICA_HOSTS", default=[])):
+    DATABASES[f"replica_{index}"] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+DATABASE_ROUTERS = (
+    ["cvgezgini.apps.core.db.routers.ReplicaRouter"] if DATABASE_REPLICAS else []
+)
+# in seconds, how long a client reads from the primary after a write
+REPLICA_STICKINESS = env.int("REPLICA_STICKINESS", 5)
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -121,6 +197,47 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# pbkdf2, scrypt or argon2 (needs argon2-cffi), the others are kept to
+# verify older hashes. Compare them with the benchmark_hashers command.
+PASSWORD_HASHER = env.str("PASSWORD_HASHER", "pbkdf2")
+PBKDF2_ITERATIONS = env.int("PBKDF2_ITERATIONS", 600000)
+SCRYPT_WORK_FACTOR = env.int("SCRYPT_WORK_FACTOR", 2**14)
+SCRYPT_BLOCK_SIZE = env.int("SCRYPT_BLOCK_SIZE", 8)
+SCRYPT_PARALLELISM = env.int("SCRYPT_PARALLELISM", 1)
+ARGON2_TIME_COST = env.int("ARGON2_TIME_COST", 2)
+# in KiB
+ARGON2_MEMORY_COST = env.int("ARGON2_MEMORY_COST", 102400)
+ARGON2_PARALLELISM = env.int("ARGON2_PARALLELISM", 8)
+
+TUNED_PASSWORD_HASHERS = {
+    "pbkdf2": "cvgezgini.apps.accounts.hashers.PBKDF2PasswordHasher",
+    "scrypt": "cvgezgini.apps.accounts.hashers.ScryptPasswordHasher",
+    "argon2": "cvgezgini.apps.accounts.hashers.Argon2PasswordHasher",
+}
+PASSWORD_HASHERS = [
+    TUNED_PASSWORD_HASHERS[PASSWORD_HASHER],
+    *(
+        path
+        for name, path in TUNED_PASSWORD_HASHERS.items()
+        if name != PASSWORD_HASHER
+    ),
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+]
+
+# 0 hashes in the request thread, otherwise the size of the hashing pool
+PASSWORD_HASHING_WORKERS = env.int("PASSWORD_HASHING_WORKERS", 0)
+# jobs waiting for a free worker, beyond that 503 is returned
+PASSWORD_HASHING_QUEUE_SIZE = env.int("PASSWORD_HASHING_QUEUE_SIZE", 32)
+# in seconds, Retry-After of the 503 response
+PASSWORD_HASHING_RETRY_AFTER = env.int("PASSWORD_HASHING_RETRY_AFTER", 1)
+# rows of a users/import/ body, larger files go through import_users
+IMPORT_USERS_MAX_ROWS = env.int("IMPORT_USERS_MAX_ROWS", 1000)
+
+if TESTING:
+    # fast hasher, the suite creates users all the time
+    PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
 
 LANGUAGE_CODE = 'en-us'
 
@@ -139,6 +256,19 @@ MEDIA_ROOT = BASE_DIR / "media"
 MEDIA_URL = "media/"
 MEDIA_DOMAIN = env.str("MEDIA_DOMAIN")
 
+# written by the generate_api_schema command, relative to BASE_DIR, see
+# api.utils.schema; empty keeps the schema in memory only
+API_SCHEMA_PATH = env.str("API_SCHEMA_PATH", "openapi.json")
+if API_SCHEMA_PATH:
+    API_SCHEMA_PATH = os.path.join(BASE_DIR, API_SCHEMA_PATH)
+if TESTING:
+    API_SCHEMA_PATH = ""
+
+SWAGGER_SETTINGS = {
+    # the UI loads the precomputed schema instead of generating it
+    "SPEC_URL": ("api:schema-json", {"format": ".json"}),
+}
+
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -149,12 +279,53 @@ REST_FRAMEWORK = {
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "cvgezgini.api.utils.authentication.CachedTokenAuthentication",
+        "cvgezgini.api.utils.authentication.SignedTokenAuthentication",
         "rest_framework.authentication.SessionAuthentication",
         
     ],
 }
 
+CACHES = {"default": env.cache("CACHE_URL", "locmemcache://")}
+
+# in seconds
+AUTH_TOKEN_CACHE_TIMEOUT = env.int("AUTH_TOKEN_CACHE_TIMEOUT", 300)
+# in-process tier, bounds how long other processes may serve a revoked token
+AUTH_TOKEN_LOCAL_CACHE_TIMEOUT = env.int("AUTH_TOKEN_LOCAL_CACHE_TIMEOUT", 5)
+AUTH_TOKEN_LOCAL_CACHE_SIZE = env.int("AUTH_TOKEN_LOCAL_CACHE_SIZE", 1024)
+
+# "token" (a database token per user) or "signed", see api.utils.signed_tokens
+AUTH_TOKEN_MODE = env.str("AUTH_TOKEN_MODE", "token")
+# the first key signs, the others only verify (key rotation)
+SIGNED_TOKEN_KEYS = env.list("SIGNED_TOKEN_KEYS", default=[]) or [SECRET_KEY]
+# in seconds
+ACCESS_TOKEN_LIFETIME = env.int("ACCESS_TOKEN_LIFETIME", 900)
+REFRESH_TOKEN_LIFETIME = env.int("REFRESH_TOKEN_LIFETIME", 14 * 24 * 3600)
+# in seconds, how often each process looks for new token revocations
+TOKEN_DENY_LIST_REFRESH = env.int("TOKEN_DENY_LIST_REFRESH", 10)
+
+# in seconds, how long /api/me/ responses stay cached, see api.utils.profile_cache
+PROFILE_CACHE_TIMEOUT = env.int("PROFILE_CACHE_TIMEOUT", 24 * 3600)
+# used instead with a per process cache, which other workers do not invalidate
+PROFILE_CACHE_LOCAL_TIMEOUT = env.int("PROFILE_CACHE_LOCAL_TIMEOUT", 5)
+
+# in seconds, a user is online until PRESENCE_TIMEOUT after the last heartbeat
+PRESENCE_TIMEOUT = env.int("PRESENCE_TIMEOUT", 90)
+# in seconds, how often each process copies its heartbeats to User.is_online,
+# 0 leaves it to explicit presence.flush() calls
+PRESENCE_FLUSH_INTERVAL = env.int("PRESENCE_FLUSH_INTERVAL", 30)
+
+# in seconds, a login within LAST_LOGIN_PRECISION of the stored last_login
+# is not written
+LAST_LOGIN_PRECISION = env.int("LAST_LOGIN_PRECISION", 60)
+# in seconds, how often each process writes its buffered last_login values,
+# 0 writes on every login
+LAST_LOGIN_FLUSH_INTERVAL = env.int("LAST_LOGIN_FLUSH_INTERVAL", 30)
+
+if TESTING:
+    # no background threads writing to the test database
+    PRESENCE_FLUSH_INTERVAL = LAST_LOGIN_FLUSH_INTERVAL = 0
+
 VERIFY_CODE_LENGTH = env.int("VERIFY_CODE_LENGTH", 4)
 ENABLE_SENDING_SMS = env.bool("ENABLE_SENDING_SMS", False)
 ENABLE_SENDING_EMAIL = env.bool("ENABLE_SENDING_EMAIL", False)
@@ -164,6 +335,22 @@ VERIFICATION_CODE_EXPIRE_TIME = timedelta(
     seconds=env.int("VERIFICATION_CODE_EXPIRE_TIME")
 )
 
+EMAIL_BACKEND = env.str(
+    "EMAIL_BACKEND", "django.core.mail.backends.smtp.EmailBackend"
+)
+EMAIL_HOST = env.str("EMAIL_HOST", "localhost")
+EMAIL_PORT = env.int("EMAIL_PORT", 25)
+EMAIL_HOST_USER = env.str("EMAIL_HOST_USER", "")
+EMAIL_HOST_PASSWORD = env.str("EMAIL_HOST_PASSWORD", "")
+EMAIL_USE_TLS = env.bool("EMAIL_USE_TLS", False)
+DEFAULT_FROM_EMAIL = env.str("DEFAULT_FROM_EMAIL", "webmaster@localhost")
+SMS_BACKEND = env.str("SMS_BACKEND", "cvgezgini.apps.core.sms.DummySmsBackend")
+# a failed message is retried after OUTBOUND_RETRY_DELAY * 2^(attempts - 1) seconds
+OUTBOUND_MAX_ATTEMPTS = env.int("OUTBOUND_MAX_ATTEMPTS", 5)
+OUTBOUND_RETRY_DELAY = env.int("OUTBOUND_RETRY_DELAY", 30)
+# in seconds, a claimed batch is left to its worker this long, then sent again
+OUTBOUND_CLAIM_TIMEOUT = env.int("OUTBOUND_CLAIM_TIMEOUT", 300)
+
 
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_HEADERS = (*default_headers, "org", "branch")
@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cvgezgini.settings')
 
 application = get_wsgi_application()
+
+if settings.WARM_UP:
+    # before the workers fork when the server preloads the application
+    from cvgezgini.apps.core.startup import warm_up
+
+    warm_up()